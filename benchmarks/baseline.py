@@ -0,0 +1,67 @@
+"""
+Shared results/baseline handling for the benchmark scripts.
+
+Every benchmark produces `{"config": {...}, "operations": {op: {"seconds": median, ...}}}`. This module adds
+the common --json / --save-baseline / --baseline / --tolerance options, writes the results, and compares
+them with a saved baseline (exit code 1 when any operation is slower than the tolerance allows).
+"""
+from __future__ import annotations
+
+import argparse
+import json
+from pathlib import Path
+
+
+def add_arguments(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument("--json", default="", help="write results to this file")
+    parser.add_argument("--save-baseline", default="")
+    parser.add_argument("--baseline", default="")
+    parser.add_argument("--tolerance", type=float, default=0.10, help="allowed slowdown vs baseline")
+
+
+def load(path: str | Path) -> dict:
+    return json.loads(Path(path).read_text(encoding="utf-8"))
+
+
+def save(results: dict, path: str | Path) -> None:
+    Path(path).write_text(json.dumps(results, indent=2) + "\n", encoding="utf-8")
+
+
+def compare(results: dict, baseline: dict, tolerance: float, unit: str = "s") -> list[str]:
+    """Print per-operation ratios against baseline; returns the operations that regressed."""
+    scale = 1000.0 if unit == "ms" else 1.0
+    digits = 1 if unit == "ms" else 3
+    regressions = []
+    for op, current in results["operations"].items():
+        previous = baseline.get("operations", {}).get(op)
+        if not previous or not previous.get("seconds"):
+            continue
+        ratio = current["seconds"] / previous["seconds"]
+        marker = "REGRESSION" if ratio > 1 + tolerance else ("faster" if ratio < 1 - tolerance else "same")
+        before = f"{previous['seconds'] * scale:.{digits}f}{unit}"
+        after = f"{current['seconds'] * scale:.{digits}f}{unit}"
+        print(f"  {op:<22} {before:>10} -> {after:>10}  x{ratio:5.2f}  {marker}")
+        if marker == "REGRESSION":
+            regressions.append(op)
+    return regressions
+
+
+def report(results: dict, args: argparse.Namespace, config_keys: tuple[str, ...], unit: str = "s") -> int:
+    """Write --json / --save-baseline and compare with --baseline; returns the process exit code.
+
+    config_keys names the config entries that must match for the comparison to be like-for-like; a mismatch
+    only prints a warning.
+    """
+    if args.json:
+        save(results, args.json)
+    if args.save_baseline:
+        save(results, args.save_baseline)
+        print(f"\nBaseline saved to {args.save_baseline}")
+    if not args.baseline:
+        return 0
+    baseline = load(args.baseline)
+    previous_config = baseline.get("config", {})
+    if any(previous_config.get(key) != results["config"].get(key) for key in config_keys):
+        print("\nWarning: baseline was recorded with a different configuration (" + ", ".join(config_keys) + ").")
+    print(f"\nCompared with {args.baseline} (tolerance {args.tolerance:.0%}):")
+    return 1 if compare(results, baseline, args.tolerance, unit) else 0
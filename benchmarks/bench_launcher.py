@@ -0,0 +1,166 @@
+"""
+Launcher startup benchmark: time from starting the launcher to the GUI entry point running (time-to-execv).
+
+Builds a throwaway install root with a minimal app_live whose bot_runelite_IL/gui_pyside.py only records
+when it started, then launches it repeatedly. The launcher's in-launch work is the total minus the bundled
+interpreter's own startup, which is measured separately by running gui_pyside.py directly. The root has no
+updater.py, so the per-launch background check-stage is skipped and no network is needed.
+
+Run from repo root:
+  python benchmarks/bench_launcher.py --repeat 20
+  python benchmarks/bench_launcher.py --exe dist/flez-bot/flez-bot.exe --save-baseline benchmarks/launcher-baseline.json
+  python benchmarks/bench_launcher.py --exe dist/flez-bot/flez-bot.exe --baseline benchmarks/launcher-baseline.json
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+REPO_ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(REPO_ROOT))
+
+import baseline  # noqa: E402
+from launch_metrics import load_records, percentile  # noqa: E402
+
+BOOTSTRAP_FILES = ("launcher.py", "launch_metrics.py", "state_store.py")
+GUI_STUB = """import json, sys, time
+from pathlib import Path
+marker = Path(__file__).resolve().parents[2] / "tmp" / "gui_started.json"
+marker.write_text(json.dumps({"ns": time.time_ns(), "argv": sys.argv}), encoding="utf-8")
+"""
+
+
+def install_interpreter(runtime_dir: Path) -> dict[str, str]:
+    """Put a python.exe for this interpreter into runtime_dir; returns extra env needed to run it."""
+    runtime_dir.mkdir(parents=True, exist_ok=True)
+    target = runtime_dir / "python.exe"
+    source = Path(sys.executable).resolve()
+    try:
+        os.symlink(source, target)
+        return {}
+    except OSError:
+        pass
+    # Windows without symlink rights: copy the executable and its DLLs, find the stdlib via PYTHONHOME.
+    shutil.copy2(source, target)
+    for dll in source.parent.glob("*.dll"):
+        shutil.copy2(dll, runtime_dir / dll.name)
+    return {"PYTHONHOME": sys.base_prefix}
+
+
+def make_root(work: Path, exe: Path | None) -> tuple[Path, dict[str, str]]:
+    root = work / "root"
+    live = root / "app_live"
+    (live / "bot_runelite_IL").mkdir(parents=True)
+    (live / "version.json").write_text(json.dumps({"version": "1.0.0"}) + "\n", encoding="utf-8")
+    (live / "bot_runelite_IL" / "gui_pyside.py").write_text(GUI_STUB, encoding="utf-8")
+    (root / "tmp").mkdir(parents=True)
+    env = install_interpreter(live / "runtime" / "python")
+    if exe is not None:
+        # The frozen launcher uses its own directory as root: copy the onedir build next to app_live.
+        for item in exe.parent.iterdir():
+            if item.is_dir():
+                shutil.copytree(item, root / item.name)
+            else:
+                shutil.copy2(item, root / item.name)
+    else:
+        for name in BOOTSTRAP_FILES:
+            shutil.copy2(REPO_ROOT / name, root / name)
+    return root, env
+
+
+def time_to_gui(cmd: list[str], root: Path, env: dict[str, str], timeout: float = 60.0) -> float:
+    """Seconds from spawning cmd until the GUI stub has recorded its start."""
+    marker = root / "tmp" / "gui_started.json"
+    marker.unlink(missing_ok=True)
+    started = time.time_ns()
+    proc = subprocess.Popen(cmd, cwd=str(root), env={**os.environ, **env}, stdout=subprocess.DEVNULL)
+    deadline = time.monotonic() + timeout
+    # On Windows os.execv starts the GUI as a new process and the launcher exits, so poll the marker.
+    while not marker.exists():
+        if time.monotonic() > deadline:
+            proc.kill()
+            raise SystemExit(f"GUI stub did not start within {timeout:.0f}s: {' '.join(cmd)}")
+        time.sleep(0.002)
+    proc.wait(timeout=timeout)
+    for _ in range(100):
+        try:
+            return (json.loads(marker.read_text(encoding="utf-8"))["ns"] - started) / 1e9
+        except ValueError:
+            time.sleep(0.002)  # marker still being written
+    raise SystemExit("GUI stub marker unreadable")
+
+
+def summarize(values: list[float]) -> dict[str, float]:
+    return {
+        "seconds": statistics.median(values),
+        "p95": percentile(values, 95),
+        "min": min(values),
+    }
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="flez-bot launcher time-to-execv benchmark")
+    parser.add_argument("--exe", default="", help="frozen launcher (onedir flez-bot.exe); default runs launcher.py")
+    parser.add_argument("--repeat", type=int, default=10, help="warm launches (after one cold launch)")
+    parser.add_argument("--work-dir", default="", help="defaults to a temp dir that is removed afterwards")
+    baseline.add_arguments(parser)
+    args = parser.parse_args()
+
+    exe = Path(args.exe).resolve() if args.exe else None
+    work = Path(args.work_dir).resolve() if args.work_dir else Path(tempfile.mkdtemp(prefix="flez-bench-launcher-"))
+    work.mkdir(parents=True, exist_ok=True)
+    try:
+        root, env = make_root(work, exe)
+        python_exe = root / "app_live" / "runtime" / "python" / "python.exe"
+        gui = root / "app_live" / "bot_runelite_IL" / "gui_pyside.py"
+        launcher_cmd = [str(root / exe.name)] if exe is not None else [str(python_exe), str(root / "launcher.py")]
+
+        interpreter = [time_to_gui([str(python_exe), str(gui)], root, env) for _ in range(args.repeat)]
+        cold = time_to_gui(launcher_cmd, root, env)  # first launch also fills the validation cache
+        warm = [time_to_gui(launcher_cmd, root, env) for _ in range(args.repeat)]
+        overhead = [value - statistics.median(interpreter) for value in warm]
+
+        results = {
+            "config": {
+                "launcher": exe.name if exe is not None else "launcher.py",
+                "repeat": args.repeat,
+                "platform": sys.platform,
+                "python": sys.version.split()[0],
+            },
+            "operations": {
+                "interpreter_startup": summarize(interpreter),
+                "launch_cold": summarize([cold]),
+                "launch_to_gui": summarize(warm),
+                "launcher_overhead": summarize(overhead),
+            },
+        }
+        print(f"{'operation':<22} {'median ms':>10} {'p95 ms':>9} {'min ms':>9}")
+        for op, stats in results["operations"].items():
+            print(f"{op:<22} {stats['seconds'] * 1000:>10.1f} {stats['p95'] * 1000:>9.1f} {stats['min'] * 1000:>9.1f}")
+
+        records = [r for r in load_records(root / "state" / "launch_metrics.jsonl") if r.get("process") == "launcher"]
+        if records:
+            print("\nLauncher phases (warm launches, from launch_metrics.jsonl):")
+            phases: dict[str, list[float]] = {}
+            for record in records[1:]:
+                for phase, ms in record["phases"].items():
+                    phases.setdefault(phase, []).append(float(ms))
+            for phase, values in sorted(phases.items(), key=lambda item: -statistics.median(item[1])):
+                print(f"  {phase:<20} {statistics.median(values):>8.2f} ms")
+
+        return baseline.report(results, args, ("launcher",), unit="ms")
+    finally:
+        if not args.work_dir:
+            shutil.rmtree(work, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,290 @@
+"""
+Offline throughput benchmark for updater.py.
+
+Generates a synthetic app bundle (size, file count and compressibility are configurable), publishes it
+as app-full.zip + manifest.json behind a fake GitHub releases API on a local HTTP server, then times
+stage_latest, extract_to_stage, apply_staged_update and rollback end to end.
+
+Run from repo root (Linux or Windows, no network needed):
+  python benchmarks/bench_updater.py --size-mb 256 --files 4000 --repeat 3
+  python benchmarks/bench_updater.py --save-baseline benchmarks/baseline.json
+  python benchmarks/bench_updater.py --baseline benchmarks/baseline.json --tolerance 0.15
+"""
+from __future__ import annotations
+
+import argparse
+import hashlib
+import http.server
+import json
+import os
+import random
+import shutil
+import statistics
+import sys
+import tempfile
+import threading
+import time
+import zipfile
+from pathlib import Path
+
+REPO_ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(REPO_ROOT))
+sys.path.insert(0, str(REPO_ROOT / "packaging"))
+
+import baseline  # noqa: E402
+import updater  # noqa: E402
+
+BASE_VERSION = "1.0.0"
+TARGET_VERSION = "1.0.1-alpha.1"
+
+
+class ReleaseHandler(http.server.BaseHTTPRequestHandler):
+    """Static files with ETag, Range and If-Range, enough for every updater download path."""
+
+    root: Path = Path(".")
+
+    def log_message(self, format: str, *args: object) -> None:
+        pass
+
+    def do_GET(self) -> None:
+        path = self.root / self.path.lstrip("/").split("?", 1)[0]
+        if not path.is_file():
+            self.send_error(404)
+            return
+        st = path.stat()
+        etag = f'"{st.st_size:x}-{st.st_mtime_ns:x}"'
+        if self.headers.get("If-None-Match") == etag:
+            self.send_response(304)
+            self.send_header("ETag", etag)
+            self.end_headers()
+            return
+        start, end = 0, st.st_size - 1
+        status = 200
+        range_header = self.headers.get("Range", "")
+        if_range = self.headers.get("If-Range")
+        if range_header.startswith("bytes=") and (not if_range or if_range == etag):
+            first, _, last = range_header[6:].partition("-")
+            start = int(first)
+            end = min(int(last), st.st_size - 1) if last else st.st_size - 1
+            if start >= st.st_size:
+                self.send_response(416)
+                self.send_header("Content-Range", f"bytes */{st.st_size}")
+                self.end_headers()
+                return
+            status = 206
+        self.send_response(status)
+        self.send_header("ETag", etag)
+        self.send_header("Accept-Ranges", "bytes")
+        self.send_header("Content-Length", str(end - start + 1))
+        if status == 206:
+            self.send_header("Content-Range", f"bytes {start}-{end}/{st.st_size}")
+        self.end_headers()
+        with path.open("rb") as fh:
+            fh.seek(start)
+            remaining = end - start + 1
+            while remaining > 0:
+                chunk = fh.read(min(1024 * 1024, remaining))
+                if not chunk:
+                    break
+                self.wfile.write(chunk)
+                remaining -= len(chunk)
+
+
+def serve(directory: Path) -> tuple[http.server.ThreadingHTTPServer, str]:
+    handler = type("Handler", (ReleaseHandler,), {"root": directory})
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+
+def make_payload(size: int, compressibility: float, rng: random.Random) -> bytes:
+    compressible = int(size * compressibility)
+    text = (b"def handler(event, context):\n    return process(event)\n" * (compressible // 52 + 1))[:compressible]
+    return text + rng.randbytes(size - compressible)
+
+
+def generate_bundle(dest: Path, version: str, total_bytes: int, file_count: int, compressibility: float, seed: int) -> int:
+    """Write a valid app tree under dest; returns the number of files written."""
+    rng = random.Random(seed)
+    (dest / "runtime" / "python").mkdir(parents=True, exist_ok=True)
+    (dest / "bot_runelite_IL").mkdir(parents=True, exist_ok=True)
+    (dest / "version.json").write_text(json.dumps({"version": version}) + "\n", encoding="utf-8")
+    (dest / "runtime" / "python" / "python.exe").write_bytes(b"MZ" + rng.randbytes(4096))
+    (dest / "bot_runelite_IL" / "gui_pyside.py").write_text("print('gui')\n", encoding="utf-8")
+    bulk = max(1, file_count - 3)
+    # Log-normal sizes, like a real site-packages: many small files and a few large ones.
+    weights = [rng.lognormvariate(0, 1.5) for _ in range(bulk)]
+    scale = total_bytes / sum(weights)
+    for index, weight in enumerate(weights):
+        path = dest / "runtime" / "python" / "Lib" / "site-packages" / f"pkg{index % 97:02d}" / f"mod{index}.py"
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(make_payload(max(1, int(weight * scale)), compressibility, rng))
+    return bulk + 3
+
+
+def build_zip(src: Path, zip_path: Path) -> None:
+    with zipfile.ZipFile(zip_path, "w", compression=zipfile.ZIP_DEFLATED, compresslevel=6) as zf:
+        for path in sorted(p for p in src.rglob("*") if p.is_file()):
+            zf.write(path, path.relative_to(src).as_posix())
+
+
+def sha256_file(path: Path) -> str:
+    digest = hashlib.sha256()
+    with path.open("rb") as fh:
+        for chunk in iter(lambda: fh.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def publish(work: Path, base_url: str, bundle: Path, zip_index: bool) -> tuple[int, int]:
+    """Write releases.json, manifest.json and app-full.zip into the served dir; returns (zip bytes, files)."""
+    srv = work / "srv"
+    srv.mkdir(parents=True, exist_ok=True)
+    zip_path = srv / updater.APP_ARTIFACT_NAME
+    build_zip(bundle, zip_path)
+    artifact_sha = sha256_file(zip_path)
+    artifacts = [
+        {
+            "name": updater.APP_ARTIFACT_NAME,
+            "type": "full",
+            "url": f"{base_url}/{updater.APP_ARTIFACT_NAME}",
+            "sha256": artifact_sha,
+            "sizeBytes": zip_path.stat().st_size,
+        }
+    ]
+    if zip_index:
+        import release_index
+
+        index_path = srv / updater.ZIP_INDEX_ARTIFACT_NAME
+        release_index.cmd_zip_index(argparse.Namespace(zip=str(zip_path), out=str(index_path)))
+        artifacts.append(
+            {
+                "name": updater.ZIP_INDEX_ARTIFACT_NAME,
+                "type": "zip-index",
+                "url": f"{base_url}/{updater.ZIP_INDEX_ARTIFACT_NAME}",
+                "sha256": sha256_file(index_path),
+                "sizeBytes": index_path.stat().st_size,
+            }
+        )
+    manifest = {"version": TARGET_VERSION, "channel": "alpha", "artifacts": artifacts}
+    (srv / updater.MANIFEST_ASSET_NAME).write_text(json.dumps(manifest, indent=2) + "\n", encoding="utf-8")
+    releases = [
+        {
+            "tag_name": f"v{TARGET_VERSION}",
+            "prerelease": True,
+            "assets": [
+                {
+                    "name": updater.MANIFEST_ASSET_NAME,
+                    "browser_download_url": f"{base_url}/{updater.MANIFEST_ASSET_NAME}",
+                }
+            ],
+        }
+    ]
+    (srv / "releases.json").write_text(json.dumps(releases) + "\n", encoding="utf-8")
+    with zipfile.ZipFile(zip_path) as zf:
+        file_count = sum(1 for info in zf.infolist() if not info.is_dir())
+    return zip_path.stat().st_size, file_count
+
+
+def timed(fn, *args, **kwargs) -> tuple[float, object]:
+    start = time.perf_counter()
+    result = fn(*args, **kwargs)
+    return time.perf_counter() - start, result
+
+
+def run_once(work: Path, live_template: Path, zip_path: Path, run: int) -> dict[str, float]:
+    root = work / f"run{run}"
+    shutil.rmtree(root, ignore_errors=True)
+    shutil.copytree(live_template, root / "app_live")
+    # Steady state: a previous backup and a previous failed_live exist, so apply/rollback pay for clearing them.
+    shutil.copytree(live_template, root / "app_backup")
+    shutil.copytree(live_template, root / "tmp" / "failed_live")
+    logger, _ = updater.setup_logger(root)
+    timings: dict[str, float] = {}
+
+    seconds, (ok, detail) = timed(updater.stage_latest, root, "alpha", logger, releases_ttl=0)
+    if not ok or detail != "staged":
+        raise SystemExit(f"stage_latest failed: {detail}")
+    timings["stage_latest"] = seconds
+
+    extract_dir = root / "tmp" / "bench_extract"
+    seconds, _ = timed(updater.extract_to_stage, zip_path, extract_dir, root, logger)
+    timings["extract_to_stage"] = seconds
+
+    seconds, (ok, detail) = timed(updater.apply_staged_update, root, "alpha", logger)
+    if not ok:
+        raise SystemExit(f"apply_staged_update failed: {detail}")
+    timings["apply_staged_update"] = seconds
+
+    seconds, (ok, detail) = timed(updater.rollback, root, "alpha", logger)
+    if not ok:
+        raise SystemExit(f"rollback failed: {detail}")
+    timings["rollback"] = seconds
+
+    shutil.rmtree(root, ignore_errors=True)
+    return timings
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="flez-bot updater throughput benchmark")
+    parser.add_argument("--size-mb", type=float, default=128, help="uncompressed bundle size")
+    parser.add_argument("--files", type=int, default=3000)
+    parser.add_argument("--compressibility", type=float, default=0.5, help="0 = random bytes, 1 = text only")
+    parser.add_argument("--zip-index", action="store_true", help="publish app-full.index.json (streaming extract)")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--work-dir", default="", help="defaults to a temp dir that is removed afterwards")
+    baseline.add_arguments(parser)
+    args = parser.parse_args()
+
+    work = Path(args.work_dir).resolve() if args.work_dir else Path(tempfile.mkdtemp(prefix="flez-bench-"))
+    work.mkdir(parents=True, exist_ok=True)
+    server, base_url = serve(work / "srv")
+    updater.RELEASES_API_URL = f"{base_url}/releases.json"
+    try:
+        total_bytes = int(args.size_mb * 1024 * 1024)
+        print(f"Generating bundle: {args.size_mb:g} MB, {args.files} files, compressibility={args.compressibility:g}")
+        live_template = work / "live"
+        generate_bundle(live_template, BASE_VERSION, total_bytes, args.files, args.compressibility, args.seed)
+        bundle = work / "bundle"
+        generate_bundle(bundle, TARGET_VERSION, total_bytes, args.files, args.compressibility, args.seed + 1)
+        zip_bytes, file_count = publish(work, base_url, bundle, args.zip_index)
+        print(f"Published {updater.APP_ARTIFACT_NAME}: {zip_bytes / 1e6:.1f} MB compressed, {file_count} files")
+
+        samples: dict[str, list[float]] = {}
+        for run in range(args.repeat):
+            for op, seconds in run_once(work, live_template, work / "srv" / updater.APP_ARTIFACT_NAME, run).items():
+                samples.setdefault(op, []).append(seconds)
+
+        results = {
+            "config": {
+                "sizeMb": args.size_mb,
+                "files": file_count,
+                "compressibility": args.compressibility,
+                "zipIndex": args.zip_index,
+                "zipBytes": zip_bytes,
+                "repeat": args.repeat,
+                "cpuCount": os.cpu_count(),
+                "platform": sys.platform,
+            },
+            "operations": {},
+        }
+        print(f"\n{'operation':<22} {'median s':>9} {'min s':>8} {'MB/s':>9} {'files/s':>10}")
+        for op, values in samples.items():
+            median = statistics.median(values)
+            # stage/extract move the bundle's bytes; apply/rollback are reported against the same size for comparison.
+            mbps = total_bytes / 1e6 / median if median else 0.0
+            files_per_s = file_count / median if median else 0.0
+            results["operations"][op] = {"seconds": median, "min": min(values), "mbps": mbps, "filesPerSecond": files_per_s}
+            print(f"{op:<22} {median:>9.3f} {min(values):>8.3f} {mbps:>9.1f} {files_per_s:>10.0f}")
+
+        return baseline.report(results, args, ("sizeMb", "files"))
+    finally:
+        server.shutdown()
+        if not args.work_dir:
+            shutil.rmtree(work, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
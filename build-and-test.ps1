@@ -14,20 +14,29 @@ Write-Host "Building flez-bot.exe..." -ForegroundColor Cyan
 python -m PyInstaller flez-bot.spec
 if ($LASTEXITCODE -ne 0) { exit $LASTEXITCODE }
 
-$exe = Join-Path $root "dist\flez-bot.exe"
+$exe = Join-Path $root "dist\flez-bot\flez-bot.exe"
+$internal = Join-Path $root "dist\flez-bot\_internal"
 if (-not (Test-Path $exe)) {
-    Write-Host "Build failed: dist\flez-bot.exe not found." -ForegroundColor Red
+    Write-Host "Build failed: dist\flez-bot\flez-bot.exe not found." -ForegroundColor Red
     exit 1
 }
 
+# Onedir build: flez-bot.exe needs its _internal folder next to it.
+function Copy-Launcher([string]$DestDir) {
+    Copy-Item $exe (Join-Path $DestDir "flez-bot.exe") -Force
+    $destInternal = Join-Path $DestDir "_internal"
+    if (Test-Path $destInternal) { Remove-Item $destInternal -Recurse -Force }
+    Copy-Item $internal $destInternal -Recurse -Force
+}
+
 # Copy to repo root (for when you build the installer later)
-Copy-Item $exe (Join-Path $root "flez-bot.exe") -Force
-Write-Host "Copied to repo root (flez-bot.exe)." -ForegroundColor Green
+Copy-Launcher $root
+Write-Host "Copied to repo root (flez-bot.exe, _internal)." -ForegroundColor Green
 
 # Copy to default install dir if it exists (quick test without reinstalling)
 $installDir = Join-Path $env:LOCALAPPDATA "flez-bot"
 if (Test-Path $installDir) {
-    Copy-Item $exe (Join-Path $installDir "flez-bot.exe") -Force
+    Copy-Launcher $installDir
     Write-Host "Copied to install dir: $installDir" -ForegroundColor Green
     if (-not $NoLaunch) {
         Write-Host "Launching..." -ForegroundColor Cyan
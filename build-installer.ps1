@@ -114,8 +114,11 @@ Write-Host "  Step 2/3: Build flez-bot.exe (PyInstaller)" -ForegroundColor Cyan
 Write-Host "==============================================" -ForegroundColor Cyan
 & python -m PyInstaller flez-bot.spec
 if ($LASTEXITCODE -ne 0) { throw "PyInstaller failed." }
-Copy-Item -Path "dist\flez-bot.exe" -Destination ".\flez-bot.exe" -Force
-Write-Host "  flez-bot.exe copied to repo root." -ForegroundColor Green
+# Onedir build: the exe needs its _internal folder next to it.
+Copy-Item -Path "dist\flez-bot\flez-bot.exe" -Destination ".\flez-bot.exe" -Force
+if (Test-Path ".\_internal") { Remove-Item -Path ".\_internal" -Recurse -Force }
+Copy-Item -Path "dist\flez-bot\_internal" -Destination ".\_internal" -Recurse -Force
+Write-Host "  flez-bot.exe and _internal copied to repo root." -ForegroundColor Green
 Write-Host ""
 
 Write-Host "==============================================" -ForegroundColor Cyan
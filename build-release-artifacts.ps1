@@ -1,6 +1,11 @@
 param(
     [string]$Channel = "alpha",
     [string]$ReleaseBaseUrl = "https://github.com/Roflz/flez-bot/releases/latest/download",
+    [string]$BlobBaseUrl = "",
+    [string[]]$Mirror = @(),
+    [string]$PreviousArtifact = "",
+    [string]$PreviousVersion = "",
+    [string]$BuildPython = "python",
     [string]$Version,
     [switch]$RebuildRuntime,
     [switch]$Incremental,
@@ -19,6 +24,11 @@ $artifactPath = Join-Path $distDir "app-full.zip"
 $manifestPath = Join-Path $distDir "manifest.json"
 $artifactShaPath = Join-Path $distDir "app-full.zip.sha256"
 $manifestShaPath = Join-Path $distDir "manifest.json.sha256"
+$filesIndexPath = Join-Path $distDir "app-files.json"
+$zipIndexPath = Join-Path $distDir "app-full.index.json"
+$zstArtifactPath = Join-Path $distDir "app-full.tar.zst"
+$blobsDir = Join-Path $distDir "blobs"
+$releaseIndexScript = Join-Path $root "packaging\release_index.py"
 $incrementalStatePath = Join-Path $distDir "app-full.incremental.json"
 $archiveStatsPath = Join-Path $distDir "app-full.archive-stats.json"
 $runtimeRoot = Join-Path $root "runtime\python"
@@ -590,11 +600,107 @@ Invoke-Phase -Name "Hash + manifest generation" -Action {
     $artifactSize = (Get-Item $artifactPath).Length
     Set-Content -Path $artifactShaPath -Value ($artifactHash + "  app-full.zip") -Encoding ASCII
 
+    if (Test-Path $blobsDir) {
+        Remove-Item -Path $blobsDir -Recurse -Force
+    }
+    if (Test-Path $filesIndexPath) {
+        Remove-Item -Path $filesIndexPath -Force
+    }
+    # Blobs are only useful where they are uploaded: GitHub release assets cannot hold a blobs/ directory,
+    # so the per-file index (and the patches, whose blobs live next to it) is built only for -BlobBaseUrl.
+    $publishBlobs = [bool]$BlobBaseUrl
+    if ($publishBlobs) {
+        Write-Step "Building per-file index and content-addressed blobs..."
+        Invoke-Checked -FilePath $BuildPython -Arguments @(
+            $releaseIndexScript, "files",
+            "--stage", $releaseStage,
+            "--out", $filesIndexPath,
+            "--blobs", $blobsDir,
+            "--version", $version
+        )
+    } else {
+        Write-Step "No -BlobBaseUrl given. Skipping app-files.json, blobs and binary patches."
+    }
+    Write-Step "Building app-full.zip entry index..."
+    Invoke-Checked -FilePath $BuildPython -Arguments @(
+        $releaseIndexScript, "zip-index",
+        "--zip", $artifactPath,
+        "--out", $zipIndexPath
+    )
+    if (Test-Path $zstArtifactPath) {
+        Remove-Item -Path $zstArtifactPath -Force
+    }
+    # find_spec writes nothing to stderr, which Windows PowerShell would turn into an error under Stop.
+    & $BuildPython -c "import importlib.util, sys; sys.exit(importlib.util.find_spec('zstandard') is None)"
+    if ($LASTEXITCODE -eq 0) {
+        Write-Step "Building app-full.tar.zst..."
+        Invoke-Checked -FilePath $BuildPython -Arguments @(
+            $releaseIndexScript, "tar-zst",
+            "--stage", $releaseStage,
+            "--out", $zstArtifactPath
+        )
+    } else {
+        Write-Step "zstandard not installed for $BuildPython. Skipping app-full.tar.zst (updaters use app-full.zip)."
+    }
+    $filesArtifacts = @()
+    if ($publishBlobs) {
+        $filesArtifacts += @{
+            name = "app-files.json"
+            type = "files"
+            url = ($ReleaseBaseUrl.TrimEnd("/") + "/app-files.json")
+            sizeBytes = (Get-Item $filesIndexPath).Length
+            sha256 = (Get-FileHash -Path $filesIndexPath -Algorithm SHA256).Hash.ToLowerInvariant()
+            blobBaseUrl = $BlobBaseUrl.TrimEnd("/")
+        }
+    }
+
+    $patchArtifacts = @()
+    if ($publishBlobs -and $PreviousArtifact -and $PreviousVersion) {
+        if (-not (Test-Path $PreviousArtifact)) {
+            throw ("Previous artifact not found: " + $PreviousArtifact)
+        }
+        $patchName = "patch-" + $PreviousVersion + "-" + $version + ".json"
+        $patchIndexPath = Join-Path $distDir $patchName
+        Write-Step ("Building binary patches from " + $PreviousVersion + " to " + $version + "...")
+        Invoke-Checked -FilePath $BuildPython -Arguments @(
+            $releaseIndexScript, "patches",
+            "--stage", $releaseStage,
+            "--previous-zip", $PreviousArtifact,
+            "--from-version", $PreviousVersion,
+            "--to-version", $version,
+            "--out", $patchIndexPath,
+            "--blobs", $blobsDir
+        )
+        $patchArtifacts += @{
+            name = $patchName
+            type = "patch"
+            fromVersion = $PreviousVersion
+            toVersion = $version
+            url = ($ReleaseBaseUrl.TrimEnd("/") + "/" + $patchName)
+            sizeBytes = (Get-Item $patchIndexPath).Length
+            sha256 = (Get-FileHash -Path $patchIndexPath -Algorithm SHA256).Hash.ToLowerInvariant()
+        }
+    } elseif ($publishBlobs) {
+        Write-Step "No -PreviousArtifact/-PreviousVersion given. Skipping binary patches."
+    }
+
+    $zstArtifacts = @()
+    if (Test-Path $zstArtifactPath) {
+        $zstArtifacts += @{
+            name = "app-full.tar.zst"
+            type = "full-zst"
+            url = ($ReleaseBaseUrl.TrimEnd("/") + "/app-full.tar.zst")
+            sizeBytes = (Get-Item $zstArtifactPath).Length
+            sha256 = (Get-FileHash -Path $zstArtifactPath -Algorithm SHA256).Hash.ToLowerInvariant()
+        }
+    }
+
     $manifest = @{
         schemaVersion = 1
         minUpdaterVersion = 1
         version = $version
         channel = $Channel
+        mirrors = @($Mirror)
         artifacts = @(
             @{
                 name = "app-full.zip"
@@ -602,8 +708,15 @@ Invoke-Phase -Name "Hash + manifest generation" -Action {
                 url = ($ReleaseBaseUrl.TrimEnd("/") + "/app-full.zip")
                 sizeBytes = $artifactSize
                 sha256 = $artifactHash
+            },
+            @{
+                name = "app-full.index.json"
+                type = "zip-index"
+                url = ($ReleaseBaseUrl.TrimEnd("/") + "/app-full.index.json")
+                sizeBytes = (Get-Item $zipIndexPath).Length
+                sha256 = (Get-FileHash -Path $zipIndexPath -Algorithm SHA256).Hash.ToLowerInvariant()
             }
-        )
+        ) + $zstArtifacts + $filesArtifacts + $patchArtifacts
     }
     $manifestText = $manifest | ConvertTo-Json -Depth 8
     Write-Utf8NoBom -Path $manifestPath -Content ($manifestText + "`n")
@@ -616,5 +729,10 @@ Write-Step ("Total elapsed: " + (Format-Duration -Duration $totalTimer.Elapsed))
 Write-Host "Release artifacts generated:" -ForegroundColor Green
 Write-Host " - dist\app-full.zip"
 Write-Host " - dist\app-full.zip.sha256"
+Write-Host " - dist\app-full.index.json"
+Write-Host " - dist\app-full.tar.zst (when zstandard is installed)"
+Write-Host " - dist\app-files.json (when -BlobBaseUrl is given)"
+Write-Host " - dist\patch-<from>-<to>.json (when -BlobBaseUrl and -PreviousArtifact are given)"
+Write-Host " - dist\blobs\<sha256> (upload under -BlobBaseUrl)"
 Write-Host " - dist\manifest.json"
 Write-Host " - dist\manifest.json.sha256"
@@ -1,7 +1,12 @@
 # PyInstaller spec for flez-bot.exe (launcher).
 # Run from flez-bot root: pyinstaller flez-bot.spec
-# Output: dist/flez-bot/flez-bot.exe (copy into install dir alongside bot_runelite_IL, runelite).
-# When run, the exe uses its directory as the flez-bot root (see launcher._flez_bot_root).
+# Output: dist/flez-bot/flez-bot.exe plus dist/flez-bot/_internal/ (ship both into the install dir,
+# alongside bot_runelite_IL, runelite). When run, the exe uses its directory as the flez-bot root
+# (see launcher._root).
+#
+# Slim onedir build: the launcher only needs the stdlib and os.execv's app_live's bundled interpreter
+# for the GUI, so no GUI toolkit is collected, nothing is UPX-packed, and nothing is unpacked to a temp
+# dir on each start. Measure with: python benchmarks/bench_launcher.py --exe dist/flez-bot/flez-bot.exe
 
 # -*- mode: python ; coding: utf-8 -*-
 import sys
@@ -13,21 +18,40 @@ a = Analysis(
     pathex=[],
     binaries=[],
     datas=[],
+    # Stdlib modules updater.py needs when the launcher loads it from disk and runs it in-process.
+    # A missing one only makes the launcher fall back to running updater.py in a subprocess.
     hiddenimports=[
-        'PySide6',
-        'PySide6.QtCore',
-        'PySide6.QtGui',
-        'PySide6.QtWidgets',
-        'pkgutil',   # used by plan discovery (bot_runelite_IL loaded from disk)
-        'psutil',    # used by client_detector_pyside
-        'urllib.request',  # used by home_tab_pyside (loaded from disk)
-        'urllib.parse',
-        'webbrowser',  # used by login_dialog_pyside (loaded from disk)
+        'argparse',
+        'bz2',
+        'io',
+        'queue',
+        'sqlite3',
+        'tarfile',
+        'zipfile',
+        'zlib',
+        'concurrent.futures',
+        'urllib.request',
+        'urllib.error',
+        'ctypes',
+        'ctypes.wintypes',
+        'importlib.util',
     ],
     hookspath=[],
     hooksconfig={},
     runtime_hooks=[],
-    excludes=[],
+    excludes=[
+        'PySide6',
+        'shiboken6',
+        'psutil',
+        'tkinter',
+        '_tkinter',
+        'unittest',
+        'pydoc',
+        'doctest',
+        'lib2to3',
+        'setuptools',
+        'pip',
+    ],
     win_no_prefer_redirects=False,
     win_private_assemblies=False,
     cipher=block_cipher,
@@ -39,18 +63,14 @@ pyz = PYZ(a.pure, a.zipped_data, cipher=block_cipher)
 exe = EXE(
     pyz,
     a.scripts,
-    a.binaries,
-    a.zipfiles,
-    a.datas,
     [],
+    exclude_binaries=True,
     name='flez-bot',
     icon='packaging/icon.ico',
     debug=False,
     bootloader_ignore_signals=False,
     strip=False,
-    upx=True,
-    upx_exclude=[],
-    runtime_tmpdir=None,
+    upx=False,
     console=False,  # No CMD window; GUI only
     disable_windowed_traceback=False,
     argv_emulation=False,
@@ -58,3 +78,14 @@ exe = EXE(
     codesign_identity=None,
     entitlements_file=None,
 )
+
+coll = COLLECT(
+    exe,
+    a.binaries,
+    a.zipfiles,
+    a.datas,
+    strip=False,
+    upx=False,
+    upx_exclude=[],
+    name='flez-bot',
+)
@@ -0,0 +1,137 @@
+"""
+Per-phase timing for launcher.py and updater.py.
+
+- `Spans` times named phases with `with spans.span("phase"):` (perf_counter, milliseconds).
+- `Spans.write` appends one JSON line per run to `state\\launch_metrics.jsonl`; the file is trimmed to
+  the newest MAX_RECORDS runs once it grows past TRIM_BYTES.
+- `python launch_metrics.py [--root DIR] [--last N]` prints p50/p95 per process, app version and phase.
+"""
+
+from __future__ import annotations
+
+import contextlib
+import json
+import os
+import time
+from collections.abc import Iterator
+from datetime import datetime, timezone
+from pathlib import Path
+
+METRICS_FILE_NAME = "launch_metrics.jsonl"
+MAX_RECORDS = 500
+TRIM_BYTES = 512 * 1024
+
+
+class Spans:
+    def __init__(self, process: str) -> None:
+        self.process = process
+        self.started = time.perf_counter()
+        self.phases: list[tuple[str, float]] = []
+
+    @contextlib.contextmanager
+    def span(self, phase: str) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases.append((phase, (time.perf_counter() - start) * 1000.0))
+
+    def elapsed_ms(self) -> float:
+        return (time.perf_counter() - self.started) * 1000.0
+
+    def record(self, version: str, **extra: object) -> dict:
+        phases: dict[str, float] = {}
+        for phase, ms in self.phases:
+            phases[phase] = round(phases.get(phase, 0.0) + ms, 2)
+        return {
+            "process": self.process,
+            "version": version,
+            "pid": os.getpid(),
+            "at": datetime.now(timezone.utc).replace(microsecond=0).isoformat().replace("+00:00", "Z"),
+            "totalMs": round(self.elapsed_ms(), 2),
+            "phases": phases,
+            **extra,
+        }
+
+    def write(self, state_dir: Path, version: str, **extra: object) -> None:
+        """Append this run's record; never raises, timing must not break a launch."""
+        path = state_dir / METRICS_FILE_NAME
+        try:
+            line = json.dumps(self.record(version, **extra)) + "\n"
+            with path.open("a", encoding="utf-8") as fh:
+                fh.write(line)
+            if path.stat().st_size > TRIM_BYTES:
+                _trim(path)
+        except Exception:
+            pass
+
+
+def _trim(path: Path) -> None:
+    lines = path.read_text(encoding="utf-8", errors="replace").splitlines(keepends=True)
+    tmp_path = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+    tmp_path.write_text("".join(lines[-MAX_RECORDS:]), encoding="utf-8")
+    os.replace(tmp_path, path)
+
+
+def load_records(path: Path) -> list[dict]:
+    records = []
+    if not path.exists():
+        return records
+    for line in path.read_text(encoding="utf-8", errors="replace").splitlines():
+        try:
+            record = json.loads(line)
+        except ValueError:
+            continue
+        if isinstance(record, dict) and isinstance(record.get("phases"), dict):
+            records.append(record)
+    return records
+
+
+def percentile(values: list[float], pct: float) -> float:
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    rank = (len(ordered) - 1) * pct / 100.0
+    low = int(rank)
+    high = min(low + 1, len(ordered) - 1)
+    return ordered[low] + (ordered[high] - ordered[low]) * (rank - low)
+
+
+def summarize(records: list[dict]) -> list[tuple[str, str, str, int, float, float]]:
+    """(process, version, phase, samples, p50 ms, p95 ms) rows; phase "total" is the whole run."""
+    grouped: dict[tuple[str, str, str], list[float]] = {}
+    for record in records:
+        key = (str(record.get("process", "?")), str(record.get("version", "?")))
+        for phase, ms in record["phases"].items():
+            grouped.setdefault((*key, phase), []).append(float(ms))
+        if "totalMs" in record:
+            grouped.setdefault((*key, "total"), []).append(float(record["totalMs"]))
+    rows = []
+    for (process, version, phase), values in sorted(grouped.items()):
+        rows.append((process, version, phase, len(values), percentile(values, 50), percentile(values, 95)))
+    return rows
+
+
+def main() -> int:
+    import argparse  # report CLI only; the launcher imports this module on every start
+
+    parser = argparse.ArgumentParser(description="flez-bot launch timing report")
+    parser.add_argument("--root", default=str(Path(__file__).resolve().parent))
+    parser.add_argument("--last", type=int, default=0, help="only use the newest N records (0 = all)")
+    args = parser.parse_args()
+
+    path = Path(args.root).resolve() / "state" / METRICS_FILE_NAME
+    records = load_records(path)
+    if args.last > 0:
+        records = records[-args.last :]
+    if not records:
+        print(f"No timing records in {path}")
+        return 1
+    print(f"{'process':<10} {'version':<16} {'phase':<22} {'n':>5} {'p50 ms':>10} {'p95 ms':>10}")
+    for process, version, phase, count, p50, p95 in summarize(records):
+        print(f"{process:<10} {version:<16} {phase:<22} {count:>5} {p50:>10.1f} {p95:>10.1f}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -13,17 +13,24 @@ from __future__ import annotations
 import json
 import logging
 import os
-import shutil
 import subprocess
 import sys
 from datetime import datetime, timezone
 from pathlib import Path
 
+from launch_metrics import Spans
+from state_store import StateLockTimeout, get_store
+
 STATUS_IDLE = "idle"
 STATUS_DOWNLOADED_STAGED = "downloaded_staged"
 STATUS_APPLIED_PENDING_HEALTHCHECK = "applied_pending_healthcheck"
 STATUS_ROLLED_BACK = "rolled_back"
 STATUS_FAILED_REQUIRES_REINSTALL = "failed_requires_reinstall"
+# Synchronous updater work waits this long for a running (e.g. throttled background) updater's lease;
+# the subprocess fallback gets the same wait plus a budget for the work itself.
+UPDATER_LEASE_WAIT_SECONDS = 60
+UPDATER_RUN_SECONDS = 600
+UPDATER_BUSY_ACTION = "action=retry_later"
 
 
 def _root() -> Path:
@@ -80,30 +87,30 @@ def _default_state() -> dict:
 
 
 def _load_state(root: Path, logger: logging.Logger) -> dict:
-    sp = _state_path(root)
-    if not sp.exists():
-        state = _default_state()
-        _save_state(root, state)
-        return state
+    return get_store(_state_path(root)).load(_default_state, logger)
+
+
+def _save_state(root: Path, state: dict, logger: logging.Logger) -> None:
+    # Never block or write unlocked on launch: a skipped status write is redone on the next launch.
     try:
-        state = json.loads(sp.read_text(encoding="utf-8-sig"))
-        if not isinstance(state, dict):
-            raise ValueError("state.json is not an object")
-        return state
-    except Exception as exc:
-        logger.error("state.json invalid: %s", exc)
-        state = _default_state()
-        _save_state(root, state)
-        return state
+        get_store(_state_path(root)).save(state, logger)
+    except StateLockTimeout as exc:
+        logger.warning("state.json not saved (updater busy), deferring to next launch: %s", exc)
+
 
+def _validation_cache_path(root: Path) -> Path:
+    return root / "state" / "validation.json"
 
-def _save_state(root: Path, state: dict) -> None:
-    state.setdefault("timestamps", {})
-    state["timestamps"]["updatedAt"] = datetime.now(timezone.utc).isoformat().replace("+00:00", "Z")
-    _state_path(root).write_text(json.dumps(state, indent=2) + "\n", encoding="utf-8")
 
+def _app_fingerprint(app_dir: Path, required: list[Path]) -> list:
+    fingerprint = []
+    for path in [app_dir, *required]:
+        st = path.stat()
+        fingerprint.append([path.relative_to(app_dir).as_posix(), st.st_size, st.st_mtime_ns, st.st_ino])
+    return fingerprint
 
-def _validate_app_dir(app_dir: Path) -> tuple[bool, str]:
+
+def _validate_app_dir(app_dir: Path, cache_path: Path | None = None) -> tuple[bool, str]:
     required = [
         app_dir / "version.json",
         app_dir / "runtime" / "python" / "python.exe",
@@ -118,6 +125,16 @@ def _validate_app_dir(app_dir: Path) -> tuple[bool, str]:
             return False, "version.json missing version"
     except Exception as exc:
         return False, f"version.json parse failed: {exc}"
+    # The interpreter spawn is the slow part; skip it when nothing it depends on has changed.
+    fingerprint = None
+    if cache_path is not None:
+        try:
+            fingerprint = _app_fingerprint(app_dir, required)
+            cached = json.loads(cache_path.read_text(encoding="utf-8"))
+            if cached.get("appDir") == str(app_dir) and cached.get("fingerprint") == fingerprint:
+                return True, ""
+        except Exception:
+            pass
     try:
         r = subprocess.run(
             [str(app_dir / "runtime" / "python" / "python.exe"), "--version"],
@@ -129,22 +146,80 @@ def _validate_app_dir(app_dir: Path) -> tuple[bool, str]:
             return False, f"python --version failed with exit {r.returncode}"
     except Exception as exc:
         return False, f"python runtime check failed: {exc}"
+    if cache_path is not None and fingerprint is not None:
+        try:
+            cache_path.write_text(
+                json.dumps({"appDir": str(app_dir), "fingerprint": fingerprint}) + "\n",
+                encoding="utf-8",
+            )
+        except OSError:
+            pass
     return True, ""
 
 
+_updater_engine = None
+
+
+def _load_updater_engine(root: Path, logger: logging.Logger):
+    """Import root/updater.py once so synchronous updater work skips a second interpreter start."""
+    global _updater_engine
+    if _updater_engine is not None:
+        return _updater_engine
+    updater = root / "updater.py"
+    if not updater.exists():
+        return None
+    try:
+        import importlib.util
+
+        spec = importlib.util.spec_from_file_location("flez_updater_engine", updater)
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+    except Exception as exc:
+        logger.warning("In-process updater unavailable; using subprocess: %s", exc)
+        return None
+    if not hasattr(module, "run_mode"):
+        logger.warning("updater.py has no engine API; using subprocess.")
+        return None
+    _updater_engine = module
+    return module
+
+
 def _run_updater(root: Path, mode: str, channel: str, logger: logging.Logger) -> tuple[bool, str]:
+    engine = _load_updater_engine(root, logger)
+    if engine is not None:
+        logger.info("updater in-process: mode=%s channel=%s", mode, channel)
+        try:
+            ok, detail = engine.run_mode(
+                root, mode, channel=channel, wait=True, wait_seconds=UPDATER_LEASE_WAIT_SECONDS
+            )
+        except Exception as exc:
+            logger.error("updater in-process %s raised: %s", mode, exc)
+            return False, str(exc)
+        (logger.info if ok else logger.warning)("updater in-process result: %s", detail)
+        return ok, detail
+    return _run_updater_subprocess(root, mode, channel, logger)
+
+
+def _run_updater_subprocess(root: Path, mode: str, channel: str, logger: logging.Logger) -> tuple[bool, str]:
     updater = root / "updater.py"
     if not updater.exists():
         return False, "updater.py not found"
     python_exe = root / "app_live" / "runtime" / "python" / "python.exe"
     if not python_exe.exists():
+        import shutil
+
         resolved = shutil.which("python")
         if not resolved:
             return False, "python runtime unavailable for updater"
         python_exe = Path(resolved)
-    cmd = [str(python_exe), str(updater), "--root", str(root), "--channel", channel, "--mode", mode]
+    cmd = [
+        str(python_exe), str(updater), "--root", str(root), "--channel", channel, "--mode", mode,
+        "--wait", str(UPDATER_LEASE_WAIT_SECONDS),
+    ]
     try:
-        r = subprocess.run(cmd, cwd=str(root), capture_output=True, text=True, timeout=600)
+        r = subprocess.run(
+            cmd, cwd=str(root), capture_output=True, text=True, timeout=UPDATER_LEASE_WAIT_SECONDS + UPDATER_RUN_SECONDS
+        )
         logger.info("updater cmd: %s", " ".join(cmd))
         if r.stdout:
             logger.info("updater stdout: %s", r.stdout.strip())
@@ -158,17 +233,26 @@ def _run_updater(root: Path, mode: str, channel: str, logger: logging.Logger) ->
         return False, str(exc)
 
 
-def _run_updater_background(root: Path, mode: str, channel: str, logger: logging.Logger) -> tuple[bool, str]:
+def _run_updater_background(
+    root: Path,
+    mode: str,
+    channel: str,
+    logger: logging.Logger,
+    extra_args: list[str] | None = None,
+) -> tuple[bool, str]:
     updater = root / "updater.py"
     if not updater.exists():
         return False, "updater.py not found"
     python_exe = root / "app_live" / "runtime" / "python" / "python.exe"
     if not python_exe.exists():
+        import shutil
+
         resolved = shutil.which("python")
         if not resolved:
             return False, "python runtime unavailable for updater"
         python_exe = Path(resolved)
     cmd = [str(python_exe), str(updater), "--root", str(root), "--channel", channel, "--mode", mode]
+    cmd += extra_args or []
     try:
         kwargs: dict = {
             "cwd": str(root),
@@ -240,6 +324,30 @@ def _launch_live(paths: dict[str, Path], logger: logging.Logger) -> None:
     os.execv(str(py), [str(py), str(entry)])
 
 
+def _updater_busy(detail: str) -> bool:
+    """The synchronous updater gave up waiting for another updater's lease."""
+    return UPDATER_BUSY_ACTION in detail
+
+
+def _exit_updater_busy(what: str, log_path: Path) -> None:
+    """Another updater is still working on app_stage/app_live; ask the user to start again shortly
+    instead of blocking this launch or flagging the install for reinstall."""
+    text = (
+        "flez-bot is finishing an update in the background.\n\n"
+        f"{what} has to wait for it. Please start flez-bot again in a minute.\n\n"
+        f"Log file:\n{log_path}"
+    )
+    print(text)
+    if sys.platform == "win32":
+        try:
+            import ctypes
+
+            ctypes.windll.user32.MessageBoxW(0, text, "flez-bot is updating", 0x40)
+        except Exception:
+            pass
+    raise SystemExit(1)
+
+
 def _fail_with_reinstall(msg: str, log_path: Path, title: str = "flez-bot needs reinstall") -> None:
     text = (
         "flez-bot could not start safely.\n\n"
@@ -259,77 +367,102 @@ def _fail_with_reinstall(msg: str, log_path: Path, title: str = "flez-bot needs
 
 
 def main() -> int:
+    spans = Spans("launcher")
     root = _root()
-    paths = _ensure_layout(root)
-    logger, log_path = _setup_logger(root)
+    with spans.span("layout"):
+        paths = _ensure_layout(root)
+    with spans.span("logger"):
+        logger, log_path = _setup_logger(root)
     logger.info("Launcher start. root=%s", root)
     logger.info("Launcher log path: %s", log_path)
 
-    state = _load_state(root, logger)
+    with spans.span("state_load"):
+        state = _load_state(root, logger)
     channel = str(state.get("channel", "alpha") or "alpha")
     logger.info("Current state status: %s", state.get("status"))
 
     # Recover from failed apply on previous run.
     if state.get("status") == STATUS_APPLIED_PENDING_HEALTHCHECK:
-        ok, reason = _validate_app_dir(paths["live"])
-        if ok:
-            version = _read_live_version(paths)
-            _health_marker(root, version)
-            state["status"] = STATUS_IDLE
-            state["currentVersion"] = version
-            state["targetVersion"] = None
-            state["artifact"] = None
-            attempts = state.setdefault("attempts", {})
-            attempts["applyCount"] = 0
-            attempts["rollbackCount"] = 0
-            state["lastError"] = None
-            _save_state(root, state)
-            logger.info("Previous applied version passed healthcheck: %s", version)
-        else:
-            logger.error("Healthcheck failed after apply: %s", reason)
-            rb_ok, rb_detail = _run_updater(root, "rollback", channel, logger)
-            if not rb_ok:
-                state = _load_state(root, logger)
-                state["status"] = STATUS_FAILED_REQUIRES_REINSTALL
-                state["lastError"] = f"rollback failed after healthcheck failure: {rb_detail}"
-                _save_state(root, state)
-                _fail_with_reinstall(
-                    f"Update healthcheck failed and rollback also failed ({rb_detail}).",
-                    log_path,
-                    "Update recovery failed",
-                )
-            logger.warning("Rolled back to backup due to failed healthcheck.")
+        with spans.span("healthcheck"):
+            ok, reason = _validate_app_dir(paths["live"], _validation_cache_path(root))
+            if ok:
+                version = _read_live_version(paths)
+                _health_marker(root, version)
+                state["status"] = STATUS_IDLE
+                state["currentVersion"] = version
+                state["targetVersion"] = None
+                state["artifact"] = None
+                attempts = state.setdefault("attempts", {})
+                attempts["applyCount"] = 0
+                attempts["rollbackCount"] = 0
+                state["lastError"] = None
+                _save_state(root, state, logger)
+                logger.info("Previous applied version passed healthcheck: %s", version)
+            else:
+                logger.error("Healthcheck failed after apply: %s", reason)
+                rb_ok, rb_detail = _run_updater(root, "rollback", channel, logger)
+                if not rb_ok and _updater_busy(rb_detail):
+                    _exit_updater_busy("Rolling back the failed update", log_path)
+                if not rb_ok:
+                    state = _load_state(root, logger)
+                    state["status"] = STATUS_FAILED_REQUIRES_REINSTALL
+                    state["lastError"] = f"rollback failed after healthcheck failure: {rb_detail}"
+                    _save_state(root, state, logger)
+                    _fail_with_reinstall(
+                        f"Update healthcheck failed and rollback also failed ({rb_detail}).",
+                        log_path,
+                        "Update recovery failed",
+                    )
+                logger.warning("Rolled back to backup due to failed healthcheck.")
 
     # Baseline validity; one automatic repair attempt if invalid.
-    live_ok, live_reason = _validate_app_dir(paths["live"])
+    with spans.span("validate"):
+        live_ok, live_reason = _validate_app_dir(paths["live"], _validation_cache_path(root))
     if not live_ok:
         logger.warning("Live install invalid: %s", live_reason)
-        stage_ok, stage_detail = _run_updater(root, "check-stage", channel, logger)
-        if not stage_ok:
-            _fail_with_reinstall(
-                f"Automatic repair stage failed ({stage_detail}).",
-                log_path,
-            )
-        apply_ok, apply_detail = _run_updater(root, "apply", channel, logger)
-        if not apply_ok:
-            _fail_with_reinstall(
-                f"Automatic repair apply failed ({apply_detail}).",
-                log_path,
-            )
-        live_ok, live_reason = _validate_app_dir(paths["live"])
-        if not live_ok:
-            _fail_with_reinstall(
-                f"Install remains invalid after repair ({live_reason}).",
-                log_path,
-            )
+        with spans.span("repair"):
+            # Restore only the damaged files first; fall back to re-staging the whole bundle.
+            repair_ok, repair_detail = _run_updater(root, "repair", channel, logger)
+            if not repair_ok and _updater_busy(repair_detail):
+                _exit_updater_busy("Repairing the install", log_path)
+            if repair_ok:
+                live_ok, live_reason = _validate_app_dir(paths["live"], _validation_cache_path(root))
+            else:
+                logger.warning("File-level repair failed: %s", repair_detail)
+    if not live_ok:
+        with spans.span("repair"):
+            stage_ok, stage_detail = _run_updater(root, "check-stage", channel, logger)
+            if not stage_ok and _updater_busy(stage_detail):
+                _exit_updater_busy("Repairing the install", log_path)
+            if not stage_ok:
+                _fail_with_reinstall(
+                    f"Automatic repair stage failed ({stage_detail}).",
+                    log_path,
+                )
+            apply_ok, apply_detail = _run_updater(root, "apply", channel, logger)
+            if not apply_ok and _updater_busy(apply_detail):
+                _exit_updater_busy("Repairing the install", log_path)
+            if not apply_ok:
+                _fail_with_reinstall(
+                    f"Automatic repair apply failed ({apply_detail}).",
+                    log_path,
+                )
+            live_ok, live_reason = _validate_app_dir(paths["live"], _validation_cache_path(root))
+            if not live_ok:
+                _fail_with_reinstall(
+                    f"Install remains invalid after repair ({live_reason}).",
+                    log_path,
+                )
 
     # If a staged update already exists, prompt immediately. Otherwise stage in background.
-    state = _load_state(root, logger)
+    with spans.span("state_load"):
+        state = _load_state(root, logger)
     if state.get("status") == STATUS_DOWNLOADED_STAGED:
         logger.info("Staged update detected.")
         if _prompt_restart_now():
             logger.info("User chose restart now; applying staged update.")
-            apply_ok, apply_detail = _run_updater(root, "apply", channel, logger)
+            with spans.span("apply"):
+                apply_ok, apply_detail = _run_updater(root, "apply", channel, logger)
             if not apply_ok:
                 logger.error(
                     "RESULT: FAILED | reason=%s | action=continue_with_current_version",
@@ -339,8 +472,13 @@ def main() -> int:
                 logger.info("Update applied; launching updated app.")
         else:
             logger.info("User chose Later for staged update.")
+        with spans.span("updater_spawn"):
+            _run_updater_background(root, "gc", channel, logger)
     else:
-        stage_started, stage_detail = _run_updater_background(root, "check-stage", channel, logger)
+        with spans.span("updater_spawn"):
+            stage_started, stage_detail = _run_updater_background(
+                root, "check-stage", channel, logger, ["--collect-trash", "--background"]
+            )
         if not stage_started:
             logger.warning(
                 "RESULT: FAILED | reason=%s | action=continue_with_current_version",
@@ -351,19 +489,25 @@ def main() -> int:
 
     # Mark health for the currently running live version.
     version = _read_live_version(paths)
-    _health_marker(root, version)
-    state = _load_state(root, logger)
-    if state.get("status") in (STATUS_ROLLED_BACK, STATUS_APPLIED_PENDING_HEALTHCHECK):
-        state["status"] = STATUS_IDLE
-        state["currentVersion"] = version
-        state["targetVersion"] = None
-        state["artifact"] = None
-        attempts = state.setdefault("attempts", {})
-        attempts["applyCount"] = 0
-        attempts["rollbackCount"] = 0
-        state["lastError"] = None
-        _save_state(root, state)
+    with spans.span("health_marker"):
+        _health_marker(root, version)
+    # The background updater may be writing state.json concurrently; re-read and save under its lock.
+    with spans.span("state_save"):
+        try:
+            with get_store(_state_path(root)).transaction(_default_state, logger) as state:
+                if state.get("status") in (STATUS_ROLLED_BACK, STATUS_APPLIED_PENDING_HEALTHCHECK):
+                    state["status"] = STATUS_IDLE
+                    state["currentVersion"] = version
+                    state["targetVersion"] = None
+                    state["artifact"] = None
+                    attempts = state.setdefault("attempts", {})
+                    attempts["applyCount"] = 0
+                    attempts["rollbackCount"] = 0
+                    state["lastError"] = None
+        except StateLockTimeout as exc:
+            logger.warning("state.json not updated (updater busy), deferring to next launch: %s", exc)
     logger.info("Launching app_live version: %s", version)
+    spans.write(paths["state_dir"], version)
     _launch_live(paths, logger)
     return 0
 
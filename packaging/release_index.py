@@ -0,0 +1,221 @@
+"""
+Build-side companion for build-release-artifacts.ps1.
+
+files:   write the per-file index (app-files.json) for a staged release payload and
+         copy every file into a content-addressed blob directory (<blobs>/<sha256>).
+patches: diff changed files against the previous release's app-full.zip and write
+         patch-<from>-<to>.json plus BSDIFF40 patch blobs (<blobs>/<patch sha256>).
+zip-index: write app-full.index.json (entry offsets, sizes, CRCs) so the updater can
+         extract app-full.zip while it is still downloading.
+tar-zst: write app-full.tar.zst (the same payload as a zstd-compressed tar), which the
+         updater prefers when its runtime has a zstd decoder.
+
+Run from repo root:
+  python packaging/release_index.py files --stage dist/app-full-stage --out dist/app-files.json --blobs dist/blobs --version 1.2.3
+  python packaging/release_index.py patches --stage dist/app-full-stage --previous-zip prev/app-full.zip \
+      --from-version 1.2.2 --to-version 1.2.3 --out dist/patch-1.2.2-1.2.3.json --blobs dist/blobs
+  python packaging/release_index.py zip-index --zip dist/app-full.zip --out dist/app-full.index.json
+  python packaging/release_index.py tar-zst --stage dist/app-full-stage --out dist/app-full.tar.zst
+Requires: pip install bsdiff4 (patches), pip install zstandard (tar-zst)
+"""
+from __future__ import annotations
+
+import argparse
+import hashlib
+import json
+import shutil
+import struct
+import tarfile
+import zipfile
+from pathlib import Path
+
+
+def sha256_file(path: Path) -> str:
+    digest = hashlib.sha256()
+    with path.open("rb") as fh:
+        for chunk in iter(lambda: fh.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def build_file_index(stage_dir: Path, blobs_dir: Path | None) -> list[dict]:
+    files = []
+    for path in sorted(p for p in stage_dir.rglob("*") if p.is_file()):
+        sha = sha256_file(path)
+        files.append(
+            {
+                "path": path.relative_to(stage_dir).as_posix(),
+                "sha256": sha,
+                "sizeBytes": path.stat().st_size,
+            }
+        )
+        if blobs_dir is not None:
+            blob = blobs_dir / sha
+            if not blob.exists():
+                shutil.copyfile(path, blob)
+    return files
+
+
+def cmd_files(args: argparse.Namespace) -> int:
+    stage_dir = Path(args.stage).resolve()
+    if not stage_dir.is_dir():
+        raise SystemExit(f"Stage directory not found: {stage_dir}")
+    blobs_dir = Path(args.blobs).resolve() if args.blobs else None
+    if blobs_dir is not None:
+        blobs_dir.mkdir(parents=True, exist_ok=True)
+    files = build_file_index(stage_dir, blobs_dir)
+    index = {"schemaVersion": 1, "version": args.version, "files": files}
+    out = Path(args.out)
+    out.write_text(json.dumps(index, indent=2) + "\n", encoding="utf-8")
+    total = sum(item["sizeBytes"] for item in files)
+    print(f"Wrote {out} (files={len(files)}, bytes={total})")
+    return 0
+
+
+def cmd_patches(args: argparse.Namespace) -> int:
+    try:
+        import bsdiff4
+    except ImportError:
+        raise SystemExit("bsdiff4 required. Run: pip install bsdiff4")
+
+    stage_dir = Path(args.stage).resolve()
+    blobs_dir = Path(args.blobs).resolve()
+    blobs_dir.mkdir(parents=True, exist_ok=True)
+    patches = []
+    saved = 0
+    with zipfile.ZipFile(args.previous_zip, "r") as zf:
+        previous = {info.filename.replace("\\", "/"): info for info in zf.infolist() if not info.is_dir()}
+        for path in sorted(p for p in stage_dir.rglob("*") if p.is_file()):
+            rel = path.relative_to(stage_dir).as_posix()
+            info = previous.get(rel)
+            new_size = path.stat().st_size
+            if info is None or new_size < args.min_size:
+                continue
+            old = zf.read(info)
+            new = path.read_bytes()
+            if old == new:
+                continue
+            patch = bsdiff4.diff(old, new)
+            if len(patch) > new_size * args.max_ratio:
+                continue
+            patch_sha = hashlib.sha256(patch).hexdigest()
+            (blobs_dir / patch_sha).write_bytes(patch)
+            patches.append(
+                {
+                    "path": rel,
+                    "fromSha256": hashlib.sha256(old).hexdigest(),
+                    "toSha256": hashlib.sha256(new).hexdigest(),
+                    "patchSha256": patch_sha,
+                    "patchSizeBytes": len(patch),
+                }
+            )
+            saved += new_size - len(patch)
+    index = {
+        "schemaVersion": 1,
+        "fromVersion": args.from_version,
+        "toVersion": args.to_version,
+        "patches": patches,
+    }
+    out = Path(args.out)
+    out.write_text(json.dumps(index, indent=2) + "\n", encoding="utf-8")
+    print(f"Wrote {out} (patches={len(patches)}, bytesSaved={saved})")
+    return 0
+
+
+def cmd_zip_index(args: argparse.Namespace) -> int:
+    zip_path = Path(args.zip)
+    entries = []
+    with zipfile.ZipFile(zip_path, "r") as zf, zip_path.open("rb") as fh:
+        for info in zf.infolist():
+            fh.seek(info.header_offset)
+            header = fh.read(30)
+            if header[:4] != b"PK\x03\x04":
+                raise SystemExit(f"Bad local header for {info.filename}")
+            name_len, extra_len = struct.unpack("<HH", header[26:30])
+            entries.append(
+                {
+                    "name": info.filename,
+                    "offset": info.header_offset,
+                    "dataOffset": info.header_offset + 30 + name_len + extra_len,
+                    "compressSize": info.compress_size,
+                    "fileSize": info.file_size,
+                    "method": info.compress_type,
+                    "crc": info.CRC,
+                }
+            )
+    entries.sort(key=lambda item: item["offset"])
+    index = {"schemaVersion": 1, "artifactSha256": sha256_file(zip_path), "entries": entries}
+    out = Path(args.out)
+    out.write_text(json.dumps(index, indent=1) + "\n", encoding="utf-8")
+    print(f"Wrote {out} (entries={len(entries)})")
+    return 0
+
+
+def cmd_tar_zst(args: argparse.Namespace) -> int:
+    try:
+        import zstandard
+    except ImportError:
+        raise SystemExit("zstandard required. Run: pip install zstandard")
+
+    stage_dir = Path(args.stage).resolve()
+    if not stage_dir.is_dir():
+        raise SystemExit(f"Stage directory not found: {stage_dir}")
+    out = Path(args.out)
+
+    def normalize(info: tarfile.TarInfo) -> tarfile.TarInfo:
+        info.uid = info.gid = 0
+        info.uname = info.gname = ""
+        return info
+
+    compressor = zstandard.ZstdCompressor(level=args.level, threads=-1)
+    count = 0
+    with out.open("wb") as raw, compressor.stream_writer(raw) as writer:
+        with tarfile.open(fileobj=writer, mode="w|", format=tarfile.PAX_FORMAT) as tf:
+            for path in sorted(stage_dir.rglob("*")):
+                if path.is_symlink() or not (path.is_file() or path.is_dir()):
+                    continue
+                tf.add(path, arcname=path.relative_to(stage_dir).as_posix(), recursive=False, filter=normalize)
+                count += path.is_file()
+    print(f"Wrote {out} (files={count}, bytes={out.stat().st_size})")
+    return 0
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="flez-bot release index builder")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    files = sub.add_parser("files", help="write per-file index and content-addressed blobs")
+    files.add_argument("--stage", required=True)
+    files.add_argument("--out", required=True)
+    files.add_argument("--blobs", default="")
+    files.add_argument("--version", required=True)
+    files.set_defaults(func=cmd_files)
+
+    patches = sub.add_parser("patches", help="write BSDIFF40 patches against the previous release")
+    patches.add_argument("--stage", required=True)
+    patches.add_argument("--previous-zip", required=True)
+    patches.add_argument("--from-version", required=True)
+    patches.add_argument("--to-version", required=True)
+    patches.add_argument("--out", required=True)
+    patches.add_argument("--blobs", required=True)
+    patches.add_argument("--min-size", type=int, default=64 * 1024)
+    patches.add_argument("--max-ratio", type=float, default=0.5)
+    patches.set_defaults(func=cmd_patches)
+
+    zip_index = sub.add_parser("zip-index", help="write the zip entry index used for streaming extraction")
+    zip_index.add_argument("--zip", required=True)
+    zip_index.add_argument("--out", required=True)
+    zip_index.set_defaults(func=cmd_zip_index)
+
+    tar_zst = sub.add_parser("tar-zst", help="write the zstd-compressed tar artifact")
+    tar_zst.add_argument("--stage", required=True)
+    tar_zst.add_argument("--out", required=True)
+    tar_zst.add_argument("--level", type=int, default=19)
+    tar_zst.set_defaults(func=cmd_tar_zst)
+
+    args = parser.parse_args()
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
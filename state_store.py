@@ -0,0 +1,203 @@
+"""
+Shared state.json store for launcher.py and updater.py.
+
+- One read per process: the parsed state is kept in memory and only re-read when the file's
+  stat signature changes (i.e. the other process wrote it).
+- Saves are skipped when nothing but the timestamp would change.
+- Writes go to a temp file that is fsynced once and then os.replace'd over state.json, so a
+  reader never sees a torn file.
+- An advisory lock (state\\state.lock) serialises writers between the launcher and the
+  detached background updater. If it cannot be taken in time, StateLockTimeout is raised and
+  nothing is written; the caller decides whether to retry or defer the write.
+"""
+
+from __future__ import annotations
+
+import contextlib
+import copy
+import json
+import logging
+import os
+import sys
+import time
+from collections.abc import Callable, Iterator
+from datetime import datetime, timezone
+from pathlib import Path
+
+LOCK_TIMEOUT_SECONDS = 10.0
+
+_stores: dict[Path, "StateStore"] = {}
+
+
+class StateLockTimeout(OSError):
+    """state.lock could not be taken within LOCK_TIMEOUT_SECONDS; state.json was not written."""
+
+
+def _now_iso() -> str:
+    return datetime.now(timezone.utc).replace(microsecond=0).isoformat().replace("+00:00", "Z")
+
+
+def _comparable(state: dict) -> str:
+    snapshot = dict(state)
+    timestamps = dict(snapshot.get("timestamps") or {})
+    timestamps.pop("updatedAt", None)
+    snapshot["timestamps"] = timestamps
+    return json.dumps(snapshot, sort_keys=True)
+
+
+def lock_fd(fd: int) -> None:
+    if sys.platform == "win32":
+        import msvcrt
+
+        os.lseek(fd, 0, os.SEEK_SET)
+        msvcrt.locking(fd, msvcrt.LK_NBLCK, 1)
+    else:
+        import fcntl
+
+        fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+
+
+def unlock_fd(fd: int) -> None:
+    if sys.platform == "win32":
+        import msvcrt
+
+        os.lseek(fd, 0, os.SEEK_SET)
+        msvcrt.locking(fd, msvcrt.LK_UNLCK, 1)
+    else:
+        import fcntl
+
+        fcntl.flock(fd, fcntl.LOCK_UN)
+
+
+class StateStore:
+    def __init__(self, path: Path) -> None:
+        self.path = path
+        self.lock_path = path.with_name(path.stem + ".lock")
+        self._state: dict | None = None
+        self._persisted = ""
+        self._signature: tuple | None = None
+        self._lock_depth = 0
+
+    def _stat_signature(self) -> tuple | None:
+        try:
+            st = self.path.stat()
+        except OSError:
+            return None
+        return st.st_size, st.st_mtime_ns, st.st_ino
+
+    def load(self, default_factory: Callable[[], dict], logger: logging.Logger) -> dict:
+        """Current state; served from memory unless state.json changed on disk since the last read/write."""
+        signature = self._stat_signature()
+        if self._state is not None and signature == self._signature:
+            return copy.deepcopy(self._state)
+        if signature is None:
+            state = default_factory()
+            self._save_default(state, logger)
+            return copy.deepcopy(state)
+        try:
+            state = json.loads(self.path.read_text(encoding="utf-8-sig"))
+            if not isinstance(state, dict):
+                raise ValueError("state.json is not an object")
+            if "status" not in state:
+                raise ValueError("state.json missing status")
+        except Exception as exc:
+            corrupted = self.path.with_name(f"state.corrupt.{datetime.now().strftime('%Y%m%d_%H%M%S')}.json")
+            try:
+                self.path.rename(corrupted)
+                logger.warning("Corrupt state.json renamed to %s: %s", corrupted, exc)
+            except Exception:
+                logger.warning("Corrupt state.json could not be renamed: %s", exc)
+            state = default_factory()
+            self._state = None
+            self._save_default(state, logger)
+            return copy.deepcopy(state)
+        self._state = state
+        self._persisted = _comparable(state)
+        self._signature = signature
+        return copy.deepcopy(state)
+
+    def _save_default(self, state: dict, logger: logging.Logger) -> None:
+        # Seeding a missing/corrupt state.json is best effort: the caller works from the defaults either way.
+        try:
+            self.save(state, logger)
+        except StateLockTimeout as exc:
+            logger.warning("Default state.json not written: %s", exc)
+
+    def save(self, state: dict, logger: logging.Logger | None = None) -> bool:
+        """Persist state if it differs from what is on disk; returns whether a write happened.
+
+        Raises StateLockTimeout (without writing) if the lock is held elsewhere for too long.
+        """
+        comparable = _comparable(state)
+        if self._state is not None and comparable == self._persisted and self._stat_signature() == self._signature:
+            return False
+        state.setdefault("timestamps", {})
+        state["timestamps"]["updatedAt"] = _now_iso()
+        payload = json.dumps(state, indent=2) + "\n"
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.path.with_name(f"{self.path.name}.{os.getpid()}.tmp")
+        with self.lock(logger):
+            with tmp_path.open("w", encoding="utf-8") as fh:
+                fh.write(payload)
+                fh.flush()
+                os.fsync(fh.fileno())
+            os.replace(tmp_path, self.path)
+            self._signature = self._stat_signature()
+        self._state = copy.deepcopy(state)
+        self._persisted = comparable
+        return True
+
+    @contextlib.contextmanager
+    def lock(self, logger: logging.Logger | None = None) -> Iterator[None]:
+        """Advisory cross-process lock; raises StateLockTimeout after LOCK_TIMEOUT_SECONDS rather than blocking."""
+        if self._lock_depth:
+            self._lock_depth += 1
+            try:
+                yield
+            finally:
+                self._lock_depth -= 1
+            return
+        fd = None
+        try:
+            self.lock_path.parent.mkdir(parents=True, exist_ok=True)
+            fd = os.open(self.lock_path, os.O_RDWR | os.O_CREAT, 0o644)
+            deadline = time.monotonic() + LOCK_TIMEOUT_SECONDS
+            while True:
+                try:
+                    lock_fd(fd)
+                    break
+                except OSError:
+                    if time.monotonic() >= deadline:
+                        raise
+                    time.sleep(0.05)
+        except OSError as exc:
+            if fd is not None:
+                os.close(fd)
+            if logger is not None:
+                logger.warning("state.json lock unavailable: %s", exc)
+            raise StateLockTimeout(f"state.json lock unavailable: {exc}") from exc
+        self._lock_depth = 1
+        try:
+            yield
+        finally:
+            self._lock_depth = 0
+            with contextlib.suppress(OSError):
+                unlock_fd(fd)
+            os.close(fd)
+
+    @contextlib.contextmanager
+    def transaction(self, default_factory: Callable[[], dict], logger: logging.Logger) -> Iterator[dict]:
+        """Locked read-modify-write: yields the freshest state and saves it on clean exit."""
+        with self.lock(logger):
+            state = self.load(default_factory, logger)
+            yield state
+            self.save(state, logger)
+
+
+def get_store(path: Path) -> StateStore:
+    """Process-wide store for a state.json path."""
+    key = path.resolve()
+    store = _stores.get(key)
+    if store is None:
+        store = _stores[key] = StateStore(key)
+    return store
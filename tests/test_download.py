@@ -0,0 +1,228 @@
+"""
+download_file / probe_range_support / download_file_segmented against a local http.server: interrupted
+downloads resume with Range/If-Range, a changed ETag restarts from zero, a server that ignores Range still
+yields the whole file, and segmented downloads fetch only the pieces missing from the done bitmap.
+
+Run from repo root:
+  python -m pytest tests
+"""
+from __future__ import annotations
+
+import hashlib
+import http.client
+import http.server
+import json
+import logging
+import re
+import sys
+import threading
+from collections.abc import Iterator
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+import updater  # noqa: E402
+
+LOGGER = logging.getLogger("test_download")
+
+
+class Asset:
+    """What the test server serves, and how it misbehaves."""
+
+    def __init__(self, body: bytes, etag: str) -> None:
+        self.body = body
+        self.etag = etag
+        self.ignore_range = False
+        self.cut_after = 0  # > 0: advertise the full length but drop the connection after this many bytes
+        self.requests: list[dict[str, str]] = []
+
+
+class _Handler(http.server.BaseHTTPRequestHandler):
+    asset: Asset
+
+    def log_message(self, format: str, *args: object) -> None:
+        pass
+
+    def do_GET(self) -> None:
+        asset = self.asset
+        asset.requests.append({key: value for key, value in self.headers.items()})
+        body = asset.body
+        start = 0
+        match = re.match(r"bytes=(\d+)-(\d*)$", self.headers.get("Range", ""))
+        if_range = self.headers.get("If-Range")
+        if match and not asset.ignore_range and (if_range is None or if_range == asset.etag):
+            start = int(match.group(1))
+            end = int(match.group(2)) + 1 if match.group(2) else len(asset.body)
+            body = asset.body[start:end]
+            self.send_response(206)
+            self.send_header("Content-Range", f"bytes {start}-{start + len(body) - 1}/{len(asset.body)}")
+        else:
+            self.send_response(200)
+        self.send_header("ETag", asset.etag)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        if asset.cut_after:
+            self.wfile.write(body[: asset.cut_after])
+            self.wfile.flush()
+            self.close_connection = True
+            return
+        self.wfile.write(body)
+
+
+@pytest.fixture
+def server() -> Iterator[tuple[Asset, str]]:
+    asset = Asset(bytes(range(256)) * 4096, '"v1"')  # 1 MiB
+    handler = type("Handler", (_Handler,), {"asset": asset})
+    httpd = http.server.ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    try:
+        yield asset, f"http://127.0.0.1:{httpd.server_address[1]}/app-full.zip"
+    finally:
+        httpd.shutdown()
+        httpd.server_close()
+
+
+def _interrupt(asset: Asset, url: str, dest: Path, cut_after: int) -> None:
+    asset.cut_after = cut_after
+    with pytest.raises((http.client.IncompleteRead, ValueError)):
+        updater.download_file(url, dest, LOGGER)
+    asset.cut_after = 0
+    part = dest.with_name(dest.name + ".part")
+    assert part.stat().st_size == cut_after
+    assert not dest.exists()
+
+
+def test_interrupted_download_resumes_from_partial_file(server, tmp_path):
+    asset, url = server
+    dest = tmp_path / "app-full.zip"
+    _interrupt(asset, url, dest, 300_000)
+
+    sha, size = updater.download_file(url, dest, LOGGER)
+
+    assert dest.read_bytes() == asset.body
+    assert (sha, size) == (hashlib.sha256(asset.body).hexdigest(), len(asset.body))
+    assert asset.requests[-1]["Range"] == "bytes=300000-"
+    assert asset.requests[-1]["If-Range"] == '"v1"'
+    assert not dest.with_name(dest.name + ".part").exists()
+    assert not dest.with_name(dest.name + ".part.json").exists()
+
+
+def test_changed_etag_restarts_from_zero(server, tmp_path):
+    asset, url = server
+    dest = tmp_path / "app-full.zip"
+    _interrupt(asset, url, dest, 300_000)
+    asset.body = bytes(reversed(asset.body))
+    asset.etag = '"v2"'
+
+    sha, size = updater.download_file(url, dest, LOGGER)
+
+    # If-Range no longer matches, so the server answers 200 with the new file and the stale prefix is dropped.
+    assert asset.requests[-1]["If-Range"] == '"v1"'
+    assert dest.read_bytes() == asset.body
+    assert (sha, size) == (hashlib.sha256(asset.body).hexdigest(), len(asset.body))
+
+
+def test_server_ignoring_range_restarts_with_full_body(server, tmp_path):
+    asset, url = server
+    dest = tmp_path / "app-full.zip"
+    _interrupt(asset, url, dest, 300_000)
+    asset.ignore_range = True
+
+    sha, size = updater.download_file(url, dest, LOGGER)
+
+    assert asset.requests[-1]["Range"] == "bytes=300000-"
+    assert dest.read_bytes() == asset.body
+    assert (sha, size) == (hashlib.sha256(asset.body).hexdigest(), len(asset.body))
+
+
+def test_probe_range_support(server):
+    asset, url = server
+    assert updater.probe_range_support(url, LOGGER) == (len(asset.body), '"v1"')
+    asset.ignore_range = True
+    assert updater.probe_range_support(url, LOGGER) is None
+
+
+@pytest.fixture
+def small_pieces(monkeypatch) -> int:
+    # The 1 MiB test asset is below SEGMENTED_MIN_BYTES; shrink the pieces so it splits into 16 of them.
+    piece = 64 * 1024
+    monkeypatch.setattr(updater, "DOWNLOAD_PIECE_BYTES", piece)
+    monkeypatch.setattr(updater, "SEGMENTED_MIN_BYTES", 2 * piece)
+    return piece
+
+
+def _piece_requests(asset: Asset) -> list[str]:
+    return [request["Range"] for request in asset.requests if request.get("Range", "bytes=0-0") != "bytes=0-0"]
+
+
+def test_segmented_download_fetches_all_pieces(server, small_pieces, tmp_path):
+    asset, url = server
+    dest = tmp_path / "app-full.zip"
+    expected = hashlib.sha256(asset.body).hexdigest()
+    streamed: list[bytes] = []
+
+    sha, size = updater.download_file_segmented(
+        url, dest, LOGGER, connections=4, on_data=streamed.append, sha256=expected
+    )
+
+    assert (sha, size) == (expected, len(asset.body))
+    assert dest.read_bytes() == asset.body
+    assert b"".join(streamed) == asset.body
+    count = len(asset.body) // small_pieces
+    assert sorted(_piece_requests(asset)) == sorted(
+        f"bytes={i * small_pieces}-{(i + 1) * small_pieces - 1}" for i in range(count)
+    )
+    assert all(request.get("If-Range") == '"v1"' for request in asset.requests[1:])
+    assert not dest.with_name(dest.name + ".part").exists()
+    assert not dest.with_name(dest.name + ".part.json").exists()
+
+
+def test_segmented_download_resumes_from_done_bitmap(server, small_pieces, tmp_path):
+    asset, url = server
+    dest = tmp_path / "app-full.zip"
+    count = len(asset.body) // small_pieces
+    done = "1111000011110000"
+    assert len(done) == count
+    # Finished pieces are only on disk; the rest of the preallocated part file is still zeros.
+    part = bytearray(len(asset.body))
+    for index, flag in enumerate(done):
+        if flag == "1":
+            start, end = index * small_pieces, (index + 1) * small_pieces
+            part[start:end] = asset.body[start:end]
+    dest.with_name(dest.name + ".part").write_bytes(bytes(part))
+    meta = {
+        "url": url,
+        "validator": '"v1"',
+        "sha256": "",
+        "totalBytes": len(asset.body),
+        "pieceBytes": small_pieces,
+        "done": done,
+    }
+    dest.with_name(dest.name + ".part.json").write_text(json.dumps(meta), encoding="utf-8")
+
+    sha, size = updater.download_file_segmented(url, dest, LOGGER, connections=3)
+
+    assert (sha, size) == (hashlib.sha256(asset.body).hexdigest(), len(asset.body))
+    assert dest.read_bytes() == asset.body
+    missing = [index for index, flag in enumerate(done) if flag == "0"]
+    assert sorted(_piece_requests(asset)) == sorted(
+        f"bytes={i * small_pieces}-{(i + 1) * small_pieces - 1}" for i in missing
+    )
+
+
+def test_segmented_download_falls_back_when_range_is_ignored(server, small_pieces, tmp_path):
+    asset, url = server
+    asset.ignore_range = True
+    dest = tmp_path / "app-full.zip"
+
+    sha, size = updater.download_file_segmented(url, dest, LOGGER, connections=4)
+
+    assert (sha, size) == (hashlib.sha256(asset.body).hexdigest(), len(asset.body))
+    assert dest.read_bytes() == asset.body
+    # Only the range probe and one plain single-stream GET.
+    assert len(asset.requests) == 2
+    assert asset.requests[0]["Range"] == "bytes=0-0"
+    assert "Range" not in asset.requests[1]
@@ -0,0 +1,50 @@
+"""
+build_stage_from_files: files planned for reuse from app_live are hashed while they are copied, and a
+live file whose content no longer matches (the file index only compares stat metadata) is fetched
+from the blob store instead.
+
+Run from repo root:
+  python -m pytest tests
+"""
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+import updater  # noqa: E402
+
+LOGGER = logging.getLogger("test_file_delta")
+
+
+def _entry(path: str, data: bytes) -> dict:
+    return {"path": path, "sha256": hashlib.sha256(data).hexdigest(), "sizeBytes": len(data)}
+
+
+def test_corrupt_live_file_is_fetched_instead_of_reused(tmp_path):
+    root = tmp_path / "root"
+    live = root / "app_live"
+    blobs = tmp_path / "blobs"
+    live.mkdir(parents=True)
+    blobs.mkdir()
+    good = b"unchanged module\n" * 100
+    expected = b"library bytes\n" * 100
+    (live / "good.py").write_bytes(good)
+    (live / "lib.dll").write_bytes(b"library bytez\n" * 100)  # same size, silently corrupted
+    reuse = [_entry("good.py", good), _entry("lib.dll", expected)]
+    (blobs / reuse[1]["sha256"]).write_bytes(expected)
+
+    stage = root / "app_stage"
+    updater.build_stage_from_files(
+        reuse, [], blobs.as_uri(), live, stage, root, root / "tmp" / "patches", LOGGER
+    )
+
+    assert (stage / "good.py").read_bytes() == good
+    assert (stage / "lib.dll").read_bytes() == expected
+    manifest = json.loads((stage / updater.FILE_MANIFEST_NAME).read_text(encoding="utf-8"))
+    paths = [entry["path"] for entry in manifest["files"]]
+    assert sorted(paths) == ["good.py", "lib.dll"]
@@ -0,0 +1,49 @@
+"""
+update_state: updater status changes are locked read-modify-writes of state.json that only touch the fields
+they own, so a launcher transaction that landed in between is kept.
+
+Run from repo root:
+  python -m pytest tests
+"""
+from __future__ import annotations
+
+import logging
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+import updater  # noqa: E402
+from state_store import get_store  # noqa: E402
+
+LOGGER = logging.getLogger("test_state_updates")
+
+
+def test_update_keeps_fields_written_by_another_transaction(tmp_path):
+    root = tmp_path / "root"
+    updater.ensure_dirs(root)
+    updater.update_state(root, "stable", LOGGER, status=updater.STATUS_ROLLED_BACK, targetVersion="1.2.0")
+
+    # The launcher resets the rollback between two updater writes.
+    with get_store(updater.state_path(root)).transaction(lambda: updater.default_state("stable"), LOGGER) as state:
+        state["status"] = updater.STATUS_IDLE
+        state["attempts"]["rollbackCount"] = 0
+
+    state = updater.update_state(root, "stable", LOGGER, lastError="boom", timestamps={"applyStartedAt": "now"})
+
+    assert state["status"] == updater.STATUS_IDLE
+    assert state["targetVersion"] == "1.2.0"
+    assert state["lastError"] == "boom"
+    assert state["timestamps"]["applyStartedAt"] == "now"
+    assert state["timestamps"]["updatedAt"]
+
+
+def test_attempt_counters_increment_on_the_fresh_state(tmp_path):
+    root = tmp_path / "root"
+    updater.ensure_dirs(root)
+    updater.update_state(root, "stable", LOGGER, attempts={"applyCount": 2, "rollbackCount": 0})
+
+    updater.update_state(root, "stable", LOGGER, updater._bump_attempt("applyCount"))
+
+    attempts = updater.load_state(root, "stable", LOGGER)["attempts"]
+    assert attempts == {"applyCount": 3, "rollbackCount": 0}
@@ -4,31 +4,93 @@ flez-bot packaged updater.
 
 This updater manages:
 - release metadata fetch
-- staged full-bundle downloads
+- release mirrors with probe-based ranking and download failover
+- staged full-bundle downloads (app-full.tar.zst when zstd is available, else app-full.zip)
+- file-level delta staging from a per-file index
+- binary patches (BSDIFF40) against app_live files
 - state machine persistence
+- throttled progress reporting (state/progress.json)
+- content-addressed blob cache (cache/blobs/<sha256>)
+- background resource limits (priority, bandwidth, pause while busy)
 - atomic apply/rollback directory swaps
 """
 
 from __future__ import annotations
 
 import argparse
+import bz2
+import contextlib
+import errno
 import hashlib
+import http.client
+import io
 import json
 import logging
 import os
+import queue
 import re
 import shutil
+import sqlite3
+import stat
+import subprocess
+import sys
+import tarfile
+import threading
+import time
 import urllib.error
 import urllib.request
 import zipfile
+import zlib
+from collections.abc import Callable
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timezone
 from pathlib import Path
 
+from launch_metrics import Spans
+from state_store import StateLockTimeout, get_store, lock_fd, unlock_fd
+
 GITHUB_OWNER = "Roflz"
 GITHUB_REPO = "flez-bot"
 RELEASES_API_URL = f"https://api.github.com/repos/{GITHUB_OWNER}/{GITHUB_REPO}/releases"
 MANIFEST_ASSET_NAME = "manifest.json"
 APP_ARTIFACT_NAME = "app-full.zip"
+FILES_ARTIFACT_NAME = "app-files.json"
+ZIP_INDEX_ARTIFACT_NAME = "app-full.index.json"
+ZST_ARTIFACT_NAME = "app-full.tar.zst"
+BSDIFF_MAGIC = b"BSDIFF40"
+DOWNLOAD_CONNECTIONS = 4
+DOWNLOAD_PIECE_BYTES = 4 * 1024 * 1024
+SEGMENTED_MIN_BYTES = 8 * 1024 * 1024
+EXTRACT_WORKERS = max(1, min(8, os.cpu_count() or 1))
+BLOB_CACHE_MAX_BYTES = 2 * 1024 * 1024 * 1024
+TRASH_GC_BUDGET_BYTES = 1024 * 1024 * 1024
+TRASH_GC_WORKERS = 4
+FICLONE = 0x40049409
+FILE_MANIFEST_NAME = ".file_manifest.json"
+FILE_INDEX_NAME = "file_index.sqlite"
+VERIFY_WORKERS = max(2, min(8, (os.cpu_count() or 1) * 2))
+STAGE_LEASE_NAME = "stage.lock"
+STAGE_LEASE_OWNER_NAME = "stage.owner.json"
+STAGE_LEASE_HEARTBEAT_SECONDS = 5.0
+STAGE_LEASE_WAIT_SECONDS = 1800.0
+STATE_SAVE_ATTEMPTS = 3  # each attempt waits up to state_store.LOCK_TIMEOUT_SECONDS
+BACKGROUND_DEFAULTS = {
+    "lowPriority": True,
+    "maxDownloadKBps": 0,
+    "pauseWhenBusy": False,
+    "busyCpuPercent": 80,
+    "maxPauseSeconds": 600,
+}
+BUSY_POLL_SECONDS = 1.0
+# Source trees of the bundle compiled to unchecked-hash pycs while staging.
+PRECOMPILE_DIRS = ("bot_runelite_IL", "runtime/python/Lib/site-packages")
+PRECOMPILE_TIMEOUT_SECONDS = 900
+MIRROR_PROBE_TIMEOUT_SECONDS = 5.0
+MIRROR_PROBE_BYTES = 512 * 1024
+# Mirrors are ranked by the estimated time to fetch this much: probe latency + size / probe throughput.
+MIRROR_RANK_BYTES = 64 * 1024 * 1024
+RELEASES_CACHE_NAME = "releases.json"
+RELEASES_CACHE_TTL_SECONDS = 300
 
 STATUS_IDLE = "idle"
 STATUS_DOWNLOADED_STAGED = "downloaded_staged"
@@ -115,40 +177,53 @@ def default_state(channel: str = "alpha") -> dict:
         "attempts": {"applyCount": 0, "rollbackCount": 0},
         "timestamps": {"updatedAt": now_iso(), "applyStartedAt": None},
         "lastError": None,
+        "background": dict(BACKGROUND_DEFAULTS),
+        "mirrors": [],
     }
 
 
 def load_state(root: Path, channel: str, logger: logging.Logger) -> dict:
-    sp = state_path(root)
-    if not sp.exists():
-        state = default_state(channel=channel)
-        save_state(root, state)
-        return state
-    try:
-        state = json.loads(sp.read_text(encoding="utf-8-sig"))
-        if not isinstance(state, dict):
-            raise ValueError("state.json is not an object")
-        if "status" not in state:
-            raise ValueError("state.json missing status")
-        return state
-    except Exception as exc:
-        corrupted = sp.with_name(f"state.corrupt.{datetime.now().strftime('%Y%m%d_%H%M%S')}.json")
+    return get_store(state_path(root)).load(lambda: default_state(channel=channel), logger)
+
+
+def update_state(
+    root: Path,
+    channel: str,
+    logger: logging.Logger,
+    mutate: Callable[[dict], None] | None = None,
+    **fields: object,
+) -> dict:
+    """Locked read-modify-write of state.json, retrying while the launcher holds the lock.
+
+    Only the given fields are changed on the freshest state (dict values such as attempts/timestamps are merged
+    key by key), then mutate() runs for changes that depend on the current value, e.g. counters. Never writes
+    back a stale copy, so concurrent launcher transactions (the rolled_back -> idle reset) are kept.
+    """
+    store = get_store(state_path(root))
+    attempt = 1
+    while True:
         try:
-            sp.rename(corrupted)
-            logger.warning("Corrupt state.json renamed to %s: %s", corrupted, exc)
-        except Exception:
-            logger.warning("Corrupt state.json could not be renamed: %s", exc)
-        state = default_state(channel=channel)
-        save_state(root, state)
-        return state
-
+            with store.transaction(lambda: default_state(channel=channel), logger) as state:
+                for key, value in fields.items():
+                    if isinstance(value, dict) and isinstance(state.get(key), dict):
+                        state[key].update(value)
+                    else:
+                        state[key] = value
+                if mutate is not None:
+                    mutate(state)
+            return state
+        except StateLockTimeout:
+            if attempt >= STATE_SAVE_ATTEMPTS:
+                raise
+            attempt += 1
+
+
+def _bump_attempt(name: str) -> Callable[[dict], None]:
+    def mutate(state: dict) -> None:
+        attempts = state.setdefault("attempts", {})
+        attempts[name] = int(attempts.get(name, 0)) + 1
 
-def save_state(root: Path, state: dict) -> None:
-    sp = state_path(root)
-    sp.parent.mkdir(parents=True, exist_ok=True)
-    state.setdefault("timestamps", {})
-    state["timestamps"]["updatedAt"] = now_iso()
-    sp.write_text(json.dumps(state, indent=2) + "\n", encoding="utf-8")
+    return mutate
 
 
 def read_installed_version(live_dir: Path) -> str:
@@ -162,14 +237,77 @@ def read_installed_version(live_dir: Path) -> str:
         return "0.0.0"
 
 
-def fetch_releases(logger: logging.Logger) -> list[dict]:
-    req = urllib.request.Request(RELEASES_API_URL, headers={"Accept": "application/vnd.github+json"})
-    with urllib.request.urlopen(req, timeout=20) as resp:
-        payload = resp.read().decode("utf-8", errors="replace")
+def _load_releases_cache(cache_path: Path) -> dict:
+    try:
+        cached = json.loads(cache_path.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return {}
+    if not isinstance(cached, dict) or cached.get("url") != RELEASES_API_URL:
+        return {}
+    if not isinstance(cached.get("releases"), list):
+        return {}
+    return cached
+
+
+def _save_releases_cache(cache_path: Path, cached: dict) -> None:
+    tmp_path = cache_path.with_name(cache_path.name + ".tmp")
+    tmp_path.write_text(json.dumps(cached) + "\n", encoding="utf-8")
+    os.replace(tmp_path, cache_path)
+
+
+def fetch_releases(
+    logger: logging.Logger,
+    cache_dir: Path | None = None,
+    ttl_seconds: float = RELEASES_CACHE_TTL_SECONDS,
+) -> list[dict]:
+    """Releases list; answered from cache within ttl, otherwise revalidated with If-None-Match."""
+    cache_path = cache_dir / RELEASES_CACHE_NAME if cache_dir is not None else None
+    cached = _load_releases_cache(cache_path) if cache_path is not None else {}
+    if cached:
+        age = time.time() - float(cached.get("fetchedAt", 0))
+        if 0 <= age < ttl_seconds:
+            logger.info("Using cached releases list (%d releases, %.0fs old).", len(cached["releases"]), age)
+            return cached["releases"]
+
+    headers = {"Accept": "application/vnd.github+json"}
+    if cached.get("etag"):
+        headers["If-None-Match"] = cached["etag"]
+    elif cached.get("lastModified"):
+        headers["If-Modified-Since"] = cached["lastModified"]
+    req = urllib.request.Request(RELEASES_API_URL, headers=headers)
+    try:
+        with urllib.request.urlopen(req, timeout=20) as resp:
+            payload = resp.read().decode("utf-8", errors="replace")
+            etag = resp.headers.get("ETag") or ""
+            last_modified = resp.headers.get("Last-Modified") or ""
+    except urllib.error.HTTPError as exc:
+        if exc.code != 304 or not cached:
+            raise
+        logger.info("Releases list not modified (304); using cached %d releases.", len(cached["releases"]))
+        cached["fetchedAt"] = time.time()
+        try:
+            _save_releases_cache(cache_path, cached)
+        except OSError as save_exc:
+            logger.warning("Releases cache not saved: %s", save_exc)
+        return cached["releases"]
     releases = json.loads(payload)
     if not isinstance(releases, list):
         raise ValueError("GitHub releases payload is not a list")
     logger.info("Fetched %d releases from GitHub API.", len(releases))
+    if cache_path is not None and (etag or last_modified or ttl_seconds > 0):
+        try:
+            _save_releases_cache(
+                cache_path,
+                {
+                    "url": RELEASES_API_URL,
+                    "etag": etag,
+                    "lastModified": last_modified,
+                    "fetchedAt": time.time(),
+                    "releases": releases,
+                },
+            )
+        except OSError as exc:
+            logger.warning("Releases cache not saved: %s", exc)
     return releases
 
 
@@ -193,22 +331,884 @@ def find_asset(release: dict, asset_name: str) -> dict | None:
     return None
 
 
-def download_file(url: str, dest: Path, logger: logging.Logger) -> None:
-    req = urllib.request.Request(url, headers={"Accept": "application/octet-stream"})
-    with urllib.request.urlopen(req, timeout=120) as resp, dest.open("wb") as fh:
+class ProgressReporter:
+    """Throttled progress for long-running phases.
+
+    Logs a summary at most every log_interval seconds and, when path is set, atomically rewrites a
+    machine-readable progress file (state/progress.json) at most every write_interval seconds so the
+    launcher/GUI can poll it. Safe to call from worker threads.
+    """
+
+    def __init__(
+        self,
+        logger: logging.Logger,
+        path: Path | None = None,
+        write_interval: float = 0.5,
+        log_interval: float = 5.0,
+        summary: bool = True,
+    ) -> None:
+        self.logger = logger
+        self.path = path
+        self.write_interval = write_interval
+        self.log_interval = log_interval
+        self.summary = summary
+        self.phase = ""
+        self.unit = "bytes"
+        self.total = 0
+        self.done = 0
+        self._lock = threading.Lock()
+        self._started = time.monotonic()
+        self._start_done = 0
+        self._written_at = 0.0
+        self._logged_at = 0.0
+
+    def start(self, phase: str, total: int, unit: str = "bytes", done: int = 0) -> None:
+        with self._lock:
+            self.phase = phase
+            self.unit = unit
+            self.total = max(int(total), 0)
+            self.done = done
+            self._started = self._logged_at = time.monotonic()
+            self._start_done = done
+            self._write("running")
+
+    def update(self, done: int) -> None:
+        with self._lock:
+            self.done = done
+            self._tick()
+
+    def advance(self, amount: int = 1) -> None:
+        with self._lock:
+            self.done += amount
+            self._tick()
+
+    def finish(self) -> None:
+        with self._lock:
+            if self.summary:
+                self._log()
+            self._write("running")
+
+    def end(self, status: str, detail: str = "") -> None:
+        with self._lock:
+            self._write(status, detail)
+
+    def _percent(self) -> float | None:
+        return (self.done / self.total) * 100.0 if self.total > 0 else None
+
+    def _tick(self) -> None:
+        now = time.monotonic()
+        if now - self._written_at >= self.write_interval:
+            self._write("running")
+        if now - self._logged_at >= self.log_interval:
+            self._log()
+
+    def _log(self) -> None:
+        now = time.monotonic()
+        self._logged_at = now
+        elapsed = max(now - self._started, 1e-6)
+        rate = (self.done - self._start_done) / elapsed
+        pct = self._percent()
+        if pct is None:
+            self.logger.info("%s progress: %d %s (%.1f %s/s)", self.phase, self.done, self.unit, rate, self.unit)
+        else:
+            self.logger.info(
+                "%s progress: %.1f%% (%d/%d %s, %.1f %s/s)",
+                self.phase, pct, self.done, self.total, self.unit, rate, self.unit,
+            )
+
+    def _write(self, status: str, detail: str = "") -> None:
+        self._written_at = time.monotonic()
+        if self.path is None:
+            return
+        payload = {
+            "status": status,
+            "phase": self.phase,
+            "unit": self.unit,
+            "done": self.done,
+            "total": self.total,
+            "percent": self._percent(),
+            "detail": detail,
+            "pid": os.getpid(),
+            "updatedAt": now_iso(),
+        }
+        tmp = self.path.with_name(self.path.name + ".tmp")
+        try:
+            tmp.write_text(json.dumps(payload, indent=2) + "\n", encoding="utf-8")
+            os.replace(str(tmp), str(self.path))
+        except OSError:
+            pass
+
+
+def _read_part_meta(meta_path: Path) -> dict:
+    try:
+        meta = json.loads(meta_path.read_text(encoding="utf-8"))
+        return meta if isinstance(meta, dict) else {}
+    except Exception:
+        return {}
+
+
+def _write_part_meta(meta_path: Path, meta: dict) -> None:
+    meta_path.write_text(json.dumps(meta, indent=2) + "\n", encoding="utf-8")
+
+
+def download_file(
+    url: str,
+    dest: Path,
+    logger: logging.Logger,
+    on_data: Callable[[bytes], None] | None = None,
+    progress: ProgressReporter | None = None,
+    sha256: str = "",
+) -> tuple[str, int]:
+    """Download url to dest via dest.part, resuming a previous partial download when the server allows it.
+
+    The sidecar dest.part.json records the url, validator (ETag/Last-Modified) and byte offset so a later
+    run can continue with Range/If-Range; a changed resource makes the server answer 200 and we restart.
+    With sha256 (the content's known hash) a partial download from another mirror is resumed too, without
+    If-Range; the caller's hash check catches a mismatch. on_data, if given, receives the file contents
+    in order. Returns (sha256 hex, size) computed while the bytes arrive.
+    """
+    part = dest.with_name(dest.name + ".part")
+    meta_path = dest.with_name(dest.name + ".part.json")
+    meta = _read_part_meta(meta_path)
+    offset = 0
+    validator = str(meta.get("etag") or meta.get("lastModified") or "") if meta.get("url") == url else ""
+    if part.exists() and (validator or (sha256 and meta.get("sha256") == sha256)):
+        offset = part.stat().st_size
+    else:
+        part.unlink(missing_ok=True)
+        meta_path.unlink(missing_ok=True)
+
+    headers = {"Accept": "application/octet-stream"}
+    if offset > 0:
+        headers["Range"] = f"bytes={offset}-"
+        if validator:
+            headers["If-Range"] = validator
+    req = urllib.request.Request(url, headers=headers)
+    try:
+        resp = urllib.request.urlopen(req, timeout=120)
+    except urllib.error.HTTPError as exc:
+        if exc.code != 416 or offset == 0:
+            raise
+        logger.info("Partial download of %s not resumable (HTTP 416); restarting.", dest.name)
+        part.unlink(missing_ok=True)
+        meta_path.unlink(missing_ok=True)
+        return download_file(url, dest, logger, on_data, progress, sha256)
+
+    reporter = progress or ProgressReporter(logger, summary=False)
+    digest = hashlib.sha256()
+    with resp:
+        resumed = offset > 0 and getattr(resp, "status", 200) == 206
+        if resumed:
+            content_range = resp.headers.get("Content-Range", "")
+            if not content_range.startswith(f"bytes {offset}-"):
+                raise ValueError(f"unexpected Content-Range for resumed download: {content_range!r}")
+            logger.info("Resuming download of %s at byte %d.", dest.name, offset)
+            with part.open("rb") as fh:
+                for chunk in iter(lambda: fh.read(1024 * 1024), b""):
+                    digest.update(chunk)
+                    if on_data is not None:
+                        on_data(chunk)
+        else:
+            offset = 0
+        etag = resp.headers.get("ETag", "")
+        meta = {
+            "url": url,
+            "etag": "" if etag.startswith("W/") else etag,
+            "lastModified": resp.headers.get("Last-Modified", ""),
+            "sha256": sha256,
+            "offset": offset,
+        }
+        _write_part_meta(meta_path, meta)
+
         total = int(resp.headers.get("Content-Length", "0") or "0")
-        downloaded = 0
+        if total > 0:
+            total += offset
+        downloaded = offset
+        last_meta_at = downloaded
+        reporter.start("download", total, "bytes", done=offset)
+        with part.open("ab" if resumed else "wb") as fh:
+            while True:
+                chunk = resp.read(1024 * 1024)
+                if not chunk:
+                    break
+                _throttle(len(chunk))
+                _checkpoint()
+                fh.write(chunk)
+                digest.update(chunk)
+                if on_data is not None:
+                    on_data(chunk)
+                downloaded += len(chunk)
+                if downloaded - last_meta_at >= 8 * 1024 * 1024:
+                    fh.flush()
+                    meta["offset"] = downloaded
+                    _write_part_meta(meta_path, meta)
+                    last_meta_at = downloaded
+                reporter.update(downloaded)
+    reporter.finish()
+    if total > 0 and downloaded != total:
+        meta["offset"] = downloaded
+        _write_part_meta(meta_path, meta)
+        raise ValueError(f"download of {dest.name} incomplete ({downloaded}/{total} bytes)")
+    os.replace(str(part), str(dest))
+    meta_path.unlink(missing_ok=True)
+    return digest.hexdigest(), downloaded
+
+
+def probe_range_support(url: str, logger: logging.Logger) -> tuple[int, str] | None:
+    """Return (total size, validator) if the server honours byte ranges for url, else None."""
+    req = urllib.request.Request(url, headers={"Accept": "application/octet-stream", "Range": "bytes=0-0"})
+    try:
+        with urllib.request.urlopen(req, timeout=30) as resp:
+            if getattr(resp, "status", 200) != 206:
+                return None
+            match = re.match(r"bytes 0-0/(\d+)$", resp.headers.get("Content-Range", "").strip())
+            etag = resp.headers.get("ETag", "")
+            validator = etag if etag and not etag.startswith("W/") else resp.headers.get("Last-Modified", "")
+    except urllib.error.URLError as exc:
+        logger.info("Range probe failed for %s: %s", url, exc)
+        return None
+    if not match or not validator:
+        return None
+    return int(match.group(1)), validator
+
+
+def _fetch_piece(url: str, validator: str, start: int, end: int) -> bytes:
+    headers = {
+        "Accept": "application/octet-stream",
+        "Range": f"bytes={start}-{end - 1}",
+        "If-Range": validator,
+    }
+    error: Exception = ValueError(f"piece {start}-{end - 1} not fetched")
+    for _ in range(3):
+        try:
+            req = urllib.request.Request(url, headers=headers)
+            with urllib.request.urlopen(req, timeout=120) as resp:
+                status = getattr(resp, "status", 200)
+                if status != 206 or not resp.headers.get("Content-Range", "").startswith(f"bytes {start}-"):
+                    raise ValueError(f"server did not honour range request (status={status})")
+                chunks = []
+                remaining = end - start
+                while remaining > 0:
+                    chunk = resp.read(min(remaining, 256 * 1024))
+                    if not chunk:
+                        break
+                    _throttle(len(chunk))
+                    chunks.append(chunk)
+                    remaining -= len(chunk)
+                data = b"".join(chunks)
+        except OSError as exc:
+            error = exc
+            continue
+        if len(data) == end - start:
+            return data
+        error = ValueError(f"piece {start}-{end - 1} ended early after {len(data)} bytes")
+    raise error
+
+
+def download_file_segmented(
+    url: str,
+    dest: Path,
+    logger: logging.Logger,
+    connections: int = DOWNLOAD_CONNECTIONS,
+    on_data: Callable[[bytes], None] | None = None,
+    progress: ProgressReporter | None = None,
+    sha256: str = "",
+) -> tuple[str, int]:
+    """Download url into a preallocated dest.part with several concurrent byte-range connections.
+
+    Workers claim DOWNLOAD_PIECE_BYTES pieces in file order, at most a small window ahead of the hash
+    cursor, so the sha256 is computed from memory while downloading instead of re-reading the file.
+    Finished pieces are recorded in dest.part.json so an interrupted run resumes (from another mirror
+    too when sha256 pins the content). Falls back to the single-stream download_file when the server
+    ignores ranges or the file is small.
+    on_data, if given, receives the file contents in order. Returns (sha256 hex, size).
+    """
+    probe = probe_range_support(url, logger) if connections > 1 else None
+    if probe is None or probe[0] < SEGMENTED_MIN_BYTES:
+        return download_file(url, dest, logger, on_data, progress, sha256)
+    total, validator = probe
+
+    part = dest.with_name(dest.name + ".part")
+    meta_path = dest.with_name(dest.name + ".part.json")
+    count = -(-total // DOWNLOAD_PIECE_BYTES)
+    done = [False] * count
+    meta = _read_part_meta(meta_path)
+    same_content = (meta.get("url") == url and meta.get("validator") == validator) or (
+        sha256 and meta.get("sha256") == sha256
+    )
+    if (
+        same_content
+        and meta.get("totalBytes") == total
+        and meta.get("pieceBytes") == DOWNLOAD_PIECE_BYTES
+        and part.exists()
+        and part.stat().st_size == total
+        and len(str(meta.get("done", ""))) == count
+    ):
+        done = [flag == "1" for flag in str(meta["done"])]
+    if any(done):
+        logger.info("Resuming segmented download of %s (%d/%d pieces done).", dest.name, sum(done), count)
+    else:
+        with part.open("wb") as fh:
+            fh.truncate(total)
+    meta = {
+        "url": url,
+        "validator": validator,
+        "sha256": sha256,
+        "totalBytes": total,
+        "pieceBytes": DOWNLOAD_PIECE_BYTES,
+    }
+
+    def piece_range(index: int) -> tuple[int, int]:
+        return index * DOWNLOAD_PIECE_BYTES, min((index + 1) * DOWNLOAD_PIECE_BYTES, total)
+
+    def save_meta() -> None:
+        meta["done"] = "".join("1" if flag else "0" for flag in done)
+        _write_part_meta(meta_path, meta)
+
+    digest = hashlib.sha256()
+    cond = threading.Condition()
+    ready: dict[int, bytes] = {}
+    window = max(2 * connections, 2)
+    shared: dict = {
+        "next": 0,
+        "hashed": 0,
+        "error": None,
+        "downloaded": sum(piece_range(i)[1] - piece_range(i)[0] for i in range(count) if done[i]),
+        "savedAt": 0,
+    }
+    reporter = progress or ProgressReporter(logger)
+    reporter.start("download", total, "bytes", done=shared["downloaded"])
+
+    def drain() -> None:
+        # Caller holds cond. Pieces finished in an earlier run are only on disk.
+        while shared["hashed"] < count:
+            index = shared["hashed"]
+            if index in ready:
+                data = ready.pop(index)
+            elif done[index]:
+                start, end = piece_range(index)
+                with part.open("rb") as fh:
+                    fh.seek(start)
+                    data = fh.read(end - start)
+            else:
+                break
+            digest.update(data)
+            if on_data is not None:
+                on_data(data)
+            shared["hashed"] += 1
+        cond.notify_all()
+
+    def worker() -> None:
         while True:
-            chunk = resp.read(1024 * 1024)
-            if not chunk:
+            with cond:
+                while True:
+                    if shared["error"] is not None:
+                        return
+                    while shared["next"] < count and done[shared["next"]]:
+                        shared["next"] += 1
+                    if shared["next"] >= count:
+                        return
+                    if shared["next"] < shared["hashed"] + window:
+                        break
+                    cond.wait()
+                index = shared["next"]
+                shared["next"] += 1
+            start, end = piece_range(index)
+            try:
+                _checkpoint()
+                data = _fetch_piece(url, validator, start, end)
+                with part.open("r+b") as fh:
+                    fh.seek(start)
+                    fh.write(data)
+            except BaseException as exc:
+                with cond:
+                    shared["error"] = shared["error"] or exc
+                    cond.notify_all()
+                return
+            with cond:
+                done[index] = True
+                ready[index] = data
+                shared["downloaded"] += len(data)
+                downloaded = shared["downloaded"]
+                if downloaded - shared["savedAt"] >= 8 * 1024 * 1024:
+                    save_meta()
+                    shared["savedAt"] = downloaded
+                reporter.update(downloaded)
+                drain()
+
+    with cond:
+        save_meta()
+        drain()
+    with ThreadPoolExecutor(max_workers=connections) as pool:
+        for future in [pool.submit(worker) for _ in range(connections)]:
+            future.result()
+    with cond:
+        save_meta()
+    reporter.finish()
+    if shared["error"] is not None:
+        raise shared["error"]
+    if shared["hashed"] < count:
+        raise ValueError(f"segmented download of {dest.name} incomplete")
+    os.replace(str(part), str(dest))
+    meta_path.unlink(missing_ok=True)
+    return digest.hexdigest(), total
+
+
+def mirror_base_url(spec: object) -> str:
+    """Normalise a mirror entry (http(s)/file URL, local or UNC directory, or {"url": ...}) to a base URL."""
+    if isinstance(spec, dict):
+        spec = spec.get("url") or spec.get("baseUrl") or ""
+    text = str(spec or "").strip()
+    if not text:
+        return ""
+    if re.match(r"^(https?|file)://", text, re.IGNORECASE):
+        return text.rstrip("/")
+    return Path(text).expanduser().resolve().as_uri()
+
+
+class MirrorSet:
+    """Release mirrors: state.json "mirrors" first, then the manifest's "mirrors", ranked by a probe.
+
+    A mirror holds a copy of a release directory: manifest.json and the artifacts by name
+    (app-full.zip, app-files.json, ...) plus blobs/<sha256>. It can be an HTTP server, a file:// URL
+    or a local/UNC directory (read through urllib's file handler). Downloads try the ranked mirrors and
+    then the manifest's own URL, and every file is checked against the manifest sha256, so a stale or
+    broken mirror costs a failover, never a bad install.
+    """
+
+    def __init__(self, specs: list, logger: logging.Logger) -> None:
+        self.logger = logger
+        self.bases: list[str] = []
+        self.target_version = ""
+        self.blob_base_url = ""
+        self._ranked: list[str] | None = None
+        self._lock = threading.Lock()
+        self.add(specs)
+
+    @classmethod
+    def from_state(cls, root: Path, channel: str, logger: logging.Logger) -> "MirrorSet":
+        specs = load_state(root, channel, logger).get("mirrors")
+        return cls(specs if isinstance(specs, list) else [], logger)
+
+    def add(self, specs: list) -> None:
+        with self._lock:
+            for spec in specs:
+                base = mirror_base_url(spec)
+                if base and base not in self.bases:
+                    self.bases.append(base)
+                    self._ranked = None
+
+    def use_manifest(self, manifest: dict) -> None:
+        """Take the manifest's mirrors, version (stale mirrors are skipped) and blob base URL."""
+        mirrors = manifest.get("mirrors")
+        self.add(mirrors if isinstance(mirrors, list) else [])
+        files_artifact = find_artifact(manifest, FILES_ARTIFACT_NAME, "files")
+        with self._lock:
+            self.target_version = str(manifest.get("version") or "")
+            self.blob_base_url = str((files_artifact or {}).get("blobBaseUrl") or "").rstrip("/")
+            self._ranked = None
+
+    def manifest(self, channel: str = "", version: str = "") -> dict | None:
+        """manifest.json from the first mirror that serves one for channel and version (each if given)."""
+        for base in list(self.bases):
+            try:
+                manifest = self._fetch_manifest(base)
+            except (OSError, ValueError) as exc:
+                self.logger.info("Mirror %s has no usable manifest: %s", base, exc)
+                continue
+            if channel and manifest.get("channel") not in (None, channel):
+                continue
+            if version and normalize_version(str(manifest.get("version", ""))) != normalize_version(version):
+                continue
+            self.logger.info("Using manifest from mirror %s.", base)
+            return manifest
+        return None
+
+    def urls_for(self, url: str) -> list[str]:
+        """Candidate URLs for a release file, fastest mirror first and url (the origin) last."""
+        name = url.rstrip("/").rsplit("/", 1)[-1]
+        if not name or not self.bases:
+            return [url]
+        if self.blob_base_url and url.startswith(self.blob_base_url + "/"):
+            name = f"blobs/{name}"
+        return [f"{base}/{name}" for base in self.ranked()] + [url]
+
+    def ranked(self) -> list[str]:
+        with self._lock:
+            if self._ranked is None:
+                self._ranked = self._rank(list(self.bases))
+            return self._ranked
+
+    def _rank(self, bases: list[str]) -> list[str]:
+        with ThreadPoolExecutor(max_workers=max(1, min(len(bases), 8))) as pool:
+            scores = list(pool.map(self._probe, bases))
+        usable = sorted((score, base) for score, base in zip(scores, bases) if score is not None)
+        for score, base in usable:
+            self.logger.info("Mirror %s: est. %.2fs per %d MiB.", base, score, MIRROR_RANK_BYTES >> 20)
+        skipped = [base for score, base in zip(scores, bases) if score is None]
+        if skipped:
+            self.logger.info("Mirrors skipped (unreachable or stale): %s", ", ".join(skipped))
+        return [base for _, base in usable]
+
+    def _fetch_manifest(self, base: str) -> dict:
+        with urllib.request.urlopen(f"{base}/{MANIFEST_ASSET_NAME}", timeout=MIRROR_PROBE_TIMEOUT_SECONDS) as resp:
+            manifest = json.loads(resp.read().decode("utf-8-sig"))
+        if not isinstance(manifest, dict):
+            raise ValueError("manifest is not an object")
+        return manifest
+
+    def _probe(self, base: str) -> float | None:
+        """Estimated seconds to fetch MIRROR_RANK_BYTES, or None if the mirror is down or stale."""
+        try:
+            started = time.monotonic()
+            manifest = self._fetch_manifest(base)
+            latency = time.monotonic() - started
+            if self.target_version and normalize_version(str(manifest.get("version", ""))) != normalize_version(
+                self.target_version
+            ):
+                return None
+            req = urllib.request.Request(
+                f"{base}/{APP_ARTIFACT_NAME}", headers={"Range": f"bytes=0-{MIRROR_PROBE_BYTES - 1}"}
+            )
+            started = time.monotonic()
+            try:
+                with urllib.request.urlopen(req, timeout=MIRROR_PROBE_TIMEOUT_SECONDS) as resp:
+                    size = len(resp.read(MIRROR_PROBE_BYTES))
+            except urllib.error.URLError:
+                return latency  # no full artifact to measure throughput with; rank by latency
+            rate = size / max(time.monotonic() - started, 1e-3)
+            return latency + MIRROR_RANK_BYTES / max(rate, 1.0)
+        except (OSError, ValueError) as exc:
+            self.logger.info("Mirror probe failed for %s: %s", base, exc)
+            return None
+
+
+_mirrors: MirrorSet | None = None
+
+
+def candidate_urls(url: str) -> list[str]:
+    return _mirrors.urls_for(url) if _mirrors is not None else [url]
+
+
+def download_with_failover(
+    urls: list[str],
+    dest: Path,
+    logger: logging.Logger,
+    expected_sha: str,
+    segmented: bool = True,
+    on_data: Callable[[bytes], None] | None = None,
+    on_failover: Callable[[], None] | None = None,
+    progress: ProgressReporter | None = None,
+) -> tuple[str, int]:
+    """Download from the first of urls that works and yields expected_sha, resuming the partial file
+    across sources. After the first failover on_data is no longer called and on_failover runs once,
+    since a streaming consumer cannot take the data again. Returns the last (sha256, size) if no
+    source matched; re-raises the last error if none worked."""
+    fetch = download_file_segmented if segmented else download_file
+    result: tuple[str, int] | None = None
+    error: Exception | None = None
+    for attempt, url in enumerate(urls):
+        if attempt > 0:
+            logger.warning("Failing over download of %s to %s.", dest.name, url)
+            if on_data is not None:
+                on_data = None
+                if on_failover is not None:
+                    on_failover()
+        try:
+            result = fetch(url, dest, logger, on_data=on_data, progress=progress, sha256=expected_sha)
+        except (OSError, ValueError, http.client.HTTPException) as exc:
+            logger.warning("Download of %s from %s failed: %s", dest.name, url, exc)
+            error = exc
+            continue
+        if not expected_sha or result[0] == expected_sha:
+            return result
+        logger.warning("sha256 mismatch for %s from %s (got %s).", dest.name, url, result[0])
+        dest.unlink(missing_ok=True)
+    if result is not None:
+        return result
+    raise error or ValueError(f"no source for {dest.name}")
+
+
+def trash_dir(root: Path) -> Path:
+    return root / "tmp" / "trash"
+
+
+def move_to_trash(path: Path, root: Path, logger: logging.Logger | None = None) -> None:
+    """Discard a tree with one rename into tmp/trash; collect_trash deletes it later off the critical path."""
+    if not path.exists():
+        return
+    trash = trash_dir(root)
+    try:
+        trash.mkdir(parents=True, exist_ok=True)
+        os.replace(str(path), str(trash / f"{path.name}-{time.time_ns()}-{os.getpid()}"))
+        return
+    except OSError as exc:
+        if logger is not None:
+            logger.warning("Could not move %s to trash; deleting in place: %s", path, exc)
+    shutil.rmtree(path, ignore_errors=True)
+
+
+class _PlatformScheduling:
+    """Per-OS process scheduling hooks used by ResourceGovernor; the base class does nothing."""
+
+    def lower_priority(self) -> None:
+        pass
+
+    def cpu_seconds(self) -> tuple[float, float] | None:
+        """Cumulative (busy, total) CPU seconds over all cores, or None if unavailable."""
+        return None
+
+
+class _WindowsScheduling(_PlatformScheduling):
+    def lower_priority(self) -> None:
+        import ctypes
+
+        # Background mode lowers CPU, I/O and memory priority of the whole process.
+        process_mode_background_begin = 0x00100000
+        kernel32 = ctypes.windll.kernel32
+        kernel32.SetPriorityClass(kernel32.GetCurrentProcess(), process_mode_background_begin)
+
+    def cpu_seconds(self) -> tuple[float, float] | None:
+        import ctypes
+        from ctypes import wintypes
+
+        idle, kernel, user = wintypes.FILETIME(), wintypes.FILETIME(), wintypes.FILETIME()
+        if not ctypes.windll.kernel32.GetSystemTimes(ctypes.byref(idle), ctypes.byref(kernel), ctypes.byref(user)):
+            return None
+
+        def seconds(ft: wintypes.FILETIME) -> float:
+            return ((ft.dwHighDateTime << 32) | ft.dwLowDateTime) / 1e7
+
+        total = seconds(kernel) + seconds(user)  # kernel time includes idle time
+        return total - seconds(idle), total
+
+
+class _PosixScheduling(_PlatformScheduling):
+    def lower_priority(self) -> None:
+        os.nice(10)
+
+
+class _LinuxScheduling(_PosixScheduling):
+    IOPRIO_CLASS_IDLE = 3
+    IOPRIO_WHO_PROCESS = 1
+    SYS_IOPRIO_SET = {"x86_64": 251, "aarch64": 30, "i686": 289, "armv7l": 314}
+
+    def lower_priority(self) -> None:
+        super().lower_priority()
+        import ctypes
+        import platform
+
+        number = self.SYS_IOPRIO_SET.get(platform.machine())
+        if number is None:
+            return
+        libc = ctypes.CDLL(None, use_errno=True)
+        if libc.syscall(number, self.IOPRIO_WHO_PROCESS, 0, self.IOPRIO_CLASS_IDLE << 13) != 0:
+            raise OSError(ctypes.get_errno(), "ioprio_set failed")
+
+    def cpu_seconds(self) -> tuple[float, float] | None:
+        with open("/proc/stat", encoding="ascii") as fh:
+            fields = [int(value) for value in fh.readline().split()[1:]]
+        ticks = os.sysconf("SC_CLK_TCK")
+        idle = fields[3] + (fields[4] if len(fields) > 4 else 0)
+        total = sum(fields[:8])
+        return (total - idle) / ticks, total / ticks
+
+
+def _platform_scheduling() -> _PlatformScheduling:
+    if os.name == "nt":
+        return _WindowsScheduling()
+    if sys.platform.startswith("linux"):
+        return _LinuxScheduling()
+    return _PosixScheduling()
+
+
+_priority_lowered = False
+
+
+def lower_process_priority(logger: logging.Logger) -> None:
+    """Drop this process to background CPU/IO priority (once); used before background work."""
+    global _priority_lowered
+    if _priority_lowered:
+        return
+    _priority_lowered = True
+    try:
+        _platform_scheduling().lower_priority()
+    except Exception as exc:
+        logger.info("Could not lower process priority: %s", exc)
+
+
+class TokenBucket:
+    """Thread-safe token bucket: consume(n) sleeps just long enough to keep the average at rate bytes/s."""
+
+    def __init__(self, rate: float, burst: float | None = None) -> None:
+        self.rate = float(rate)
+        self.burst = float(burst if burst is not None else rate)
+        self._tokens = self.burst
+        self._stamp = time.monotonic()
+        self._lock = threading.Lock()
+
+    def consume(self, amount: int) -> None:
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._stamp) * self.rate)
+            self._stamp = now
+            self._tokens -= amount
+            delay = -self._tokens / self.rate if self._tokens < 0 else 0.0
+        if delay > 0:
+            time.sleep(delay)
+
+
+class ResourceGovernor:
+    """Keeps background staging out of the bot's way, configured by state.json "background":
+
+    - lowPriority: background CPU/IO priority for the updater process
+    - maxDownloadKBps: token-bucket cap on download bandwidth (0 = unlimited)
+    - pauseWhenBusy: hold downloads/extraction while other processes use more than busyCpuPercent
+      of the machine's CPU, for at most maxPauseSeconds per pause
+    """
+
+    def __init__(self, settings: dict, logger: logging.Logger) -> None:
+        merged = dict(BACKGROUND_DEFAULTS)
+        merged.update({key: value for key, value in settings.items() if key in BACKGROUND_DEFAULTS})
+        self.settings = merged
+        self.logger = logger
+        rate = float(merged["maxDownloadKBps"] or 0) * 1024
+        self.bucket = TokenBucket(rate, burst=max(rate, 256 * 1024)) if rate > 0 else None
+        self.scheduling = _platform_scheduling()
+        self._lock = threading.Lock()
+        self._sample: tuple[float, float, float] | None = None
+        self._sampled_at = 0.0
+        self._busy = False
+
+    @classmethod
+    def from_state(cls, root: Path, channel: str, logger: logging.Logger) -> "ResourceGovernor":
+        settings = load_state(root, channel, logger).get("background")
+        return cls(settings if isinstance(settings, dict) else {}, logger)
+
+    def engage(self) -> None:
+        if self.settings["lowPriority"]:
+            lower_process_priority(self.logger)
+        self.logger.info(
+            "Background limits: lowPriority=%s maxDownloadKBps=%s pauseWhenBusy=%s (busyCpuPercent=%s)",
+            self.settings["lowPriority"], self.settings["maxDownloadKBps"],
+            self.settings["pauseWhenBusy"], self.settings["busyCpuPercent"],
+        )
+
+    def throttle(self, nbytes: int) -> None:
+        if self.bucket is not None:
+            self.bucket.consume(nbytes)
+
+    def checkpoint(self) -> None:
+        """Block while the machine is busy with other work; a no-op unless pauseWhenBusy is set."""
+        if not self.settings["pauseWhenBusy"] or not self._other_busy():
+            return
+        self.logger.info("Pausing background work while other processes are busy.")
+        started = time.monotonic()
+        while time.monotonic() - started < float(self.settings["maxPauseSeconds"]):
+            time.sleep(BUSY_POLL_SECONDS)
+            if not self._other_busy():
                 break
-            fh.write(chunk)
-            downloaded += len(chunk)
-            if total > 0:
-                pct = (downloaded / total) * 100.0
-                logger.info("download progress: %.1f%% (%d/%d bytes)", pct, downloaded, total)
-            else:
-                logger.info("download progress: %d bytes", downloaded)
+        self.logger.info("Resuming background work after %.1fs.", time.monotonic() - started)
+
+    def _other_busy(self) -> bool:
+        with self._lock:
+            now = time.monotonic()
+            if now - self._sampled_at < BUSY_POLL_SECONDS:
+                return self._busy
+            self._sampled_at = now
+            try:
+                times = self.scheduling.cpu_seconds()
+            except (OSError, ValueError, IndexError):
+                times = None
+            if times is None:
+                return False
+            sample = (times[0], times[1], time.process_time())
+            previous, self._sample = self._sample, sample
+            if previous is None:
+                return self._busy
+            elapsed = sample[1] - previous[1]
+            if elapsed <= 0:
+                return self._busy
+            # The updater's own CPU time is excluded so it never pauses itself.
+            other = (sample[0] - previous[0]) - (sample[2] - previous[2])
+            self._busy = other / elapsed * 100.0 >= float(self.settings["busyCpuPercent"])
+            return self._busy
+
+
+_governor: ResourceGovernor | None = None
+
+
+def _throttle(nbytes: int) -> None:
+    if _governor is not None:
+        _governor.throttle(nbytes)
+
+
+def _checkpoint() -> None:
+    if _governor is not None:
+        _governor.checkpoint()
+
+
+def _unlink_quietly(path: str) -> int:
+    try:
+        size = os.lstat(path).st_size
+        try:
+            os.unlink(path)
+        except PermissionError:
+            os.chmod(path, stat.S_IWRITE)
+            os.unlink(path)
+        return size
+    except OSError:
+        return 0
+
+
+def collect_trash(
+    root: Path,
+    logger: logging.Logger,
+    budget_bytes: int = TRASH_GC_BUDGET_BYTES,
+    workers: int = TRASH_GC_WORKERS,
+) -> tuple[int, int]:
+    """Delete tmp/trash entries oldest first, unlinking files in parallel, until budget_bytes are freed.
+
+    Whatever is left over is picked up by the next pass. Returns (files removed, bytes freed).
+    """
+    trash = trash_dir(root)
+    if not trash.is_dir():
+        return 0, 0
+    entries = []
+    for entry in trash.iterdir():
+        try:
+            entries.append((entry.lstat().st_mtime, entry))
+        except OSError:
+            continue
+    removed = freed = 0
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        for _, entry in sorted(entries):
+            if freed >= budget_bytes:
+                break
+            if not entry.is_dir() or entry.is_symlink():
+                freed += _unlink_quietly(str(entry))
+                removed += 1
+                continue
+            finished = True
+            for dirpath, dirnames, filenames in os.walk(entry, topdown=False):
+                files = [os.path.join(dirpath, name) for name in filenames]
+                links = [os.path.join(dirpath, name) for name in dirnames]
+                files += [path for path in links if os.path.islink(path)]
+                for size in pool.map(_unlink_quietly, files):
+                    freed += size
+                    removed += 1
+                try:
+                    os.rmdir(dirpath)
+                except OSError:
+                    pass
+                if freed >= budget_bytes:
+                    finished = False
+                    break
+            if not finished:
+                break
+    if removed:
+        logger.info("Trash collection removed %d files (%d bytes).", removed, freed)
+    return removed, freed
 
 
 def sha256_file(path: Path) -> str:
@@ -219,6 +1219,521 @@ def sha256_file(path: Path) -> str:
     return digest.hexdigest()
 
 
+def find_artifact(manifest: dict, name: str, artifact_type: str) -> dict | None:
+    for item in manifest.get("artifacts", []):
+        if item.get("name") == name and item.get("type") == artifact_type:
+            return item
+    return None
+
+
+def normalize_version(version_text: str) -> str:
+    text = str(version_text or "").strip().lower()
+    return text[1:] if text.startswith("v") else text
+
+
+def find_patch_artifact(manifest: dict, from_version: str, to_version: str) -> dict | None:
+    for item in manifest.get("artifacts", []):
+        if item.get("type") != "patch":
+            continue
+        if normalize_version(item.get("fromVersion", "")) != normalize_version(from_version):
+            continue
+        if normalize_version(item.get("toVersion", "")) != normalize_version(to_version):
+            continue
+        return item
+    return None
+
+
+def download_verified(url: str, dest: Path, expected_sha: str, logger: logging.Logger) -> None:
+    actual_sha, _ = download_with_failover(candidate_urls(url), dest, logger, expected_sha, segmented=False)
+    if actual_sha != expected_sha:
+        raise ValueError(f"sha256 mismatch for {dest.name} (expected={expected_sha}, actual={actual_sha})")
+
+
+def _offtin(buf: bytes) -> int:
+    value = int.from_bytes(buf[:8], "little") & 0x7FFFFFFFFFFFFFFF
+    return -value if buf[7] & 0x80 else value
+
+
+def _add_bytes(a: bytes, b: bytes) -> bytes:
+    """Bytewise (a + b) mod 256, computed on whole chunks via big-int SWAR arithmetic."""
+    n = len(a)
+    if n == 0:
+        return b""
+    low = int.from_bytes(b"\x7f" * n, "little")
+    high = int.from_bytes(b"\x80" * n, "little")
+    x = int.from_bytes(a, "little")
+    y = int.from_bytes(b, "little")
+    total = ((x & low) + (y & low)) ^ ((x ^ y) & high)
+    return total.to_bytes(n, "little")
+
+
+def bspatch(old: bytes, patch: bytes) -> bytes:
+    """Apply a BSDIFF40 patch (as produced by bsdiff/bsdiff4) to old."""
+    if len(patch) < 32 or patch[:8] != BSDIFF_MAGIC:
+        raise ValueError("not a BSDIFF40 patch")
+    ctrl_len = _offtin(patch[8:16])
+    diff_len = _offtin(patch[16:24])
+    new_size = _offtin(patch[24:32])
+    if ctrl_len < 0 or diff_len < 0 or new_size < 0:
+        raise ValueError("corrupt patch header")
+    body = 32 + ctrl_len
+    ctrl = bz2.decompress(patch[32:body])
+    diff = bz2.decompress(patch[body : body + diff_len])
+    extra = bz2.decompress(patch[body + diff_len :])
+
+    out = bytearray()
+    old_pos = diff_pos = extra_pos = ctrl_pos = 0
+    step = 1024 * 1024
+    while len(out) < new_size:
+        if ctrl_pos + 24 > len(ctrl):
+            raise ValueError("corrupt patch control block")
+        add_len = _offtin(ctrl[ctrl_pos : ctrl_pos + 8])
+        copy_len = _offtin(ctrl[ctrl_pos + 8 : ctrl_pos + 16])
+        seek = _offtin(ctrl[ctrl_pos + 16 : ctrl_pos + 24])
+        ctrl_pos += 24
+        if add_len < 0 or copy_len < 0 or len(out) + add_len + copy_len > new_size:
+            raise ValueError("corrupt patch control tuple")
+        if diff_pos + add_len > len(diff) or extra_pos + copy_len > len(extra):
+            raise ValueError("corrupt patch data block")
+        for offset in range(0, add_len, step):
+            size = min(step, add_len - offset)
+            start = old_pos + offset
+            base = bytearray(size)
+            lo = max(start, 0)
+            hi = min(start + size, len(old))
+            if lo < hi:
+                base[lo - start : hi - start] = old[lo:hi]
+            out += _add_bytes(diff[diff_pos + offset : diff_pos + offset + size], bytes(base))
+        diff_pos += add_len
+        out += extra[extra_pos : extra_pos + copy_len]
+        extra_pos += copy_len
+        old_pos += add_len + seek
+    return bytes(out)
+
+
+def load_patch_index(index_path: Path) -> dict[str, dict]:
+    data = json.loads(index_path.read_text(encoding="utf-8-sig"))
+    items = data.get("patches") if isinstance(data, dict) else None
+    if not isinstance(items, list):
+        raise ValueError(f"{index_path.name} missing patches list")
+    patches: dict[str, dict] = {}
+    for item in items:
+        rel = str(item.get("path", "")).replace("\\", "/")
+        entry = {
+            "fromSha256": str(item.get("fromSha256", "")).lower(),
+            "toSha256": str(item.get("toSha256", "")).lower(),
+            "patchSha256": str(item.get("patchSha256", "")).lower(),
+            "patchSizeBytes": int(item.get("patchSizeBytes", 0) or 0),
+        }
+        if rel and all(len(entry[key]) == 64 for key in ("fromSha256", "toSha256", "patchSha256")):
+            patches[rel] = entry
+    return patches
+
+
+def is_safe_relpath(rel: str) -> bool:
+    parts = rel.split("/")
+    return bool(rel) and not rel.startswith("/") and ".." not in parts and ":" not in parts[0]
+
+
+def load_file_index(index_path: Path) -> list[dict]:
+    data = json.loads(index_path.read_text(encoding="utf-8-sig"))
+    files = data.get("files") if isinstance(data, dict) else None
+    if not isinstance(files, list):
+        raise ValueError(f"{index_path.name} missing files list")
+    entries = []
+    for item in files:
+        rel = str(item.get("path", "")).replace("\\", "/")
+        if not is_safe_relpath(rel):
+            raise ValueError(f"unsafe path in file index: {rel!r}")
+        sha = str(item.get("sha256", "")).lower()
+        if len(sha) != 64:
+            raise ValueError(f"file index entry missing sha256: {rel}")
+        entries.append({"path": rel, "sha256": sha, "sizeBytes": int(item.get("sizeBytes", 0) or 0)})
+    return entries
+
+
+def plan_file_delta(
+    entries: list[dict], live_dir: Path, index: FileIndex | None = None
+) -> tuple[list[dict], list[dict]]:
+    """Split index entries into files reusable from live_dir and files that must be fetched."""
+    hashed = hash_tree_files(live_dir, [entry["path"] for entry in entries], index)
+    reuse: list[dict] = []
+    fetch: list[dict] = []
+    for entry in entries:
+        sha, size = hashed[entry["path"]]
+        same = size == entry["sizeBytes"] and sha == entry["sha256"]
+        (reuse if same else fetch).append(entry)
+    return reuse, fetch
+
+
+_reflink_supported = sys.platform.startswith("linux")
+
+
+def _reflink(src: Path, dest: Path) -> bool:
+    global _reflink_supported
+    if not _reflink_supported:
+        return False
+    import fcntl
+
+    try:
+        with src.open("rb") as fsrc, dest.open("wb") as fdst:
+            fcntl.ioctl(fdst.fileno(), FICLONE, fsrc.fileno())
+        return True
+    except OSError as exc:
+        dest.unlink(missing_ok=True)
+        if exc.errno in (errno.EOPNOTSUPP, errno.ENOTTY, errno.EINVAL, errno.EXDEV, errno.ENOSYS):
+            _reflink_supported = False
+        return False
+
+
+def _copy_file_range(src: Path, dest: Path) -> None:
+    if hasattr(os, "copy_file_range"):
+        try:
+            with src.open("rb") as fsrc, dest.open("wb") as fdst:
+                while os.copy_file_range(fsrc.fileno(), fdst.fileno(), 64 * 1024 * 1024):
+                    pass
+            return
+        except OSError:
+            dest.unlink(missing_ok=True)
+    shutil.copyfile(src, dest)
+
+
+def clone_file(src: Path, dest: Path) -> str:
+    """Materialise src at dest as an independent file; returns "reflink" or "copy".
+
+    Reflinks are copy-on-write, so they share storage without sharing the inode. Hardlinks are never
+    used: app_live, app_stage/app_backup and cache/blobs must not share inodes, or a file corrupted in
+    one tree would be corrupted in the rollback copy and the cache too.
+    """
+    if _reflink(src, dest):
+        method = "reflink"
+    else:
+        _copy_file_range(src, dest)
+        method = "copy"
+    shutil.copystat(src, dest)
+    return method
+
+
+def clone_file_hashed(src: Path, dest: Path) -> tuple[str, str]:
+    """clone_file that also returns dest's sha256, read once: a reflink is hashed after cloning, a copy
+    is hashed from the bytes as they are written. Returns (method, sha256 hex)."""
+    digest = hashlib.sha256()
+    if _reflink(src, dest):
+        method = "reflink"
+        with dest.open("rb") as fh:
+            for chunk in iter(lambda: fh.read(1024 * 1024), b""):
+                digest.update(chunk)
+    else:
+        method = "copy"
+        with src.open("rb") as fsrc, dest.open("wb") as fdst:
+            for chunk in iter(lambda: fsrc.read(1024 * 1024), b""):
+                digest.update(chunk)
+                fdst.write(chunk)
+    shutil.copystat(src, dest)
+    return method, digest.hexdigest()
+
+
+def _crc32_sha256_file(path: Path) -> tuple[int, str]:
+    crc = 0
+    digest = hashlib.sha256()
+    with path.open("rb") as fh:
+        for chunk in iter(lambda: fh.read(1024 * 1024), b""):
+            crc = zlib.crc32(chunk, crc)
+            digest.update(chunk)
+    return crc, digest.hexdigest()
+
+
+class BlobCache:
+    """Content-addressed store under cache/blobs/<sha256> shared across versions.
+
+    index.json records each blob's size, mtime and last use (for LRU eviction under max_bytes) plus,
+    per version, the sha256 of the file index or full artifact it was staged from. Blobs are private
+    copies (reflinks where supported) of the install's files, so a changed mtime/size means the blob
+    was modified and is dropped.
+    """
+
+    def __init__(self, cache_dir: Path, logger: logging.Logger, max_bytes: int = BLOB_CACHE_MAX_BYTES) -> None:
+        self.dir = cache_dir / "blobs"
+        self.dir.mkdir(parents=True, exist_ok=True)
+        self.index_path = self.dir / "index.json"
+        self.logger = logger
+        self.max_bytes = max_bytes
+        self.touched: set[str] = set()
+        self._lock = threading.Lock()
+        data = _read_part_meta(self.index_path)
+        blobs = data.get("blobs")
+        versions = data.get("versions")
+        self.blobs: dict[str, dict] = blobs if isinstance(blobs, dict) else {}
+        self.versions: dict[str, dict] = versions if isinstance(versions, dict) else {}
+
+    def path_for(self, sha: str) -> Path:
+        return self.dir / sha
+
+    def lookup(self, sha: str) -> Path | None:
+        with self._lock:
+            record = self.blobs.get(sha)
+            path = self.path_for(sha)
+            try:
+                st = path.stat()
+            except OSError:
+                st = None
+            if (
+                record is None
+                or st is None
+                or st.st_size != record.get("sizeBytes")
+                or st.st_mtime_ns != record.get("mtimeNs")
+            ):
+                if record is not None or st is not None:
+                    self._drop(sha)
+                return None
+            record["lastUsed"] = time.time()
+            self.touched.add(sha)
+            return path
+
+    def fetch_into(self, sha: str, dest: Path) -> bool:
+        path = self.lookup(sha)
+        if path is None:
+            return False
+        clone_file(path, dest)
+        return True
+
+    def add(self, sha: str, src: Path) -> None:
+        if self.lookup(sha) is not None:
+            return
+        path = self.path_for(sha)
+        tmp = path.with_name(sha + ".tmp")
+        tmp.unlink(missing_ok=True)
+        clone_file(src, tmp)
+        os.replace(str(tmp), str(path))
+        self._record(sha, path)
+
+    def adopt(self, sha: str, src: Path) -> Path:
+        """Move a verified download into the cache (no copy); returns where it now lives."""
+        cached = self.lookup(sha)
+        if cached is not None:
+            if cached != src:
+                src.unlink(missing_ok=True)
+            return cached
+        path = self.path_for(sha)
+        os.replace(str(src), str(path))
+        self._record(sha, path)
+        return path
+
+    def _record(self, sha: str, path: Path) -> None:
+        st = path.stat()
+        with self._lock:
+            self.blobs[sha] = {"sizeBytes": st.st_size, "mtimeNs": st.st_mtime_ns, "lastUsed": time.time()}
+            self.touched.add(sha)
+
+    def remember_version(self, version: str, kind: str, sha: str) -> None:
+        self.versions[normalize_version(version)] = {kind: sha}
+
+    def version_record(self, version: str) -> dict:
+        record = self.versions.get(normalize_version(version))
+        return record if isinstance(record, dict) else {}
+
+    def evict(self) -> None:
+        """Drop least-recently-used blobs not touched by this run until the store fits max_bytes."""
+        total = sum(int(record.get("sizeBytes", 0)) for record in self.blobs.values())
+        for sha, record in sorted(self.blobs.items(), key=lambda item: item[1].get("lastUsed", 0)):
+            if total <= self.max_bytes:
+                break
+            if sha in self.touched:
+                continue
+            total -= int(record.get("sizeBytes", 0))
+            self._drop(sha)
+        self.versions = {
+            version: record
+            for version, record in self.versions.items()
+            if isinstance(record, dict) and all(sha in self.blobs for sha in record.values())
+        }
+
+    def save(self) -> None:
+        tmp = self.index_path.with_name("index.json.tmp")
+        tmp.write_text(json.dumps({"blobs": self.blobs, "versions": self.versions}, indent=1) + "\n", encoding="utf-8")
+        os.replace(str(tmp), str(self.index_path))
+
+    def _drop(self, sha: str) -> None:
+        self.blobs.pop(sha, None)
+        self.path_for(sha).unlink(missing_ok=True)
+        self.logger.info("Blob cache dropped %s.", sha)
+
+
+def apply_file_patch(
+    entry: dict,
+    live_file: Path,
+    dest: Path,
+    blob_base_url: str,
+    tmp_dir: Path,
+    logger: logging.Logger,
+) -> None:
+    patch = entry["patch"]
+    old = live_file.read_bytes()
+    old_sha = hashlib.sha256(old).hexdigest()
+    if old_sha != patch["fromSha256"]:
+        raise ValueError(f"patch base sha256 mismatch for {entry['path']} (expected={patch['fromSha256']}, actual={old_sha})")
+    tmp_dir.mkdir(parents=True, exist_ok=True)
+    patch_path = tmp_dir / patch["patchSha256"]
+    try:
+        download_verified(f"{blob_base_url.rstrip('/')}/{patch['patchSha256']}", patch_path, patch["patchSha256"], logger)
+        new = bspatch(old, patch_path.read_bytes())
+    finally:
+        patch_path.unlink(missing_ok=True)
+    new_sha = hashlib.sha256(new).hexdigest()
+    if new_sha != entry["sha256"]:
+        raise ValueError(f"patched sha256 mismatch for {entry['path']} (expected={entry['sha256']}, actual={new_sha})")
+    dest.write_bytes(new)
+
+
+def build_stage_from_files(
+    reuse: list[dict],
+    fetch: list[dict],
+    blob_base_url: str,
+    live_dir: Path,
+    stage_dir: Path,
+    root: Path,
+    tmp_dir: Path,
+    logger: logging.Logger,
+    progress: ProgressReporter | None = None,
+    cache: BlobCache | None = None,
+) -> None:
+    move_to_trash(stage_dir, root, logger)
+    stage_dir.mkdir(parents=True, exist_ok=True)
+    methods: dict[str, int] = {}
+    reused: list[dict] = []
+    fetch = list(fetch)
+    # plan_file_delta trusts the file index's stat metadata, so check the content as it is copied.
+    for entry in reuse:
+        dest = stage_dir / entry["path"]
+        dest.parent.mkdir(parents=True, exist_ok=True)
+        method, sha = clone_file_hashed(live_dir / entry["path"], dest)
+        if sha == entry["sha256"]:
+            reused.append(entry)
+        else:
+            logger.warning("app_live/%s does not match its recorded sha256; fetching it instead.", entry["path"])
+            dest.unlink(missing_ok=True)
+            fetch.append(entry)
+            method = "mismatch"
+        methods[method] = methods.get(method, 0) + 1
+    logger.info("Reused %d unchanged files from app_live (%s).", len(reused), _format_counts(methods))
+    reporter = progress or ProgressReporter(logger)
+    reporter.start("blobs", len(fetch), "files")
+    for entry in fetch:
+        dest = stage_dir / entry["path"]
+        dest.parent.mkdir(parents=True, exist_ok=True)
+        if cache is not None and cache.fetch_into(entry["sha256"], dest):
+            reporter.advance()
+            continue
+        if entry.get("patch"):
+            try:
+                apply_file_patch(entry, live_dir / entry["path"], dest, blob_base_url, tmp_dir, logger)
+                if cache is not None:
+                    cache.add(entry["sha256"], dest)
+                reporter.advance()
+                continue
+            except Exception as exc:
+                logger.warning("Patch for %s failed; fetching whole file: %s", entry["path"], exc)
+        download_verified(f"{blob_base_url.rstrip('/')}/{entry['sha256']}", dest, entry["sha256"], logger)
+        if cache is not None:
+            cache.add(entry["sha256"], dest)
+        reporter.advance()
+    reporter.finish()
+    write_file_manifest(stage_dir, reused + fetch)
+    (stage_dir / ".staged_ok").write_text("ok\n", encoding="utf-8")
+
+
+def stage_file_delta(
+    files_artifact: dict,
+    full_artifact: dict | None,
+    patch_artifact: dict | None,
+    paths: dict[str, Path],
+    logger: logging.Logger,
+    progress: ProgressReporter | None = None,
+    cache: BlobCache | None = None,
+    target_version: str = "",
+) -> dict | None:
+    """Stage from the per-file index; returns the staged artifact record, or None if a full download is cheaper."""
+    index_url = files_artifact.get("url")
+    index_sha = str(files_artifact.get("sha256", "")).lower()
+    blob_base_url = files_artifact.get("blobBaseUrl")
+    if not index_url or not index_sha or not blob_base_url:
+        raise ValueError("files artifact metadata missing url/sha256/blobBaseUrl")
+
+    index_path = paths["cache"] / FILES_ARTIFACT_NAME
+    download_verified(index_url, index_path, index_sha, logger)
+    entries = load_file_index(index_path)
+    file_index = open_file_index(paths["live"].parent, logger)
+    try:
+        reuse, fetch = plan_file_delta(entries, paths["live"], file_index)
+        if file_index is not None:
+            file_index.commit()
+    finally:
+        if file_index is not None:
+            file_index.close()
+
+    patches: dict[str, dict] = {}
+    if patch_artifact:
+        try:
+            patch_index_path = paths["cache"] / str(patch_artifact.get("name") or "patch.json")
+            download_verified(patch_artifact["url"], patch_index_path, str(patch_artifact["sha256"]).lower(), logger)
+            patches = load_patch_index(patch_index_path)
+        except Exception as exc:
+            logger.warning("Patch index unavailable; fetching whole changed files: %s", exc)
+    patched = 0
+    for entry in fetch:
+        patch = patches.get(entry["path"])
+        if patch and patch["toSha256"] == entry["sha256"]:
+            entry["patch"] = patch
+            patched += 1
+
+    cached = {entry["sha256"] for entry in fetch if cache is not None and cache.lookup(entry["sha256"])}
+    fetch_bytes = sum(
+        entry["patch"]["patchSizeBytes"] if entry.get("patch") else entry["sizeBytes"]
+        for entry in fetch
+        if entry["sha256"] not in cached
+    )
+    logger.info(
+        "File delta plan: reuse=%d fetch=%d cached=%d patched=%d (%d bytes)",
+        len(reuse), len(fetch), len(cached), patched, fetch_bytes,
+    )
+    full_size = int((full_artifact or {}).get("sizeBytes", 0) or 0)
+    if full_artifact and fetch_bytes >= full_size > 0:
+        logger.info("File delta is not smaller than %s; using full artifact.", APP_ARTIFACT_NAME)
+        return None
+
+    build_stage_from_files(
+        reuse,
+        fetch,
+        blob_base_url,
+        paths["live"],
+        paths["stage"],
+        paths["live"].parent,
+        paths["tmp"] / "patches",
+        logger,
+        progress,
+        cache,
+    )
+    if cache is not None:
+        cache.add(index_sha, index_path)
+        if target_version:
+            cache.remember_version(target_version, "files", index_sha)
+    return {
+        "name": FILES_ARTIFACT_NAME,
+        "type": "files",
+        "url": index_url,
+        "sha256": index_sha,
+        "sizeBytes": fetch_bytes,
+    }
+
+
+def invalidate_validation_cache(paths: dict[str, Path]) -> None:
+    """Drop the launcher's cached app_live validation; call before app_live is swapped."""
+    try:
+        (paths["state_dir"] / "validation.json").unlink(missing_ok=True)
+    except OSError:
+        pass
+
+
 def validate_app_dir(app_dir: Path) -> tuple[bool, str]:
     required = [
         app_dir / "version.json",
@@ -237,27 +1752,1044 @@ def validate_app_dir(app_dir: Path) -> tuple[bool, str]:
     return True, ""
 
 
-def extract_to_stage(zip_path: Path, stage_dir: Path, logger: logging.Logger) -> None:
-    if stage_dir.exists():
-        shutil.rmtree(stage_dir, ignore_errors=True)
+class FileIndex:
+    """Persistent path -> (size, mtime, file id, sha256) cache in state/file_index.sqlite.
+
+    A file whose stat still matches its row is not re-hashed. Rows are keyed on (path, file id), so the
+    same relative path in app_stage and app_live (which keep their inodes across the apply rename) can
+    both be remembered.
+    """
+
+    def __init__(self, db_path: Path) -> None:
+        self.db = sqlite3.connect(str(db_path))
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS files (path TEXT NOT NULL, ino INTEGER NOT NULL, size INTEGER NOT NULL, "
+            "mtime_ns INTEGER NOT NULL, sha256 TEXT NOT NULL, seen_at REAL NOT NULL, PRIMARY KEY (path, ino))"
+        )
+        self.pending: list[tuple] = []
+
+    def lookup(self, rel: str, st: os.stat_result) -> str | None:
+        row = self.db.execute(
+            "SELECT size, mtime_ns, sha256 FROM files WHERE path = ? AND ino = ?", (rel, st.st_ino)
+        ).fetchone()
+        if row and row[0] == st.st_size and row[1] == st.st_mtime_ns:
+            return row[2]
+        return None
+
+    def remember(self, rel: str, st: os.stat_result, sha: str) -> None:
+        self.pending.append((rel, st.st_ino, st.st_size, st.st_mtime_ns, sha, time.time()))
+
+    def commit(self, max_age_days: float = 30.0) -> None:
+        with self.db:
+            self.db.executemany("INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?, ?, ?)", self.pending)
+            self.db.execute("DELETE FROM files WHERE seen_at < ?", (time.time() - max_age_days * 86400,))
+        self.pending.clear()
+
+    def close(self) -> None:
+        self.db.close()
+
+
+def open_file_index(root: Path, logger: logging.Logger) -> FileIndex | None:
+    try:
+        return FileIndex(root / "state" / FILE_INDEX_NAME)
+    except sqlite3.Error as exc:
+        logger.warning("File index unavailable; hashing every file: %s", exc)
+        return None
+
+
+def hash_tree_files(
+    app_dir: Path,
+    rels: list[str],
+    index: FileIndex | None,
+    workers: int = VERIFY_WORKERS,
+    full: bool = False,
+) -> dict[str, tuple[str | None, int]]:
+    """rel -> (sha256 or None if unreadable, size), hashing on a thread pool only what the index can't answer."""
+    results: dict[str, tuple[str | None, int]] = {}
+    todo: list[tuple[str, os.stat_result]] = []
+    for rel in rels:
+        try:
+            st = (app_dir / rel).stat()
+        except OSError:
+            results[rel] = (None, -1)
+            continue
+        sha = None if full or index is None else index.lookup(rel, st)
+        if sha is not None:
+            results[rel] = (sha, st.st_size)
+        else:
+            todo.append((rel, st))
+
+    def work(item: tuple[str, os.stat_result]) -> tuple[str, str | None, os.stat_result]:
+        rel, st = item
+        try:
+            return rel, sha256_file(app_dir / rel), st
+        except OSError:
+            return rel, None, st
+
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        for rel, sha, st in pool.map(work, todo):
+            results[rel] = (sha, st.st_size)
+            if sha is not None and index is not None:
+                index.remember(rel, st, sha)
+    return results
+
+
+def write_file_manifest(app_dir: Path, files: list[dict]) -> None:
+    """Record the per-version file list (path, sha256, size) that --mode verify checks app_live against."""
+    manifest = {
+        "schemaVersion": 1,
+        "version": read_installed_version(app_dir),
+        "files": [{"path": f["path"], "sha256": f["sha256"], "sizeBytes": f["sizeBytes"]} for f in files],
+    }
+    (app_dir / FILE_MANIFEST_NAME).write_text(json.dumps(manifest) + "\n", encoding="utf-8")
+
+
+def manifest_from_tree(app_dir: Path, index: FileIndex | None) -> list[dict]:
+    """Hash a freshly verified tree (e.g. just extracted from a sha256-checked archive) into manifest entries."""
+    rels = sorted(
+        p.relative_to(app_dir).as_posix()
+        for p in app_dir.rglob("*")
+        if p.is_file() and p.name not in (FILE_MANIFEST_NAME, ".staged_ok")
+    )
+    hashed = hash_tree_files(app_dir, rels, index)
+    return [{"path": rel, "sha256": sha, "sizeBytes": size} for rel, (sha, size) in hashed.items() if sha]
+
+
+def load_file_manifest(
+    app_dir: Path, cache: BlobCache | None = None, version: str | None = None
+) -> list[dict] | None:
+    """Expected files for app_dir: its own manifest, else the cached file index of its version."""
+    version = version or read_installed_version(app_dir)
+    try:
+        data = json.loads((app_dir / FILE_MANIFEST_NAME).read_text(encoding="utf-8"))
+        if data.get("version") == version:
+            return [f for f in data["files"] if is_safe_relpath(f["path"])]
+    except (OSError, ValueError, KeyError, TypeError):
+        pass
+    if cache is not None:
+        record = cache.version_record(version)
+        index_path = cache.lookup(record["files"]) if record.get("files") else None
+        if index_path is not None:
+            return load_file_index(index_path)
+    return None
+
+
+def record_stage_manifest(root: Path, stage_dir: Path, logger: logging.Logger) -> None:
+    """Make sure a staged tree carries its file manifest and seed the file index with its hashes,
+    so the first verify after apply (which keeps inodes) needs no hashing."""
+    index = open_file_index(root, logger)
+    try:
+        files = load_file_manifest(stage_dir)
+        if files is None:
+            files = manifest_from_tree(stage_dir, index)
+            write_file_manifest(stage_dir, files)
+        elif index is not None:
+            for entry in files:
+                try:
+                    index.remember(entry["path"], (stage_dir / entry["path"]).stat(), entry["sha256"])
+                except OSError:
+                    continue
+        if index is not None:
+            index.commit()
+    finally:
+        if index is not None:
+            index.close()
+
+
+def precompile_stage(stage_dir: Path, logger: logging.Logger) -> bool:
+    """Compile the staged sources to unchecked-hash pycs with the staged interpreter, one worker per CPU.
+
+    The pycs must match the bundle's own Python version, so this runs app_stage's python.exe rather
+    than the updater's interpreter. Unchecked-hash pycs skip the per-import source stat, and the first
+    launch after apply no longer compiles (or fails to write __pycache__ into a protected install dir).
+    Failures are logged and never block staging; returns True when everything compiled.
+    """
+    stage_dir = stage_dir.absolute()
+    python_exe = stage_dir / "runtime" / "python" / "python.exe"
+    targets = [str(stage_dir / rel) for rel in PRECOMPILE_DIRS if (stage_dir / rel).is_dir()]
+    if not python_exe.exists() or not targets:
+        logger.info("Skipping bytecode precompilation (no staged interpreter or sources).")
+        return False
+    cmd = [
+        str(python_exe), "-m", "compileall", "-q", "-j", "0",
+        "--invalidation-mode", "unchecked-hash", *targets,
+    ]
+    kwargs: dict = {"cwd": str(stage_dir), "capture_output": True, "text": True, "timeout": PRECOMPILE_TIMEOUT_SECONDS}
+    if sys.platform == "win32" and _governor is not None and _governor.settings["lowPriority"]:
+        # Windows background mode is not inherited by children.
+        kwargs["creationflags"] = subprocess.BELOW_NORMAL_PRIORITY_CLASS
+    started = time.monotonic()
+    try:
+        r = subprocess.run(cmd, **kwargs)
+    except (OSError, subprocess.SubprocessError) as exc:
+        logger.warning("Bytecode precompilation failed to run: %s", exc)
+        return False
+    if r.returncode != 0:
+        output = (r.stdout or r.stderr or "").strip().splitlines()
+        logger.warning(
+            "Bytecode precompilation reported errors (exit=%d): %s", r.returncode, " | ".join(output[-5:])
+        )
+        return False
+    logger.info("Precompiled staged bytecode in %.1fs.", time.monotonic() - started)
+    return True
+
+
+def verify_install(
+    root: Path,
+    logger: logging.Logger,
+    full: bool = False,
+    workers: int = VERIFY_WORKERS,
+) -> tuple[bool, str, list[str]]:
+    """Check every app_live file against the version's manifest. Returns (ok, detail, bad relpaths)."""
+    paths = ensure_dirs(root)
+    live = paths["live"]
+    valid, reason = validate_app_dir(live)
+    if not valid:
+        return False, result_failed(f"app_live invalid: {reason}", "repair_or_reinstall"), []
+    expected = load_file_manifest(live, BlobCache(paths["cache"], logger))
+    if expected is None:
+        return True, result_skipped("no file manifest for installed version", "keep_current_version"), []
+
+    started = time.monotonic()
+    index = open_file_index(root, logger)
+    try:
+        hashed = hash_tree_files(live, [f["path"] for f in expected], index, workers, full)
+        if index is not None:
+            rehashed = len(index.pending)
+            index.commit()
+        else:
+            rehashed = len(expected)
+    finally:
+        if index is not None:
+            index.close()
+    bad = []
+    for entry in expected:
+        sha, size = hashed[entry["path"]]
+        if sha != entry["sha256"] or size != entry["sizeBytes"]:
+            bad.append(entry["path"])
+    logger.info(
+        "Verified %d files in %.2fs (%d hashed, %d from index); %d bad.",
+        len(expected), time.monotonic() - started, rehashed, len(expected) - rehashed, len(bad),
+    )
+    for rel in bad[:20]:
+        logger.warning("Integrity check failed: %s", rel)
+    if bad:
+        return False, result_failed(f"{len(bad)} files missing or modified", "repair_or_reinstall"), bad
+    return True, "verified", bad
+
+
+def _release_manifest(version: str, paths: dict[str, Path], logger: logging.Logger) -> dict | None:
+    """manifest.json of the release tagged with version (not necessarily the latest one)."""
+    wanted = normalize_version(version)
+    for release in fetch_releases(logger, paths["cache"]):
+        if normalize_version(str(release.get("tag_name", ""))) != wanted:
+            continue
+        asset = find_asset(release, MANIFEST_ASSET_NAME)
+        if not asset:
+            return None
+        manifest_path = paths["cache"] / f"manifest-{wanted}.json"
+        download_file(asset["browser_download_url"], manifest_path, logger)
+        return json.loads(manifest_path.read_text(encoding="utf-8-sig"))
+    return None
+
+
+def _replace_file(dest: Path, data_source: Callable[[Path], None], expected_sha: str | None) -> None:
+    """Write a repaired file next to dest, check its sha256, then swap it in atomically."""
+    tmp_path = dest.with_name(dest.name + ".repair.tmp")
+    dest.parent.mkdir(parents=True, exist_ok=True)
+    data_source(tmp_path)
+    if expected_sha is not None and sha256_file(tmp_path) != expected_sha:
+        tmp_path.unlink(missing_ok=True)
+        raise ValueError(f"repaired {dest.name} does not match its manifest sha256")
+    os.replace(tmp_path, dest)
+
+
+class RepairSources:
+    """Where repaired files come from, cheapest first: blob cache, per-file blobs of the release,
+    single zip entries fetched by byte range, and finally the whole app-full.zip (cached or downloaded)."""
+
+    def __init__(self, version: str, paths: dict[str, Path], cache: BlobCache, logger: logging.Logger) -> None:
+        self.version = version
+        self.paths = paths
+        self.cache = cache
+        self.logger = logger
+        self._manifest: dict | None = None
+        self._manifest_loaded = False
+        self._zip_path: Path | None = None
+        self._zip_entries: dict[str, dict] | None = None
+        self._range_validator: str | None = None
+
+    def manifest(self) -> dict | None:
+        if not self._manifest_loaded:
+            self._manifest_loaded = True
+            try:
+                self._manifest = _release_manifest(self.version, self.paths, self.logger)
+            except Exception as exc:
+                self.logger.warning("Release manifest for %s unavailable: %s", self.version, exc)
+                if _mirrors is not None:
+                    self._manifest = _mirrors.manifest(version=self.version)
+            if self._manifest is not None and _mirrors is not None:
+                _mirrors.use_manifest(self._manifest)
+        return self._manifest
+
+    def remote_file_index(self) -> list[dict] | None:
+        manifest = self.manifest()
+        files_artifact = find_artifact(manifest, FILES_ARTIFACT_NAME, "files") if manifest else None
+        if not files_artifact:
+            return None
+        index_path = self.paths["cache"] / FILES_ARTIFACT_NAME
+        index_sha = str(files_artifact["sha256"]).lower()
+        download_verified(files_artifact["url"], index_path, index_sha, self.logger)
+        self.cache.add(index_sha, index_path)
+        self.cache.remember_version(self.version, "files", index_sha)
+        return load_file_index(index_path)
+
+    def full_zip(self) -> Path | None:
+        """Verified app-full.zip for this version, from the blob cache or downloaded once."""
+        if self._zip_path is not None:
+            return self._zip_path
+        record = self.cache.version_record(self.version)
+        cached = self.cache.lookup(record["full"]) if record.get("full") else None
+        if cached is None:
+            manifest = self.manifest()
+            artifact = find_artifact(manifest, APP_ARTIFACT_NAME, "full") if manifest else None
+            if not artifact:
+                return None
+            artifact_sha = str(artifact["sha256"]).lower()
+            cached = self.cache.lookup(artifact_sha)
+            if cached is None:
+                download_path = self.paths["cache"] / f"app-full-{normalize_version(self.version)}.zip"
+                actual_sha, _ = download_with_failover(
+                    candidate_urls(artifact["url"]), download_path, self.logger, artifact_sha
+                )
+                if actual_sha != artifact_sha:
+                    download_path.unlink(missing_ok=True)
+                    raise ValueError(f"{APP_ARTIFACT_NAME} sha256 mismatch while repairing")
+                cached = self.cache.adopt(artifact_sha, download_path)
+            self.cache.remember_version(self.version, "full", artifact_sha)
+        self._zip_path = cached
+        return cached
+
+    def zip_entries(self) -> dict[str, dict] | None:
+        """Entry index of the release's app-full.zip, for fetching single entries by byte range."""
+        if self._zip_entries is not None:
+            return self._zip_entries or None
+        self._zip_entries = {}
+        manifest = self.manifest()
+        artifact = find_artifact(manifest, APP_ARTIFACT_NAME, "full") if manifest else None
+        index_artifact = find_artifact(manifest, ZIP_INDEX_ARTIFACT_NAME, "zip-index") if manifest else None
+        if not artifact or not index_artifact:
+            return None
+        probe = probe_range_support(artifact["url"], self.logger)
+        if probe is None:
+            return None
+        self._range_validator = probe[1]
+        index_path = self.paths["cache"] / ZIP_INDEX_ARTIFACT_NAME
+        download_verified(index_artifact["url"], index_path, str(index_artifact["sha256"]).lower(), self.logger)
+        entries = load_zip_index(index_path, str(artifact["sha256"]).lower())
+        self._zip_entries = {entry["name"]: entry for entry in entries}
+        return self._zip_entries
+
+    def restore(self, rel: str, expected_sha: str | None, dest: Path) -> str:
+        """Restore one file; returns the source used."""
+        if expected_sha is not None:
+            blob = self.cache.lookup(expected_sha)
+            if blob is not None:
+                _replace_file(dest, lambda tmp: shutil.copyfile(blob, tmp), expected_sha)
+                return "cache"
+            manifest = self.manifest()
+            files_artifact = find_artifact(manifest, FILES_ARTIFACT_NAME, "files") if manifest else None
+            if files_artifact and files_artifact.get("blobBaseUrl"):
+                url = f"{str(files_artifact['blobBaseUrl']).rstrip('/')}/{expected_sha}"
+                _replace_file(dest, lambda tmp: download_verified(url, tmp, expected_sha, self.logger), expected_sha)
+                self.cache.add(expected_sha, dest)
+                return "blob"
+        if self._zip_path is None and (self.zip_entries() or {}).get(rel):
+            entry = self._zip_entries[rel]
+            artifact = find_artifact(self.manifest(), APP_ARTIFACT_NAME, "full")
+            start = entry["dataOffset"]
+            data = _fetch_piece(artifact["url"], self._range_validator, start, start + entry["compressSize"])
+            if entry["method"] == zipfile.ZIP_DEFLATED:
+                data = zlib.decompress(data, -15)
+            if zlib.crc32(data) != entry["crc"] or len(data) != entry["fileSize"]:
+                raise ValueError(f"zip entry {rel} failed CRC/size check")
+            _replace_file(dest, lambda tmp: tmp.write_bytes(data), expected_sha)
+            return "range"
+        zip_path = self.full_zip()
+        if zip_path is None:
+            raise ValueError(f"no source available for {rel}")
+        with zipfile.ZipFile(zip_path, "r") as zf:
+            info = next((i for i in zf.infolist() if i.filename.replace("\\", "/") == rel), None)
+            if info is None:
+                raise ValueError(f"{rel} not found in {APP_ARTIFACT_NAME}")
+
+            def extract(tmp: Path) -> None:
+                with zf.open(info) as src, tmp.open("wb") as dst:
+                    shutil.copyfileobj(src, dst, 1024 * 1024)
+
+            _replace_file(dest, extract, expected_sha)
+        return "zip"
+
+
+def _damaged_by_crc(live: Path, entries: list[tuple[str, int, int]]) -> list[str]:
+    """Without a sha256 manifest, compare app_live to (path, size, CRC32) of the verified archive's entries."""
+    damaged = []
+    for rel, size, crc in entries:
+        try:
+            if (live / rel).stat().st_size == size and _crc32_sha256_file(live / rel)[0] == crc:
+                continue
+        except OSError:
+            pass
+        damaged.append(rel)
+    return damaged
+
+
+def repair_install(root: Path, channel: str, logger: logging.Logger, full: bool = False) -> tuple[bool, str]:
+    """Restore only the missing/corrupt files of the installed version in place."""
+    paths = ensure_dirs(root)
+    live = paths["live"]
+    state = load_state(root, channel=channel, logger=logger)
+    version = read_installed_version(live)
+    if version == "0.0.0":
+        version = str(state.get("currentVersion") or "0.0.0")
+    if version == "0.0.0":
+        return False, result_failed("installed version unknown", "reinstall_required")
+    cache = BlobCache(paths["cache"], logger)
+    sources = RepairSources(version, paths, cache, logger)
+    try:
+        expected = load_file_manifest(live, cache, version) or sources.remote_file_index()
+        if expected is not None:
+            index = open_file_index(root, logger)
+            try:
+                hashed = hash_tree_files(live, [f["path"] for f in expected], index, full=full)
+                if index is not None:
+                    index.commit()
+            finally:
+                if index is not None:
+                    index.close()
+            wanted = {f["path"]: f["sha256"] for f in expected}
+            damaged = [
+                f["path"] for f in expected if hashed[f["path"]] != (f["sha256"], f["sizeBytes"])
+            ]
+        else:
+            wanted = {}
+            zip_entries = sources.zip_entries()
+            if zip_entries:
+                crcs = [
+                    (e["name"], e["fileSize"], e["crc"]) for e in zip_entries.values() if not e["name"].endswith("/")
+                ]
+            else:
+                zip_path = sources.full_zip()
+                if zip_path is None:
+                    return False, result_failed(
+                        f"no manifest or artifact found for version {version}", "reinstall_required"
+                    )
+                with zipfile.ZipFile(zip_path, "r") as zf:
+                    crcs = [
+                        (i.filename.replace("\\", "/"), i.file_size, i.CRC) for i in zf.infolist() if not i.is_dir()
+                    ]
+            damaged = _damaged_by_crc(live, crcs)
+        if not damaged:
+            logger.info("Repair found no damaged files for version %s.", version)
+            return True, "nothing_to_repair"
+        logger.info("Repairing %d files of version %s.", len(damaged), version)
+        invalidate_validation_cache(paths)
+        used: dict[str, int] = {}
+        for rel in damaged:
+            source = sources.restore(rel, wanted.get(rel), live / rel)
+            used[source] = used.get(source, 0) + 1
+            logger.info("Repaired %s from %s.", rel, source)
+        logger.info("Repair sources: %s.", _format_counts(used))
+    except urllib.error.URLError as exc:
+        return False, result_failed(f"network error during repair: {exc}", "reinstall_required")
+    except Exception as exc:
+        return False, result_failed(f"repair failed: {exc}", "reinstall_required")
+    finally:
+        try:
+            cache.save()
+        except OSError:
+            pass
+    valid, reason = validate_app_dir(live)
+    if not valid:
+        return False, result_failed(f"app_live still invalid after repair: {reason}", "reinstall_required")
+    return True, f"repaired {len(damaged)} files"
+
+
+def _partition_members(members: list[zipfile.ZipInfo], parts: int) -> list[list[zipfile.ZipInfo]]:
+    """Split members into contiguous archive-order ranges of roughly equal compressed size."""
+    total = sum(max(info.compress_size, 1) for info in members)
+    target = total / max(parts, 1)
+    ranges: list[list[zipfile.ZipInfo]] = [[]]
+    acc = 0
+    for info in members:
+        if acc >= target * len(ranges) and len(ranges) < parts:
+            ranges.append([])
+        ranges[-1].append(info)
+        acc += max(info.compress_size, 1)
+    return [r for r in ranges if r]
+
+
+def _format_counts(counts: dict[str, int]) -> str:
+    return ", ".join(f"{name}={count}" for name, count in sorted(counts.items())) or "none"
+
+
+def _extract_members(
+    zip_path: Path,
+    stage_dir: Path,
+    members: list[zipfile.ZipInfo],
+    on_file: Callable[[], None],
+    reuse_dir: Path | None = None,
+) -> tuple[dict[str, int], list[dict]]:
+    """Extract (or reuse) members; returns per-method counts and manifest entries hashed on the way."""
+    counts: dict[str, int] = {}
+    files: list[dict] = []
+    with zipfile.ZipFile(zip_path, "r") as zf:
+        for info in members:
+            _checkpoint()
+            name = info.filename.replace("\\", "/")
+            target = stage_dir / name
+            method = "extract"
+            candidate = reuse_dir / name if reuse_dir is not None else None
+            try:
+                # Same size and CRC32 as the entry of the sha256-verified archive: the live copy is identical.
+                if candidate is not None and candidate.stat().st_size == info.file_size:
+                    crc, sha = _crc32_sha256_file(candidate)
+                    if crc == info.CRC:
+                        method = clone_file(candidate, target)
+            except OSError:
+                target.unlink(missing_ok=True)
+                method = "extract"
+            if method == "extract":
+                digest = hashlib.sha256()
+                with zf.open(info) as src, target.open("wb") as dst:
+                    for chunk in iter(lambda: src.read(1024 * 1024), b""):
+                        digest.update(chunk)
+                        dst.write(chunk)
+                sha = digest.hexdigest()
+            counts[method] = counts.get(method, 0) + 1
+            files.append({"path": name, "sha256": sha, "sizeBytes": info.file_size})
+            on_file()
+    return counts, files
+
+
+def extract_to_stage(
+    zip_path: Path,
+    stage_dir: Path,
+    root: Path,
+    logger: logging.Logger,
+    workers: int = EXTRACT_WORKERS,
+    progress: ProgressReporter | None = None,
+    reuse_dir: Path | None = None,
+) -> None:
+    """Extract zip_path into stage_dir with worker threads, each reading a disjoint member range
+    through its own ZipFile handle. Directories are created up front; CRCs are checked by zipfile.
+
+    With reuse_dir (normally app_live), files whose size and CRC32 match the archive entry are
+    reflinked/copied from there instead of being decompressed and written again."""
+    move_to_trash(stage_dir, root, logger)
     stage_dir.mkdir(parents=True, exist_ok=True)
     with zipfile.ZipFile(zip_path, "r") as zf:
-        members = [m for m in zf.infolist() if not m.is_dir()]
-        total = len(members)
-        for i, info in enumerate(members, start=1):
-            zf.extract(info, stage_dir)
-            if total:
-                pct = (i / total) * 100.0
-                logger.info("extract progress: %.1f%% (%d/%d files)", pct, i, total)
+        infos = zf.infolist()
+    dirs: set[Path] = set()
+    members = []
+    for info in infos:
+        name = info.filename.replace("\\", "/")
+        if not is_safe_relpath(name.rstrip("/") or "/"):
+            raise ValueError(f"unsafe path in archive: {info.filename!r}")
+        if info.is_dir():
+            dirs.add(stage_dir / name)
+        else:
+            dirs.add((stage_dir / name).parent)
+            members.append(info)
+    for directory in sorted(dirs):
+        directory.mkdir(parents=True, exist_ok=True)
+
+    total = len(members)
+    reporter = progress or ProgressReporter(logger)
+    reporter.start("extract", total, "files")
+    on_file = reporter.advance
+    ranges = _partition_members(members, workers)
+    logger.info("Extracting %d files with %d workers.", total, len(ranges))
+    results = []
+    if len(ranges) <= 1:
+        for members_range in ranges:
+            results.append(_extract_members(zip_path, stage_dir, members_range, on_file, reuse_dir))
+    else:
+        with ThreadPoolExecutor(max_workers=len(ranges)) as pool:
+            futures = [pool.submit(_extract_members, zip_path, stage_dir, r, on_file, reuse_dir) for r in ranges]
+            results = [future.result() for future in futures]
+    reporter.finish()
+    counts: dict[str, int] = {}
+    files: list[dict] = []
+    for result_counts, result_files in results:
+        for method, count in result_counts.items():
+            counts[method] = counts.get(method, 0) + count
+        files.extend(result_files)
+    logger.info("Stage files: %s.", _format_counts(counts))
+    write_file_manifest(stage_dir, files)
+    (stage_dir / ".staged_ok").write_text("ok\n", encoding="utf-8")
+
+
+def load_zip_index(index_path: Path, artifact_sha: str) -> list[dict]:
+    """Load a manifest-side zip entry index; only stored/deflated entries can be streamed."""
+    data = json.loads(index_path.read_text(encoding="utf-8-sig"))
+    if not isinstance(data, dict) or str(data.get("artifactSha256", "")).lower() != artifact_sha:
+        raise ValueError(f"{index_path.name} does not describe artifact {artifact_sha}")
+    entries = []
+    for item in data.get("entries", []):
+        name = str(item.get("name", "")).replace("\\", "/")
+        if not is_safe_relpath(name.rstrip("/") or "/"):
+            raise ValueError(f"unsafe path in zip index: {name!r}")
+        method = int(item.get("method", -1))
+        if method not in (zipfile.ZIP_STORED, zipfile.ZIP_DEFLATED):
+            raise ValueError(f"zip entry {name} uses unsupported compression method {method}")
+        entries.append(
+            {
+                "name": name,
+                "offset": int(item["offset"]),
+                "dataOffset": int(item["dataOffset"]),
+                "compressSize": int(item["compressSize"]),
+                "fileSize": int(item["fileSize"]),
+                "method": method,
+                "crc": int(item["crc"]),
+            }
+        )
+    entries.sort(key=lambda entry: entry["offset"])
+    return entries
+
+
+class ZipStreamExtractor:
+    """Extract zip entries from the archive bytes as they arrive, using a manifest-side entry index.
+
+    The central directory sits at the end of the file, so entry boundaries come from the index rather
+    than the archive itself. Each entry's CRC32 and size are validated as soon as its data is complete.
+    """
+
+    def __init__(self, entries: list[dict], stage_dir: Path, logger: logging.Logger) -> None:
+        self.entries = entries
+        self.stage_dir = stage_dir
+        self.logger = logger
+        self.pos = 0
+        self.current = 0
+        self.reporter = ProgressReporter(logger)
+        self.reporter.start("extract", sum(1 for entry in entries if not entry["name"].endswith("/")), "files")
+        self._header = bytearray()
+        self._out = None
+        self._inflater = None
+        self._crc = 0
+        self._size = 0
+        self._digest = hashlib.sha256()
+        self.files: list[dict] = []
+
+    def feed(self, chunk: bytes) -> None:
+        view = memoryview(chunk)
+        base = self.pos
+        self.pos += len(chunk)
+        i = 0
+        while self.current < len(self.entries):
+            entry = self.entries[self.current]
+            at = base + i
+            if at < entry["dataOffset"]:
+                if i >= len(view):
+                    return
+                if at < entry["offset"]:
+                    i += min(entry["offset"] - at, len(view) - i)
+                elif at < entry["offset"] + 4:
+                    take = min(entry["offset"] + 4 - at, len(view) - i)
+                    self._header += view[i : i + take]
+                    i += take
+                else:
+                    i += min(entry["dataOffset"] - at, len(view) - i)
+                continue
+            if self._out is None and self._inflater is None:
+                self._open(entry)
+            need = entry["dataOffset"] + entry["compressSize"] - at
+            take = min(need, len(view) - i)
+            if take:
+                self._write(entry, view[i : i + take])
+                i += take
+            if take < need:
+                return
+            self._finish(entry)
+
+    def close(self) -> None:
+        self.feed(b"")
+        if self.current < len(self.entries):
+            raise ValueError(f"archive ended before zip entry {self.entries[self.current]['name']}")
+        self.reporter.finish()
+
+    def _open(self, entry: dict) -> None:
+        if bytes(self._header) != b"PK\x03\x04":
+            raise ValueError(f"zip index offset does not match a local header for {entry['name']}")
+        target = self.stage_dir / entry["name"]
+        if entry["name"].endswith("/"):
+            target.mkdir(parents=True, exist_ok=True)
+            self._inflater = False
+            return
+        target.parent.mkdir(parents=True, exist_ok=True)
+        self._out = target.open("wb")
+        self._inflater = zlib.decompressobj(-15) if entry["method"] == zipfile.ZIP_DEFLATED else None
+        self._crc = 0
+        self._size = 0
+        self._digest = hashlib.sha256()
+
+    def _emit(self, data: bytes) -> None:
+        self._out.write(data)
+        self._digest.update(data)
+        self._crc = zlib.crc32(data, self._crc)
+        self._size += len(data)
+
+    def _write(self, entry: dict, data: memoryview) -> None:
+        if self._out is None:
+            return
+        if self._inflater:
+            self._emit(self._inflater.decompress(data))
+        else:
+            self._emit(bytes(data))
+
+    def _finish(self, entry: dict) -> None:
+        if self._out is not None:
+            if self._inflater:
+                self._emit(self._inflater.flush())
+            self._out.close()
+            self._out = None
+            if self._crc != entry["crc"] or self._size != entry["fileSize"]:
+                raise ValueError(f"zip entry {entry['name']} failed CRC/size check")
+            self.files.append({"path": entry["name"], "sha256": self._digest.hexdigest(), "sizeBytes": self._size})
+            self.reporter.advance()
+        self._inflater = None
+        self._header = bytearray()
+        self.current += 1
+
+    def abort(self) -> None:
+        if self._out is not None:
+            self._out.close()
+            self._out = None
+
+
+def stream_extract_to_stage(
+    url: str,
+    zip_path: Path,
+    entries: list[dict],
+    stage_dir: Path,
+    root: Path,
+    logger: logging.Logger,
+    progress: ProgressReporter | None = None,
+    expected_sha: str = "",
+) -> tuple[str, int, Exception | None]:
+    """Download the archive while a consumer thread extracts finished entries into stage_dir.
+
+    Returns (sha256, size, extraction error). The caller must check the archive sha256 before
+    marking the stage as ready. expected_sha lets the download fail over between mirrors.
+    """
+    move_to_trash(stage_dir, root, logger)
+    stage_dir.mkdir(parents=True, exist_ok=True)
+    extractor = ZipStreamExtractor(entries, stage_dir, logger)
+    chunks: queue.Queue = queue.Queue(maxsize=32)
+    errors: list[Exception] = []
+
+    def consume() -> None:
+        while True:
+            chunk = chunks.get()
+            if chunk is None:
+                return
+            if errors:
+                continue
+            try:
+                extractor.feed(chunk)
+            except Exception as exc:
+                errors.append(exc)
+                extractor.abort()
+
+    consumer = threading.Thread(target=consume, name="flez-extract", daemon=True)
+    consumer.start()
+    try:
+        actual_sha, actual_size = download_with_failover(
+            candidate_urls(url), zip_path, logger, expected_sha, on_data=chunks.put,
+            on_failover=lambda: errors.append(ValueError("download failed over; streaming extraction abandoned")),
+            progress=progress,
+        )
+    finally:
+        chunks.put(None)
+        consumer.join()
+    if not errors:
+        try:
+            extractor.close()
+            write_file_manifest(stage_dir, extractor.files)
+        except Exception as exc:
+            errors.append(exc)
+    extractor.abort()
+    return actual_sha, actual_size, errors[0] if errors else None
+
+
+def zstd_decompressor():
+    """A streaming zstd decompressor (stdlib compression.zstd, else the zstandard package), or None."""
+    try:
+        from compression import zstd
+
+        return zstd.ZstdDecompressor()
+    except ImportError:
+        pass
+    try:
+        import zstandard
+    except ImportError:
+        return None
+    return zstandard.ZstdDecompressor().decompressobj()
+
+
+class _DecompressingReader(io.RawIOBase):
+    """Read-only stream of decompressed bytes; read_chunk returns the next compressed chunk, b"" at the end."""
+
+    def __init__(self, read_chunk: Callable[[], bytes], decompressor) -> None:
+        super().__init__()
+        self.read_chunk = read_chunk
+        self.decompressor = decompressor
+        self._buf = b""
+        self._pos = 0
+        self.exhausted = False
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, b) -> int:
+        while self._pos >= len(self._buf):
+            if self.exhausted:
+                return 0
+            chunk = self.read_chunk()
+            if not chunk:
+                self.exhausted = True
+                return 0
+            self._buf = self.decompressor.decompress(chunk)
+            self._pos = 0
+        n = min(len(b), len(self._buf) - self._pos)
+        b[:n] = memoryview(self._buf)[self._pos:self._pos + n]
+        self._pos += n
+        return n
+
+
+def _extract_tar_stream(reader: io.RawIOBase, stage_dir: Path) -> list[dict]:
+    """Extract a streamed tar into stage_dir in one pass; returns manifest entries hashed on the way.
+
+    Only regular files and directories with safe relative paths are accepted.
+    """
+    files: list[dict] = []
+    with tarfile.open(fileobj=reader, mode="r|") as tf:
+        for member in tf:
+            _checkpoint()
+            name = member.name.replace("\\", "/").removeprefix("./").rstrip("/")
+            if not name:
+                continue
+            if not is_safe_relpath(name):
+                raise ValueError(f"unsafe path in archive: {member.name!r}")
+            target = stage_dir / name
+            if member.isdir():
+                target.mkdir(parents=True, exist_ok=True)
+                continue
+            if not member.isfile():
+                raise ValueError(f"unsupported archive member type: {member.name!r}")
+            target.parent.mkdir(parents=True, exist_ok=True)
+            digest = hashlib.sha256()
+            src = tf.extractfile(member)
+            with target.open("wb") as dst:
+                for chunk in iter(lambda: src.read(1024 * 1024), b""):
+                    digest.update(chunk)
+                    dst.write(chunk)
+            files.append({"path": name, "sha256": digest.hexdigest(), "sizeBytes": member.size})
+    return files
+
+
+def extract_tar_zst(archive_path: Path, stage_dir: Path, root: Path, logger: logging.Logger) -> None:
+    """Extract a downloaded app-full.tar.zst into stage_dir, decompressing as it reads."""
+    decompressor = zstd_decompressor()
+    if decompressor is None:
+        raise RuntimeError("zstd decompression unavailable")
+    move_to_trash(stage_dir, root, logger)
+    stage_dir.mkdir(parents=True, exist_ok=True)
+    with archive_path.open("rb") as fh:
+        files = _extract_tar_stream(_DecompressingReader(lambda: fh.read(1024 * 1024), decompressor), stage_dir)
+    write_file_manifest(stage_dir, files)
     (stage_dir / ".staged_ok").write_text("ok\n", encoding="utf-8")
 
 
-def stage_latest(root: Path, channel: str, logger: logging.Logger) -> tuple[bool, str]:
+def stream_extract_tar_zst(
+    url: str,
+    archive_path: Path,
+    stage_dir: Path,
+    root: Path,
+    logger: logging.Logger,
+    progress: ProgressReporter | None = None,
+    expected_sha: str = "",
+) -> tuple[str, int, Exception | None]:
+    """Download app-full.tar.zst while a consumer thread decompresses and untars it into stage_dir.
+
+    Returns (sha256, size, extraction error). The caller must check the archive sha256 before
+    marking the stage as ready. expected_sha lets the download fail over between mirrors.
+    """
+    decompressor = zstd_decompressor()
+    if decompressor is None:
+        raise RuntimeError("zstd decompression unavailable")
+    move_to_trash(stage_dir, root, logger)
+    stage_dir.mkdir(parents=True, exist_ok=True)
+    chunks: queue.Queue = queue.Queue(maxsize=32)
+    reader = _DecompressingReader(lambda: chunks.get() or b"", decompressor)
+    errors: list[Exception] = []
+    files: list[dict] = []
+
+    def consume() -> None:
+        try:
+            files.extend(_extract_tar_stream(reader, stage_dir))
+        except Exception as exc:
+            errors.append(exc)
+        # Keep draining so the download never blocks on a full queue.
+        while not reader.exhausted:
+            reader.exhausted = chunks.get() is None
+
+    consumer = threading.Thread(target=consume, name="flez-extract", daemon=True)
+    consumer.start()
+    try:
+        actual_sha, actual_size = download_with_failover(
+            candidate_urls(url), archive_path, logger, expected_sha, on_data=chunks.put,
+            on_failover=lambda: errors.append(ValueError("download failed over; streaming extraction abandoned")),
+            progress=progress,
+        )
+    finally:
+        chunks.put(None)
+        consumer.join()
+    if not errors:
+        try:
+            write_file_manifest(stage_dir, files)
+        except Exception as exc:
+            errors.append(exc)
+    return actual_sha, actual_size, errors[0] if errors else None
+
+
+def stage_tar_zst(
+    artifact: dict,
+    paths: dict[str, Path],
+    logger: logging.Logger,
+    progress: ProgressReporter,
+    cache: BlobCache,
+    target_version: str,
+) -> dict:
+    """Stage from the zstd-compressed tar artifact; returns the staged artifact record."""
+    artifact_url = artifact.get("url")
+    artifact_sha = str(artifact.get("sha256", "")).lower()
+    if not artifact_url or not artifact_sha:
+        raise ValueError(f"{ZST_ARTIFACT_NAME} metadata missing url/sha256")
+    archive_path = paths["cache"] / ZST_ARTIFACT_NAME
+    cached_archive = cache.lookup(artifact_sha)
+    if cached_archive is not None:
+        logger.info("Using cached %s (%s); no download needed.", ZST_ARTIFACT_NAME, artifact_sha)
+        extract_tar_zst(cached_archive, paths["stage"], paths["live"].parent, logger)
+    else:
+        logger.info("Extracting %s while downloading.", ZST_ARTIFACT_NAME)
+        actual_sha, actual_size, extract_error = stream_extract_tar_zst(
+            artifact_url, archive_path, paths["stage"], paths["live"].parent, logger, progress, artifact_sha
+        )
+        expected_size = int(artifact.get("sizeBytes", 0) or 0)
+        if actual_sha != artifact_sha or (expected_size and actual_size != expected_size):
+            move_to_trash(paths["stage"], paths["live"].parent, logger)
+            archive_path.unlink(missing_ok=True)
+            raise ValueError(f"{ZST_ARTIFACT_NAME} sha256/size mismatch (sha256={actual_sha}, size={actual_size})")
+        archive_path = cache.adopt(artifact_sha, archive_path)
+        if extract_error is not None:
+            logger.warning("Streaming extraction failed; re-extracting from verified archive: %s", extract_error)
+            extract_tar_zst(archive_path, paths["stage"], paths["live"].parent, logger)
+        else:
+            (paths["stage"] / ".staged_ok").write_text("ok\n", encoding="utf-8")
+    cache.remember_version(target_version, "fullZst", artifact_sha)
+    return {
+        "name": ZST_ARTIFACT_NAME,
+        "type": "full-zst",
+        "url": artifact_url,
+        "sha256": artifact_sha,
+        "sizeBytes": artifact.get("sizeBytes", 0),
+    }
+
+
+def rebuild_backup_from_cache(paths: dict[str, Path], cache: BlobCache, logger: logging.Logger) -> bool:
+    """Rebuild an empty/invalid app_backup for the live version from cached blobs, without network."""
+    backup = paths["backup"]
+    if validate_app_dir(backup)[0]:
+        return False
+    root = paths["live"].parent
+    version = read_installed_version(paths["live"])
+    record = cache.version_record(version)
+    building = paths["tmp"] / "backup_build"
+    move_to_trash(building, root, logger)
+    index_path = cache.lookup(record["files"]) if record.get("files") else None
+    artifact_path = cache.lookup(record["full"]) if record.get("full") else None
+    zst_path = cache.lookup(record["fullZst"]) if record.get("fullZst") else None
+    if index_path is not None:
+        entries = load_file_index(index_path)
+        blobs = [(entry, cache.lookup(entry["sha256"])) for entry in entries]
+        if any(blob is None for _, blob in blobs):
+            logger.info("Blob cache incomplete for %s; app_backup not rebuilt.", version)
+            return False
+        for entry, blob in blobs:
+            dest = building / entry["path"]
+            dest.parent.mkdir(parents=True, exist_ok=True)
+            clone_file(blob, dest)
+    elif artifact_path is not None:
+        extract_to_stage(artifact_path, building, root, logger)
+        (building / ".staged_ok").unlink(missing_ok=True)
+    elif zst_path is not None and zstd_decompressor() is not None:
+        extract_tar_zst(zst_path, building, root, logger)
+        (building / ".staged_ok").unlink(missing_ok=True)
+    else:
+        return False
+    if not validate_app_dir(building)[0]:
+        move_to_trash(building, root, logger)
+        return False
+    move_to_trash(backup, root, logger)
+    os.replace(str(building), str(backup))
+    logger.info("Rebuilt app_backup for version %s from blob cache.", version)
+    return True
+
+
+def stage_latest(
+    root: Path,
+    channel: str,
+    logger: logging.Logger,
+    releases_ttl: float = RELEASES_CACHE_TTL_SECONDS,
+    spans: Spans | None = None,
+    precompile: bool = False,
+) -> tuple[bool, str]:
+    """Download and stage the newest release. precompile also builds its pycs before marking the stage
+    ready; only the detached background check-stage does that, so synchronous callers never wait on it."""
+    paths = ensure_dirs(root)
+    spans = spans or Spans("updater")
+    progress = ProgressReporter(logger, paths["state_dir"] / "progress.json")
+    cache = BlobCache(paths["cache"], logger)
+    try:
+        try:
+            rebuild_backup_from_cache(paths, cache, logger)
+        except Exception as exc:
+            logger.warning("app_backup rebuild from blob cache failed: %s", exc)
+        ok, detail = _stage_latest(root, channel, logger, progress, cache, releases_ttl, spans, precompile)
+    finally:
+        try:
+            cache.evict()
+            cache.save()
+        except OSError as exc:
+            logger.warning("Blob cache index not saved: %s", exc)
+    progress.end("done" if ok else "failed", detail)
+    return ok, detail
+
+
+def _stage_latest(
+    root: Path,
+    channel: str,
+    logger: logging.Logger,
+    progress: ProgressReporter,
+    cache: BlobCache,
+    releases_ttl: float,
+    spans: Spans,
+    precompile: bool,
+) -> tuple[bool, str]:
     paths = ensure_dirs(root)
-    state = load_state(root, channel=channel, logger=logger)
     current_version = read_installed_version(paths["live"])
-    state["currentVersion"] = current_version
-    save_state(root, state)
+    state = update_state(root, channel, logger, currentVersion=current_version)
     logger.info("Current installed version: %s", current_version)
 
     staged_target = str(state.get("targetVersion") or "").strip()
@@ -265,74 +2797,172 @@ def stage_latest(root: Path, channel: str, logger: logging.Logger) -> tuple[bool
         if is_newer_version(staged_target, current_version):
             logger.info("Existing staged update detected for version %s; skipping re-stage.", staged_target)
             return True, "staged"
-        state["status"] = STATUS_IDLE
-        state["targetVersion"] = None
-        state["artifact"] = None
-        state["lastError"] = None
-        attempts = state.setdefault("attempts", {})
-        attempts["applyCount"] = 0
-        attempts["rollbackCount"] = 0
-        save_state(root, state)
+        update_state(
+            root,
+            channel,
+            logger,
+            status=STATUS_IDLE,
+            targetVersion=None,
+            artifact=None,
+            lastError=None,
+            attempts={"applyCount": 0, "rollbackCount": 0},
+        )
 
     try:
-        releases = fetch_releases(logger)
-        release = select_release_for_channel(releases, channel=channel)
-        if not release:
-            return False, result_failed(f"no release found for channel '{channel}'", "keep_current_version")
-        latest_tag = str(release.get("tag_name", "")).strip()
+        manifest = None
+        try:
+            with spans.span("releases"):
+                releases = fetch_releases(logger, paths["cache"], releases_ttl)
+        except urllib.error.URLError as exc:
+            # GitHub down or rate-limited: a configured mirror can still tell us the latest release.
+            manifest = _mirrors.manifest(channel) if _mirrors is not None else None
+            if manifest is None:
+                raise
+            logger.warning("Releases API unavailable (%s); using a mirror manifest.", exc)
+        if manifest is None:
+            release = select_release_for_channel(releases, channel=channel)
+            if not release:
+                return False, result_failed(f"no release found for channel '{channel}'", "keep_current_version")
+            latest_tag = str(release.get("tag_name", "")).strip()
+        else:
+            latest_tag = str(manifest.get("version", "")).strip()
         logger.info("Latest release tag for channel %s: %s", channel, latest_tag)
         if not latest_tag or not is_newer_version(latest_tag, current_version):
             logger.info("No update needed.")
             return True, result_skipped("already up to date", "keep_current_version")
 
-        manifest_asset = find_asset(release, MANIFEST_ASSET_NAME)
-        if not manifest_asset:
-            return False, result_failed(f"{MANIFEST_ASSET_NAME} asset missing on release", "keep_current_version")
-
-        manifest_path = paths["cache"] / MANIFEST_ASSET_NAME
-        download_file(manifest_asset["browser_download_url"], manifest_path, logger)
-        manifest = json.loads(manifest_path.read_text(encoding="utf-8-sig"))
-
-        artifact = None
-        for item in manifest.get("artifacts", []):
-            if item.get("name") == APP_ARTIFACT_NAME and item.get("type") == "full":
-                artifact = item
-                break
-        if not artifact:
-            return False, result_failed(f"{APP_ARTIFACT_NAME} full artifact missing in manifest", "keep_current_version")
-
-        artifact_url = artifact.get("url")
-        artifact_sha = str(artifact.get("sha256", "")).lower()
-        if not artifact_url or not artifact_sha:
-            return False, result_failed("artifact metadata missing url/sha256", "keep_current_version")
-
-        artifact_path = paths["cache"] / APP_ARTIFACT_NAME
-        download_file(artifact_url, artifact_path, logger)
-        actual_sha = sha256_file(artifact_path).lower()
-        if actual_sha != artifact_sha:
-            return False, result_failed(
-                f"artifact sha256 mismatch (expected={artifact_sha}, actual={actual_sha})",
-                "discard_staged_update",
-            )
-
-        extract_to_stage(artifact_path, paths["stage"], logger)
-        valid, reason = validate_app_dir(paths["stage"])
+        if manifest is None:
+            manifest_asset = find_asset(release, MANIFEST_ASSET_NAME)
+            if not manifest_asset:
+                return False, result_failed(f"{MANIFEST_ASSET_NAME} asset missing on release", "keep_current_version")
+
+            manifest_path = paths["cache"] / MANIFEST_ASSET_NAME
+            with spans.span("manifest"):
+                download_file(manifest_asset["browser_download_url"], manifest_path, logger)
+                manifest = json.loads(manifest_path.read_text(encoding="utf-8-sig"))
+        if _mirrors is not None:
+            _mirrors.use_manifest(manifest)
+
+        artifact = find_artifact(manifest, APP_ARTIFACT_NAME, "full")
+        files_artifact = find_artifact(manifest, FILES_ARTIFACT_NAME, "files")
+        target_version = str(manifest.get("version", latest_tag))
+        patch_artifact = find_patch_artifact(manifest, current_version, target_version)
+        staged_artifact = None
+        if files_artifact:
+            try:
+                with spans.span("files_delta"):
+                    staged_artifact = stage_file_delta(
+                        files_artifact, artifact, patch_artifact, paths, logger, progress, cache, target_version
+                    )
+            except Exception as exc:
+                if not artifact:
+                    raise
+                logger.warning("File delta staging failed; falling back to %s: %s", APP_ARTIFACT_NAME, exc)
+
+        zst_artifact = find_artifact(manifest, ZST_ARTIFACT_NAME, "full-zst")
+        if staged_artifact is None and zst_artifact:
+            if zstd_decompressor() is None:
+                logger.info("No zstd decoder in this runtime; using %s.", APP_ARTIFACT_NAME)
+            else:
+                try:
+                    with spans.span("download"):
+                        staged_artifact = stage_tar_zst(zst_artifact, paths, logger, progress, cache, target_version)
+                except Exception as exc:
+                    if not artifact:
+                        raise
+                    logger.warning("%s staging failed; falling back to %s: %s", ZST_ARTIFACT_NAME, APP_ARTIFACT_NAME, exc)
+
+        if staged_artifact is None:
+            if not artifact:
+                return False, result_failed(f"{APP_ARTIFACT_NAME} full artifact missing in manifest", "keep_current_version")
+
+            artifact_url = artifact.get("url")
+            artifact_sha = str(artifact.get("sha256", "")).lower()
+            if not artifact_url or not artifact_sha:
+                return False, result_failed("artifact metadata missing url/sha256", "keep_current_version")
+
+            artifact_path = paths["cache"] / APP_ARTIFACT_NAME
+            cached_artifact = cache.lookup(artifact_sha)
+            zip_entries = None
+            index_artifact = find_artifact(manifest, ZIP_INDEX_ARTIFACT_NAME, "zip-index")
+            if index_artifact and cached_artifact is None:
+                try:
+                    index_path = paths["cache"] / ZIP_INDEX_ARTIFACT_NAME
+                    download_verified(index_artifact["url"], index_path, str(index_artifact["sha256"]).lower(), logger)
+                    zip_entries = load_zip_index(index_path, artifact_sha)
+                except Exception as exc:
+                    logger.warning("Zip entry index unusable; extracting after download: %s", exc)
+
+            extract_error = None
+            with spans.span("download"):
+                if cached_artifact is not None:
+                    logger.info("Using cached %s (%s); no download needed.", APP_ARTIFACT_NAME, artifact_sha)
+                    artifact_path = cached_artifact
+                    actual_sha, actual_size = artifact_sha, artifact_path.stat().st_size
+                elif zip_entries is not None:
+                    logger.info("Extracting %s while downloading (%d entries).", APP_ARTIFACT_NAME, len(zip_entries))
+                    actual_sha, actual_size, extract_error = stream_extract_to_stage(
+                        artifact_url, artifact_path, zip_entries, paths["stage"], root, logger, progress, artifact_sha
+                    )
+                else:
+                    actual_sha, actual_size = download_with_failover(
+                        candidate_urls(artifact_url), artifact_path, logger, artifact_sha, progress=progress
+                    )
+            if actual_sha != artifact_sha:
+                move_to_trash(paths["stage"], root, logger)
+                return False, result_failed(
+                    f"artifact sha256 mismatch (expected={artifact_sha}, actual={actual_sha})",
+                    "discard_staged_update",
+                )
+            expected_size = int(artifact.get("sizeBytes", 0) or 0)
+            if expected_size and actual_size != expected_size:
+                move_to_trash(paths["stage"], root, logger)
+                return False, result_failed(
+                    f"artifact size mismatch (expected={expected_size}, actual={actual_size})",
+                    "discard_staged_update",
+                )
+
+            if cached_artifact is None:
+                artifact_path = cache.adopt(artifact_sha, artifact_path)
+            cache.remember_version(target_version, "full", artifact_sha)
+
+            if zip_entries is None or extract_error is not None:
+                if extract_error is not None:
+                    logger.warning("Streaming extraction failed; re-extracting from verified archive: %s", extract_error)
+                with spans.span("extract"):
+                    extract_to_stage(
+                        artifact_path, paths["stage"], root, logger, progress=progress, reuse_dir=paths["live"]
+                    )
+            else:
+                (paths["stage"] / ".staged_ok").write_text("ok\n", encoding="utf-8")
+            staged_artifact = {
+                "name": APP_ARTIFACT_NAME,
+                "url": artifact_url,
+                "sha256": artifact_sha,
+                "sizeBytes": artifact.get("sizeBytes", 0),
+            }
+
+        with spans.span("validate_stage"):
+            valid, reason = validate_app_dir(paths["stage"])
+        if valid:
+            with spans.span("file_manifest"):
+                record_stage_manifest(root, paths["stage"], logger)
+            if precompile:
+                with spans.span("precompile"):
+                    precompile_stage(paths["stage"], logger)
         if not valid:
             return False, result_failed(f"stage validation failed: {reason}", "discard_staged_update")
 
-        state["targetVersion"] = manifest.get("version", latest_tag)
-        state["status"] = STATUS_DOWNLOADED_STAGED
-        state["artifact"] = {
-            "name": APP_ARTIFACT_NAME,
-            "url": artifact_url,
-            "sha256": artifact_sha,
-            "sizeBytes": artifact.get("sizeBytes", 0),
-        }
-        state["lastError"] = None
-        attempts = state.setdefault("attempts", {})
-        attempts["applyCount"] = 0
-        attempts["rollbackCount"] = 0
-        save_state(root, state)
+        update_state(
+            root,
+            channel,
+            logger,
+            targetVersion=target_version,
+            status=STATUS_DOWNLOADED_STAGED,
+            artifact=staged_artifact,
+            lastError=None,
+            attempts={"applyCount": 0, "rollbackCount": 0},
+        )
         return True, "staged"
     except urllib.error.URLError as exc:
         return False, result_failed(f"network error: {exc}", "keep_current_version")
@@ -346,9 +2976,13 @@ def apply_staged_update(root: Path, channel: str, logger: logging.Logger) -> tup
     if state.get("status") != STATUS_DOWNLOADED_STAGED:
         return True, result_skipped("no staged update present", "keep_current_version")
     if int(state.get("attempts", {}).get("applyCount", 0)) >= 3:
-        state["status"] = STATUS_FAILED_REQUIRES_REINSTALL
-        state["lastError"] = "apply loop protection triggered (max apply attempts reached)"
-        save_state(root, state)
+        update_state(
+            root,
+            channel,
+            logger,
+            status=STATUS_FAILED_REQUIRES_REINSTALL,
+            lastError="apply loop protection triggered (max apply attempts reached)",
+        )
         return False, result_failed("apply loop protection triggered", "reinstall_required")
 
     stage = paths["stage"]
@@ -359,22 +2993,24 @@ def apply_staged_update(root: Path, channel: str, logger: logging.Logger) -> tup
         return False, result_failed(f"cannot apply invalid stage: {reason}", "rollback_or_reinstall")
 
     try:
-        state["status"] = STATUS_APPLY_IN_PROGRESS
-        state["attempts"]["applyCount"] = int(state["attempts"].get("applyCount", 0)) + 1
-        state["timestamps"]["applyStartedAt"] = now_iso()
-        save_state(root, state)
-
-        if backup.exists():
-            shutil.rmtree(backup, ignore_errors=True)
+        update_state(
+            root,
+            channel,
+            logger,
+            _bump_attempt("applyCount"),
+            status=STATUS_APPLY_IN_PROGRESS,
+            timestamps={"applyStartedAt": now_iso()},
+        )
+
+        invalidate_validation_cache(paths)
+        move_to_trash(backup, root, logger)
         if live.exists():
             os.replace(str(live), str(backup))
         os.replace(str(stage), str(live))
-        state["status"] = STATUS_APPLIED_PENDING_HEALTHCHECK
-        save_state(root, state)
+        update_state(root, channel, logger, status=STATUS_APPLIED_PENDING_HEALTHCHECK)
         return True, "applied"
     except Exception as exc:
-        state["lastError"] = str(exc)
-        save_state(root, state)
+        update_state(root, channel, logger, lastError=str(exc))
         return False, result_failed(f"apply failed: {exc}", "rollback_or_reinstall")
 
 
@@ -384,67 +3020,317 @@ def rollback(root: Path, channel: str, logger: logging.Logger) -> tuple[bool, st
     backup = paths["backup"]
     live = paths["live"]
     if int(state.get("attempts", {}).get("rollbackCount", 0)) >= 1:
-        state["status"] = STATUS_FAILED_REQUIRES_REINSTALL
-        state["lastError"] = "rollback loop protection triggered (max rollback attempts reached)"
-        save_state(root, state)
+        update_state(
+            root,
+            channel,
+            logger,
+            status=STATUS_FAILED_REQUIRES_REINSTALL,
+            lastError="rollback loop protection triggered (max rollback attempts reached)",
+        )
         return False, result_failed("rollback loop protection triggered", "reinstall_required")
     if not backup.exists():
-        state["status"] = STATUS_FAILED_REQUIRES_REINSTALL
-        state["lastError"] = "backup missing during rollback"
-        save_state(root, state)
+        update_state(
+            root, channel, logger, status=STATUS_FAILED_REQUIRES_REINSTALL, lastError="backup missing during rollback"
+        )
         return False, result_failed("backup missing during rollback", "reinstall_required")
 
     valid, reason = validate_app_dir(backup)
     if not valid:
-        state["status"] = STATUS_FAILED_REQUIRES_REINSTALL
-        state["lastError"] = f"invalid backup: {reason}"
-        save_state(root, state)
+        update_state(
+            root, channel, logger, status=STATUS_FAILED_REQUIRES_REINSTALL, lastError=f"invalid backup: {reason}"
+        )
         return False, result_failed(f"invalid backup: {reason}", "reinstall_required")
 
     try:
-        state["status"] = STATUS_ROLLBACK_IN_PROGRESS
-        state["attempts"]["rollbackCount"] = int(state["attempts"].get("rollbackCount", 0)) + 1
-        save_state(root, state)
+        update_state(root, channel, logger, _bump_attempt("rollbackCount"), status=STATUS_ROLLBACK_IN_PROGRESS)
+        invalidate_validation_cache(paths)
         failed_live = paths["tmp"] / "failed_live"
-        if failed_live.exists():
-            shutil.rmtree(failed_live, ignore_errors=True)
+        move_to_trash(failed_live, root, logger)
         if live.exists():
             os.replace(str(live), str(failed_live))
         os.replace(str(backup), str(live))
-        state["status"] = STATUS_ROLLED_BACK
-        save_state(root, state)
+        update_state(root, channel, logger, status=STATUS_ROLLED_BACK)
         return True, "rolled_back"
     except Exception as exc:
-        state["status"] = STATUS_FAILED_REQUIRES_REINSTALL
-        state["lastError"] = f"rollback failed: {exc}"
-        save_state(root, state)
+        update_state(
+            root, channel, logger, status=STATUS_FAILED_REQUIRES_REINSTALL, lastError=f"rollback failed: {exc}"
+        )
         return False, result_failed(f"rollback failed: {exc}", "reinstall_required")
 
 
-def main() -> int:
-    parser = argparse.ArgumentParser(description="flez-bot packaged updater")
-    parser.add_argument("--root", default=str(Path(__file__).resolve().parent))
-    parser.add_argument("--channel", default="alpha", choices=["alpha", "stable"])
-    parser.add_argument("--mode", default="check-stage", choices=["check-stage", "apply", "rollback"])
-    args = parser.parse_args()
-    root = Path(args.root).resolve()
+class StageLease:
+    """Cross-process single-flight lease on staging/apply work.
+
+    The owner holds an OS-level lock on state/stage.lock (state_store's flock/msvcrt helper) for the
+    whole run, so the kernel releases it when the owner exits or dies and there is no takeover to race.
+    state/stage.owner.json describes the owner (pid, mode, startedAt) for waiters; a daemon thread
+    refreshes its heartbeat while the record is still ours."""
 
-    logger, log_path = setup_logger(root)
-    logger.info("Updater starting. Root=%s mode=%s channel=%s", root, args.mode, args.channel)
+    def __init__(self, root: Path, logger: logging.Logger) -> None:
+        self.path = root / "state" / STAGE_LEASE_NAME
+        self.owner_path = root / "state" / STAGE_LEASE_OWNER_NAME
+        self.logger = logger
+        self.record: dict | None = None
+        self._fd: int | None = None
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    def holder(self) -> dict:
+        """Record of the process holding the lease (best effort: the owner file may not be written yet)."""
+        try:
+            record = json.loads(self.owner_path.read_text(encoding="utf-8"))
+            if isinstance(record, dict):
+                return record
+        except (OSError, ValueError):
+            pass
+        return {"pid": 0, "mode": "unknown"}
+
+    def try_acquire(self, mode: str) -> dict | None:
+        """Take the lease; returns None on success, else the record of the process holding it."""
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            lock_fd(fd)
+        except OSError:
+            os.close(fd)
+            return self.holder()
+        self._fd = fd
+        self.record = {"pid": os.getpid(), "mode": mode, "startedAt": now_iso(), "heartbeat": time.time()}
+        self._write_owner(self.record)
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._heartbeat, name="flez-lease", daemon=True)
+        self._thread.start()
+        return None
+
+    def wait_and_acquire(self, mode: str, progress_path: Path, timeout: float = STAGE_LEASE_WAIT_SECONDS) -> bool:
+        """Attach to the running updater: report its progress until it finishes, then take the lease."""
+        deadline = time.monotonic() + timeout
+        last_log = 0.0
+        while True:
+            holder = self.try_acquire(mode)
+            if holder is None:
+                return True
+            if time.monotonic() >= deadline:
+                return False
+            if time.monotonic() - last_log >= 5.0:
+                last_log = time.monotonic()
+                try:
+                    status = json.loads(progress_path.read_text(encoding="utf-8"))
+                    detail = f"{status.get('phase')} {status.get('percent')}%"
+                except (OSError, ValueError):
+                    detail = "no progress yet"
+                self.logger.info("Waiting for updater pid %s (%s): %s", holder.get("pid"), holder.get("mode"), detail)
+            time.sleep(0.5)
+
+    def _owns_record(self) -> bool:
+        current = self.holder()
+        return (
+            self.record is not None
+            and current.get("pid") == self.record["pid"]
+            and current.get("startedAt") == self.record["startedAt"]
+        )
+
+    def _write_owner(self, record: dict) -> None:
+        tmp_path = self.owner_path.with_name(f"{self.owner_path.name}.{os.getpid()}.tmp")
+        tmp_path.write_text(json.dumps(record), encoding="utf-8")
+        os.replace(tmp_path, self.owner_path)
+
+    def _heartbeat(self) -> None:
+        while not self._stop.wait(STAGE_LEASE_HEARTBEAT_SECONDS):
+            if not self._owns_record():
+                self.logger.warning("Updater lease record %s no longer ours; heartbeat stopped.", self.owner_path)
+                return
+            try:
+                self._write_owner(dict(self.record or {}, heartbeat=time.time()))
+            except OSError as exc:
+                self.logger.warning("Updater lease heartbeat failed: %s", exc)
+
+    def release(self) -> None:
+        if self._fd is None:
+            return
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        try:
+            if self._owns_record():
+                self.owner_path.unlink()
+        except OSError:
+            pass
+        # stage.lock itself stays: unlinking it would let a waiter lock an inode nobody else can see.
+        with contextlib.suppress(OSError):
+            unlock_fd(self._fd)
+        os.close(self._fd)
+        self._fd = None
+        self.record = None
+
+
+ENGINE_MODES = ("check-stage", "apply", "rollback", "gc", "verify", "repair")
+LEASED_MODES = ("check-stage", "apply", "rollback", "repair")
+
+
+def run_mode(
+    root: Path,
+    mode: str,
+    channel: str = "alpha",
+    releases_ttl: float = RELEASES_CACHE_TTL_SECONDS,
+    full: bool = False,
+    collect_trash_after: bool = False,
+    wait: bool = False,
+    background: bool = False,
+    wait_seconds: float = STAGE_LEASE_WAIT_SECONDS,
+) -> tuple[bool, str]:
+    """Engine entry point: run one updater mode against root and return (ok, detail).
+
+    Used by main() and, in-process, by the launcher. Modes that touch app_stage/app_live are
+    single-flight: if another updater holds the lease, return at once, or with wait=True follow its
+    progress for up to wait_seconds and run afterwards (else fail with action=retry_later). "gc", collect_trash_after and background (check-stage under the
+    state.json "background" limits) lower the calling process's priority, so only run them in a
+    process that is about to exit.
+    """
+    global _governor, _mirrors
+    if mode not in ENGINE_MODES:
+        raise ValueError(f"unknown updater mode: {mode}")
+    spans = Spans("updater")
+    with spans.span("logger"):
+        logger, log_path = setup_logger(root)
+    logger.info("Updater starting. Root=%s mode=%s channel=%s", root, mode, channel)
     logger.info("Updater log path: %s", log_path)
 
-    if args.mode == "check-stage":
-        ok, detail = stage_latest(root, channel=args.channel, logger=logger)
-    elif args.mode == "apply":
-        ok, detail = apply_staged_update(root, channel=args.channel, logger=logger)
+    lease = StageLease(root, logger)
+    try:
+        if mode in LEASED_MODES:
+            if wait:
+                acquired = lease.wait_and_acquire(mode, root / "state" / "progress.json", wait_seconds)
+                if not acquired:
+                    return _finish_run(
+                        logger, spans, root, mode, False,
+                        result_failed("timed out waiting for the running updater", "retry_later"),
+                    )
+            else:
+                holder = lease.try_acquire(mode)
+                if holder is not None:
+                    return _finish_run(
+                        logger, spans, root, mode, True,
+                        result_skipped(
+                            f"updater pid {holder.get('pid')} is already running {holder.get('mode')}",
+                            "attach_to_running_updater",
+                        ),
+                    )
+        if background and mode == "check-stage":
+            _governor = ResourceGovernor.from_state(root, channel, logger)
+            _governor.engage()
+        if mode in ("check-stage", "repair"):
+            _mirrors = MirrorSet.from_state(root, channel, logger)
+        ok, detail = _run_leased_mode(root, mode, channel, logger, spans, releases_ttl, full, background)
+    finally:
+        _governor = None
+        _mirrors = None
+        lease.release()
+    if mode == "gc" or (mode == "check-stage" and collect_trash_after):
+        lower_process_priority(logger)
+        with spans.span("gc"):
+            collect_trash(root, logger)
+    return _finish_run(logger, spans, root, mode, ok, detail)
+
+
+def _run_leased_mode(
+    root: Path,
+    mode: str,
+    channel: str,
+    logger: logging.Logger,
+    spans: Spans,
+    releases_ttl: float,
+    full: bool,
+    background: bool,
+) -> tuple[bool, str]:
+    if mode == "check-stage":
+        ok, detail = stage_latest(
+            root, channel=channel, logger=logger, releases_ttl=releases_ttl, spans=spans, precompile=background
+        )
+    elif mode == "apply":
+        with spans.span("apply"):
+            ok, detail = apply_staged_update(root, channel=channel, logger=logger)
+    elif mode == "rollback":
+        with spans.span("rollback"):
+            ok, detail = rollback(root, channel=channel, logger=logger)
+    elif mode == "verify":
+        with spans.span("verify"):
+            ok, detail, _ = verify_install(root, logger, full=full)
+    elif mode == "repair":
+        with spans.span("repair"):
+            ok, detail = repair_install(root, channel=channel, logger=logger, full=full)
     else:
-        ok, detail = rollback(root, channel=args.channel, logger=logger)
+        ok, detail = True, "gc"
+    return ok, detail
+
+
+def _finish_run(
+    logger: logging.Logger, spans: Spans, root: Path, mode: str, ok: bool, detail: str
+) -> tuple[bool, str]:
+    spans.write(root / "state", read_installed_version(root / "app_live"), mode=mode, ok=ok)
 
     if ok:
         logger.info("Updater finished successfully: %s", detail)
-        return 0
-    logger.error("Updater failed: %s", detail)
-    return 1
+    else:
+        logger.error("Updater failed: %s", detail)
+    for handler in list(logger.handlers):
+        logger.removeHandler(handler)
+        handler.close()
+    return ok, detail
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="flez-bot packaged updater")
+    parser.add_argument("--root", default=str(Path(__file__).resolve().parent))
+    parser.add_argument("--channel", default="alpha", choices=["alpha", "stable"])
+    parser.add_argument("--mode", default="check-stage", choices=list(ENGINE_MODES))
+    parser.add_argument("--full", action="store_true", help="verify/repair: re-hash every file, ignoring the file index")
+    parser.add_argument(
+        "--wait",
+        nargs="?",
+        type=float,
+        const=STAGE_LEASE_WAIT_SECONDS,
+        default=None,
+        metavar="SECONDS",
+        help=(
+            "if another updater is running, follow its progress and run afterwards instead of exiting;"
+            f" give up after SECONDS (default {STAGE_LEASE_WAIT_SECONDS:g})"
+        ),
+    )
+    parser.add_argument(
+        "--background",
+        action="store_true",
+        help=(
+            "check-stage: run at background priority under the state.json \"background\" limits"
+            " and precompile the staged bytecode"
+        ),
+    )
+    parser.add_argument(
+        "--collect-trash",
+        action="store_true",
+        help="after check-stage, delete discarded trees from tmp/trash at background priority",
+    )
+    parser.add_argument(
+        "--releases-ttl",
+        type=float,
+        default=RELEASES_CACHE_TTL_SECONDS,
+        help="seconds a cached releases list is trusted without contacting GitHub (0 = always revalidate)",
+    )
+    args = parser.parse_args()
+    ok, detail = run_mode(
+        Path(args.root).resolve(),
+        args.mode,
+        channel=args.channel,
+        releases_ttl=args.releases_ttl,
+        full=args.full,
+        collect_trash_after=args.collect_trash,
+        wait=args.wait is not None,
+        background=args.background,
+        wait_seconds=args.wait if args.wait is not None else STAGE_LEASE_WAIT_SECONDS,
+    )
+    print(detail)  # the launcher's subprocess fallback reads the RESULT line (e.g. action=retry_later)
+    return 0 if ok else 1
 
 
 if __name__ == "__main__":